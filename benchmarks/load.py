@@ -0,0 +1,430 @@
+"""Test de charge de l'application : sessions simultanées simulées
+
+Lance l'application (`streamlit run secuali.py`, sans navigateur) puis simule N
+utilisateurs qui parlent au serveur comme le navigateur : une connexion WebSocket par
+session, un message de réexécution à chaque interaction (valeurs des widgets
+comprises), jusqu'à la fin du script. Chaque session enchaîne des parcours tirés selon
+un mélange de pages (analyse d'un produit, tableau de bord, alertes, statistiques)
+entrecoupés de temps de réflexion.
+
+Le rapport donne, par interaction, les percentiles p50/p95/p99 de la latence perçue
+(envoi de l'interaction -> fin du script), le nombre d'exécutions du script qu'elle a
+déclenchées et les erreurs, ainsi que la mémoire résidente du serveur échantillonnée
+pendant le test. `--compare` confronte le p95 à une référence, comme benchmarks/run.py.
+
+    python benchmarks/load.py --sessions 100 --duration 60 --output charge.json
+    python benchmarks/load.py --sessions 100 --duration 60 --compare charge.json
+    python benchmarks/load.py --url ws://127.0.0.1:8501 --pid 1234   # serveur déjà lancé
+
+Le client tourne dans un seul processus (asyncio) : sur une petite machine, il entre
+en concurrence avec le serveur pour le processeur.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from websockets.asyncio.client import connect
+
+from foodsafe.scoring import default_catalog
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "secuali.py")
+PAGES = ("Analyser un produit", "Tableau de bord des rappels", "Alertes personnalisées", "Statistiques globales")
+JOURNEY_PAGES = dict(zip(("analyze", "dashboard", "alerts", "statistics"), PAGES))
+# Mélange des parcours : probabilité qu'une session enchaîne sur chacun
+DEFAULT_MIX = "analyze=0.5,dashboard=0.25,alerts=0.1,statistics=0.15"
+WIDGET_KINDS = ("selectbox", "radio", "text_input", "button", "checkbox", "date_input", "multiselect",
+                "number_input", "download_button")
+
+
+# Serveur
+
+
+def start_server(port, env=None):
+    """Lance l'application sur `port` et attend qu'elle réponde ; renvoie le processus"""
+    command = [sys.executable, "-m", "streamlit", "run", APP_PATH, "--server.headless", "true",
+               "--server.port", str(port), "--browser.gatherUsageStats", "false"]
+    server = subprocess.Popen(command, env={**os.environ, **(env or {})},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Le serveur s'est arrêté au démarrage (code {server.returncode})")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("Le serveur ne répond pas après 60 s")
+
+
+def rss_mb(pid):
+    """Mémoire résidente d'un processus en Mo (Linux), None si indisponible"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+async def sample_memory(pid, samples, interval=0.5):
+    while True:
+        value = rss_mb(pid)
+        if value is not None:
+            samples.append(value)
+        await asyncio.sleep(interval)
+
+
+# Sessions simulées
+
+
+class Session:
+    """Une session du navigateur : connexion, valeurs des widgets, éléments affichés"""
+    
+    def __init__(self, url, recorder, timeout):
+        self.url = url
+        self.recorder = recorder
+        self.timeout = timeout
+        self.states = {}    # identifiant du widget -> WidgetState envoyé à chaque réexécution
+        self.widgets = {}   # libellé -> (type, proto) des widgets de la dernière exécution
+        self.page = None
+        self._ws = None
+    
+    async def __aenter__(self):
+        self._ws = await connect(f"{self.url}/_stcore/stream", max_size=None)
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self._ws.close()
+    
+    async def rerun(self, name, trigger=None):
+        """Réexécute le script (interaction `name`) et mesure le temps jusqu'à sa fin"""
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.widget_states.widgets.extend(list(self.states.values()) + ([trigger] if trigger else []))
+        widgets, runs, errors = {}, 0, 0
+        start = time.perf_counter()
+        try:
+            await self._ws.send(message.SerializeToString())
+            async with asyncio.timeout(self.timeout):
+                while True:
+                    forward = ForwardMsg()
+                    forward.ParseFromString(await self._ws.recv())
+                    kind = forward.WhichOneof("type")
+                    if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                        element = forward.delta.new_element
+                        element_kind = element.WhichOneof("type")
+                        if element_kind in WIDGET_KINDS:
+                            widget = getattr(element, element_kind)
+                            widgets[widget.label] = (element_kind, widget)
+                        elif element_kind == "exception":
+                            errors += 1
+                    elif kind == "script_finished":
+                        runs += 1
+                        if forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                            break
+        except (TimeoutError, OSError) as exc:
+            self.recorder.record(name, time.perf_counter() - start, runs, 1, str(exc) or type(exc).__name__)
+            raise
+        self.recorder.record(name, time.perf_counter() - start, runs, errors)
+        self.widgets = widgets
+    
+    def _state(self, label, **value):
+        _, widget = self.widgets[label]
+        return WidgetState(id=widget.id, **value)
+    
+    async def set_value(self, name, label, **value):
+        """Change la valeur d'un widget (string_value=..., bool_value=...) puis réexécute"""
+        state = self._state(label, **value)
+        self.states[state.id] = state
+        await self.rerun(name)
+    
+    async def click(self, name, label):
+        await self.rerun(name, self._state(label, trigger_value=True))
+    
+    def options(self, label):
+        return list(self.widgets[label][1].options) if label in self.widgets else []
+    
+    async def open_page(self, journey):
+        page = JOURNEY_PAGES[journey]
+        if self.page != page:
+            await self.set_value(f"page.{journey}", "Choisissez une fonctionnalité", string_value=page)
+            self.page = page
+
+
+class Recorder:
+    """Latences, exécutions du script et erreurs par interaction"""
+    
+    def __init__(self):
+        self.latencies = {}
+        self.runs = {}
+        self.errors = {}
+        self.messages = {}
+    
+    def record(self, name, seconds, runs, errors, message=None):
+        self.latencies.setdefault(name, []).append(seconds)
+        self.runs[name] = self.runs.get(name, 0) + runs
+        self.errors[name] = self.errors.get(name, 0) + errors
+        if message:
+            self.fail(message)
+    
+    def fail(self, message):
+        self.messages[message] = self.messages.get(message, 0) + 1
+
+
+async def analyze_journey(session, rng, catalog):
+    await session.open_page("analyze")
+    name = catalog["names"][rng.integers(len(catalog["names"]))]
+    roll = rng.random()
+    if roll < 0.15 and catalog["eans"]:
+        await session.set_value("analyze.method", "Comment souhaitez-vous identifier le produit ?", string_value="Code-barres")
+        await session.set_value("analyze.barcode", "Code-barres (EAN-13)",
+                                string_value=catalog["eans"][rng.integers(len(catalog["eans"]))])
+    else:
+        await session.set_value("analyze.method", "Comment souhaitez-vous identifier le produit ?", string_value="Nom du produit")
+        # Nom complet, début du nom (suggestions) ou produit inconnu
+        query = name if roll < 0.6 else name[:max(3, len(name) // 2)] if roll < 0.85 else f"Produit inconnu {rng.integers(1000)}"
+        await session.set_value("analyze.query", "Nom du produit", string_value=query)
+        suggestions = session.options("Produits correspondants")
+        if suggestions:
+            await session.set_value("analyze.suggestion", "Produits correspondants",
+                                    string_value=suggestions[rng.integers(len(suggestions))])
+    if rng.random() < 0.5:
+        await session.set_value("analyze.lot", "Numéro de lot (optionnel)", string_value=f"S2406{rng.integers(20):02d}")
+    await session.click("analyze.submit", "🔍 Analyser le produit")
+
+
+async def dashboard_journey(session, rng, catalog):
+    await session.open_page("dashboard")
+    periods = session.options("Période")
+    if periods and rng.random() < 0.6:
+        await session.set_value("dashboard.period", "Période", string_value=periods[rng.integers(len(periods))])
+    sorts = session.options("Trier par")
+    if sorts and rng.random() < 0.4:
+        await session.set_value("dashboard.sort", "Trier par", string_value=sorts[rng.integers(len(sorts))])
+
+
+async def alerts_journey(session, rng, catalog):
+    await session.open_page("alerts")
+
+
+async def statistics_journey(session, rng, catalog):
+    await session.open_page("statistics")
+    granularities = session.options("Période d'agrégation")
+    if granularities and rng.random() < 0.6:
+        await session.set_value("statistics.granularity", "Période d'agrégation",
+                                string_value=granularities[rng.integers(len(granularities))])
+
+
+JOURNEYS = {
+    "analyze": analyze_journey,
+    "dashboard": dashboard_journey,
+    "alerts": alerts_journey,
+    "statistics": statistics_journey,
+}
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in JOURNEYS:
+            raise ValueError(f"Parcours inconnu : {name} (attendus : {', '.join(JOURNEYS)})")
+        mix[name] = float(weight)
+    total = sum(mix.values())
+    return {name: weight / total for name, weight in mix.items()}
+
+
+async def run_session(index, url, recorder, catalog, mix, deadline, think, ramp, timeout, seed):
+    rng = np.random.default_rng([seed, index])
+    await asyncio.sleep(ramp * rng.random())
+    names, weights = list(mix), list(mix.values())
+    try:
+        async with Session(url, recorder, timeout) as session:
+            await session.rerun("load")
+            session.page = PAGES[0]
+            while time.monotonic() < deadline:
+                try:
+                    await JOURNEYS[names[rng.choice(len(names), p=weights)]](session, rng, catalog)
+                except KeyError as exc:
+                    recorder.fail(f"widget absent : {exc.args[0]}")
+                await asyncio.sleep(rng.exponential(think))
+    except (TimeoutError, OSError):
+        pass  # session interrompue : l'erreur est déjà comptée
+
+
+def load_catalog_sample(limit=1000, seed=0):
+    """Noms et codes-barres du catalogue servi (FOODSAFE_CATALOG_SNAPSHOT ou exemples)"""
+    catalog = default_catalog()
+    names = list(catalog)
+    rng = np.random.default_rng(seed)
+    if len(names) > limit:
+        names = [names[i] for i in rng.choice(len(names), limit, replace=False)]
+    eans = [catalog[name]["ean"] for name in names if "ean" in catalog[name]]
+    return {"names": names, "eans": eans}
+
+
+# Rapport
+
+
+def _summary(latencies, runs, errors):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "runs": runs,
+        "runs_per_interaction": runs / len(latencies),
+        "mean_ms": float(latencies.mean() * 1e3),
+        "p50_ms": float(p50 * 1e3),
+        "p95_ms": float(p95 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "max_ms": float(latencies.max() * 1e3),
+    }
+
+
+def run(url, pid, sessions, duration, mix, think, ramp, timeout, seed):
+    recorder = Recorder()
+    catalog = load_catalog_sample(seed=seed)
+    memory = []
+    
+    async def main():
+        sampler = asyncio.create_task(sample_memory(pid, memory)) if pid else None
+        deadline = time.monotonic() + ramp + duration
+        await asyncio.gather(*(
+            run_session(i, url, recorder, catalog, mix, deadline, think, ramp, timeout, seed) for i in range(sessions)
+        ))
+        if sampler is not None:
+            sampler.cancel()
+    
+    start = time.perf_counter()
+    asyncio.run(main())
+    elapsed = time.perf_counter() - start
+    interactions = {
+        name: _summary(latencies, recorder.runs[name], recorder.errors[name])
+        for name, latencies in sorted(recorder.latencies.items())
+    }
+    total = sum(result["count"] for result in interactions.values())
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.platform(),
+            "url": url,
+            "sessions": sessions,
+            "duration_s": duration,
+            "ramp_s": ramp,
+            "think_s": think,
+            "mix": mix,
+            "seed": seed,
+        },
+        "elapsed_s": elapsed,
+        "interactions_total": total,
+        "interactions_per_s": total / elapsed,
+        "runs_total": sum(result["runs"] for result in interactions.values()),
+        "errors_total": sum(result["errors"] for result in interactions.values()) + sum(
+            count for message, count in recorder.messages.items() if message.startswith("widget absent")),
+        "error_messages": recorder.messages,
+        "memory_mb": {
+            "start": memory[0], "peak": max(memory), "end": memory[-1], "samples": len(memory),
+        } if memory else None,
+        "interactions": interactions,
+    }
+
+
+def print_report(report, out=sys.stderr):
+    print(f"{'interaction':28s} {'n':>6s} {'err':>4s} {'exéc.':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s}", file=out)
+    for name, result in report["interactions"].items():
+        print(f"{name:28s} {result['count']:6d} {result['errors']:4d} {result['runs_per_interaction']:6.2f} "
+              f"{result['p50_ms']:9.1f} {result['p95_ms']:9.1f} {result['p99_ms']:9.1f}", file=out)
+    print(f"{report['interactions_total']} interactions en {report['elapsed_s']:.1f} s "
+          f"({report['interactions_per_s']:.1f} /s), {report['runs_total']} exécutions du script, "
+          f"{report['errors_total']} erreur(s)", file=out)
+    if report["memory_mb"]:
+        memory = report["memory_mb"]
+        print(f"Mémoire du serveur : {memory['start']:.0f} Mo au début, pic {memory['peak']:.0f} Mo, "
+              f"{memory['end']:.0f} Mo à la fin", file=out)
+
+
+def compare(current, baseline, tolerance, metric="p95_ms", min_delta_ms=5.0):
+    """Régressions de latence par interaction et de pic mémoire : liste de messages"""
+    regressions = []
+    for name, result in current["interactions"].items():
+        before = baseline["interactions"].get(name)
+        if before is None:
+            continue
+        if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] > min_delta_ms:
+            regressions.append(f"{name} : {metric} {before[metric]:.1f} -> {result[metric]:.1f}")
+    if current["memory_mb"] and baseline.get("memory_mb"):
+        before, after = baseline["memory_mb"]["peak"], current["memory_mb"]["peak"]
+        if after > before * (1 + tolerance):
+            regressions.append(f"mémoire du serveur : pic {before:.0f} -> {after:.0f} Mo")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Test de charge de l'application FoodSafe")
+    parser.add_argument("--sessions", type=int, default=50, help="sessions simultanées")
+    parser.add_argument("--duration", type=float, default=60, help="durée du test après la montée en charge (s)")
+    parser.add_argument("--ramp", type=float, default=10, help="étalement des connexions (s)")
+    parser.add_argument("--think", type=float, default=1.0, help="temps de réflexion moyen entre parcours (s)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="poids des parcours")
+    parser.add_argument("--timeout", type=float, default=60, help="durée maximale d'une interaction (s)")
+    parser.add_argument("--port", type=int, default=8599, help="port du serveur lancé pour le test")
+    parser.add_argument("--url", help="serveur déjà lancé (ws://hôte:port) ; sinon l'application est lancée")
+    parser.add_argument("--pid", type=int, help="avec --url : processus du serveur dont suivre la mémoire")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON du rapport (sortie standard par défaut)")
+    parser.add_argument("--compare", help="rapport de référence à ne pas dépasser")
+    parser.add_argument("--metric", default="p95_ms", choices=["p50_ms", "p95_ms", "p99_ms"])
+    parser.add_argument("--tolerance", type=float, default=0.3, help="hausse tolérée (relative)")
+    args = parser.parse_args(argv)
+    
+    server = None
+    url, pid = args.url, args.pid
+    if url is None:
+        server = start_server(args.port)
+        url, pid = f"ws://127.0.0.1:{args.port}", server.pid
+    try:
+        report = run(url, pid, args.sessions, args.duration, parse_mix(args.mix), args.think, args.ramp,
+                     args.timeout, args.seed)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+    print_report(report)
+    payload = json.dumps(report, indent=1, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance, args.metric)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("Aucune régression par rapport à la référence", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
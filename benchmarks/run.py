@@ -0,0 +1,334 @@
+"""Banc de performance des chemins de calcul et de préparation des données
+
+Chaque cas est mesuré sur des données synthétiques générées avec une graine fixe, à
+plusieurs échelles (nombre de lignes). Les résultats (percentiles de latence, débit,
+pic mémoire mesuré par tracemalloc) sont écrits en JSON ; `--compare` les confronte à
+une référence enregistrée et échoue (code 1) en cas de régression. Le banc échoue aussi si
+analyze_food_risk_batch n'est pas au moins MIN_BATCH_SPEEDUP fois plus rapide par ligne
+que analyze_food_risk (produit référencé) à partir de 100 000 lignes.
+
+    python benchmarks/run.py --scales 1e3,1e4,1e5 --output resultats.json
+    python benchmarks/run.py --scales 1e3,1e4,1e5 --compare reference.json
+
+Cas mesurés :
+
+- analyze_food_risk.known / .unknown / .expired : latence d'un appel unitaire ;
+- get_recommendations : latence d'un appel unitaire ;
+- analyze_food_risk_batch : inventaire de `scale` lignes ;
+- dashboard.prepare : table paginée de `scale` rappels, métriques et courbe cumulée
+  calculées par foodsafe.dashboard depuis leurs agrégats (ce que fait recalls_dashboard) ;
+- dashboard.page : latence d'une page filtrée de cette table ;
+- statistics.ingest / statistics.series : agrégation de `scale` analyses et rappels,
+  puis calcul par foodsafe.dashboard des séries jour/semaine/mois et des répartitions
+  (ce que fait statistics_page).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from foodsafe.dashboard import analysis_summary, category_counts, recall_metrics, recall_timeline, risk_trend, severity_counts
+from foodsafe.recall_table import RecallTable
+from foodsafe.rollups import RollupStore
+from foodsafe.scoring import analyze_food_risk, analyze_food_risk_batch, default_lot_index, get_recommendations, load_sample_data
+
+AS_OF = datetime(2024, 6, 12)
+DEFAULT_SCALES = "1e3,1e4,1e5,1e6"
+SEVERITIES = np.array(["Faible", "Moyen", "Élevé"], dtype=object)
+REASONS = np.array(["Listeria monocytogenes", "Salmonella", "E. coli", "Corps étranger", "Allergène non déclaré",
+                    "Pesticides non conformes", "Température non respectée"], dtype=object)
+CATEGORIES = np.array(["Légumes", "Surgelés", "Produits laitiers", "Poissons", "Viandes", "Épicerie"], dtype=object)
+# Accélération minimale par ligne de l'analyse par lots sur l'analyse unitaire, et échelle à partir de laquelle elle est exigée
+MIN_BATCH_SPEEDUP = 100
+SPEEDUP_MIN_SCALE = 100_000
+
+
+# Données synthétiques
+
+def make_inventory(n, rng):
+    """Inventaire : produits connus et inconnus, lots et dates limites dont certaines dépassées"""
+    products_db, _ = load_sample_data()
+    names = np.array(list(products_db) + [f"Produit inconnu {i}" for i in range(50)], dtype=object)
+    lots = np.char.add("S2406", rng.integers(0, 30, n).astype(str)).astype(object)
+    lots[rng.random(n) < 0.3] = None
+    expiry = np.datetime64(AS_OF.date()) + rng.integers(-10, 60, n).astype("timedelta64[D]")
+    return pd.DataFrame({
+        "product_name": names[rng.integers(0, len(names), n)],
+        "lot_number": lots,
+        "expiry_date": pd.Series(expiry.astype("datetime64[ns]")).dt.strftime("%Y-%m-%d"),
+    })
+
+
+def make_recalls(n, rng):
+    dates = np.datetime64("2021-01-01") + rng.integers(0, 3 * 365, n).astype("timedelta64[D]")
+    return pd.DataFrame({
+        "recall_id": np.char.add("RC-", np.arange(n).astype(str)).astype(object),
+        "date": dates.astype("datetime64[ns]"),
+        "product": np.char.add("Produit ", rng.integers(0, max(1, n // 10), n).astype(str)).astype(object),
+        "category": CATEGORIES[rng.integers(0, len(CATEGORIES), n)],
+        "reason": REASONS[rng.integers(0, len(REASONS), n)],
+        "severity": SEVERITIES[rng.choice(3, n, p=[0.3, 0.45, 0.25])],
+    })
+
+
+def make_analyses(n, rng):
+    days = np.datetime64("2021-01-01") + rng.integers(0, 3 * 365, n).astype("timedelta64[D]")
+    scores = np.clip(rng.normal(45, 20, n), 0, 100).round()
+    return pd.DataFrame({
+        "date": days.astype("datetime64[ns]"),
+        "risk_score": scores,
+        "risk_level": np.select([scores > 70, scores > 40], ["Élevé", "Moyen"], "Faible"),
+    })
+
+
+# Mesure
+
+def _summary(latencies, rows):
+    latencies = np.asarray(latencies, dtype=np.float64)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "samples": len(latencies),
+        "min_ms": float(latencies.min() * 1e3),
+        "mean_ms": float(latencies.mean() * 1e3),
+        "p50_ms": float(p50 * 1e3),
+        "p95_ms": float(p95 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "throughput_per_s": float(rows / p50) if p50 > 0 else None,
+    }
+
+
+def _peak_memory_mb(run):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        run()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 2 ** 20
+
+
+def bench_repeated(run, rows, repeats):
+    """Latences de `repeats` exécutions complètes de `run`, débit en lignes par seconde"""
+    run()  # échauffement
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        latencies.append(time.perf_counter() - start)
+    result = _summary(latencies, rows)
+    result["peak_mb"] = _peak_memory_mb(run)
+    return result
+
+
+def bench_calls(call, arguments):
+    """Latence par appel de `call` sur une liste d'arguments, débit en appels par seconde"""
+    for args in arguments[:100]:
+        call(*args)
+    latencies = np.empty(len(arguments))
+    for i, args in enumerate(arguments):
+        start = time.perf_counter()
+        call(*args)
+        latencies[i] = time.perf_counter() - start
+    result = _summary(latencies, 1)
+    result["peak_mb"] = _peak_memory_mb(lambda: [call(*args) for args in arguments[:1000]])
+    return result
+
+
+# Cas
+
+def unit_cases(calls, rng):
+    products_db, _ = load_sample_data()
+    known = list(products_db)
+    lot_index = default_lot_index()
+    
+    def analyze(name, lot, expiry):
+        return analyze_food_risk(name, lot, expiry, as_of=AS_OF, lot_index=lot_index)
+    
+    pick = rng.integers(0, len(known), calls)
+    fresh = [(known[i], f"S2406{i:02d}", "2024-07-15") for i in pick]
+    unknown = [(f"Produit inconnu {i}", None, "2024-07-15") for i in range(calls)]
+    expired = [(known[i], None, "2024-06-01") for i in pick]
+    recommendations = list(zip(rng.integers(0, 101, calls).tolist(), rng.integers(-5, 30, calls).tolist()))
+    return {
+        "analyze_food_risk.known": bench_calls(analyze, fresh),
+        "analyze_food_risk.unknown": bench_calls(analyze, unknown),
+        "analyze_food_risk.expired": bench_calls(analyze, expired),
+        "get_recommendations": bench_calls(get_recommendations, recommendations),
+    }
+
+
+def scaled_cases(n, repeats, rng):
+    results = {}
+    lot_index = default_lot_index()
+    
+    inventory = make_inventory(n, rng)
+    results["analyze_food_risk_batch"] = bench_repeated(
+        lambda: analyze_food_risk_batch(inventory, as_of=AS_OF, lot_index=lot_index), n, repeats)
+    inventory = None
+    
+    recalls = make_recalls(n, rng)
+    # Agrégats des rappels : tenus à jour par le magasin à l'ingestion, hors de la mesure
+    recall_rollups = RollupStore()
+    recall_rollups.add_recalls(recalls)
+    
+    def prepare_dashboard():
+        table = RecallTable(recalls)
+        metrics = recall_metrics(recall_rollups, table, AS_OF)
+        recall_timeline(recall_rollups)
+        table.query(page=0)
+        return table, metrics
+    
+    results["dashboard.prepare"] = bench_repeated(prepare_dashboard, n, repeats)
+    table, _ = prepare_dashboard()
+    queries = []
+    for i in range(200):
+        severities = tuple(SEVERITIES[rng.random(3) < 0.5])
+        reasons = tuple(REASONS[rng.random(len(REASONS)) < 0.3])
+        start = pd.Timestamp("2021-01-01") + pd.Timedelta(days=int(rng.integers(0, 700)))
+        queries.append((severities, reasons, start.date(), None, ("date", "severity", "product")[i % 3], True, 0, 25))
+    results["dashboard.page"] = bench_calls(table.query, queries)
+    table = None
+    
+    analyses = make_analyses(n, rng)
+    
+    def ingest():
+        rollups = RollupStore()
+        rollups.add_analyses(analyses)
+        rollups.add_recalls(recalls)
+        return rollups
+    
+    results["statistics.ingest"] = bench_repeated(ingest, 2 * n, repeats)
+    rollups = ingest()
+    
+    def series():
+        analysis_summary(rollups)
+        for granularity in ("day", "week", "month"):
+            risk_trend(rollups, granularity)
+        category_counts(rollups)
+        severity_counts(rollups)
+    
+    results["statistics.series"] = bench_repeated(series, len(rollups), repeats)
+    return results
+
+
+def run(scales, repeats, calls, seed):
+    rng = np.random.default_rng(seed)
+    results = []
+    for name, result in unit_cases(calls, rng).items():
+        results.append({"name": name, "scale": None, **result})
+        print(f"{name:28s} {'':>10s} p50 {result['p50_ms']:9.4f} ms  p99 {result['p99_ms']:9.4f} ms", file=sys.stderr)
+    for scale in scales:
+        for name, result in scaled_cases(scale, repeats, np.random.default_rng([seed, scale])).items():
+            results.append({"name": name, "scale": scale, **result})
+            print(f"{name:28s} {scale:>10,d} p50 {result['p50_ms']:9.2f} ms  "
+                  f"{result['throughput_per_s'] or 0:14,.0f} /s  pic {result['peak_mb']:8.1f} Mo", file=sys.stderr)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.platform(),
+            "seed": seed,
+            "repeats": repeats,
+            "calls": calls,
+        },
+        "results": results,
+    }
+
+
+def batch_speedups(results):
+    """Accélération par ligne de analyze_food_risk_batch sur analyze_food_risk.known, par échelle"""
+    unit = next((result for result in results["results"] if result["name"] == "analyze_food_risk.known"), None)
+    if unit is None:
+        return {}
+    return {result["scale"]: unit["p50_ms"] * result["scale"] / result["p50_ms"]
+            for result in results["results"] if result["name"] == "analyze_food_risk_batch"}
+
+
+def check_batch_speedup(results, minimum=MIN_BATCH_SPEEDUP, min_scale=SPEEDUP_MIN_SCALE):
+    """Échelles où l'analyse par lots n'atteint pas l'accélération `minimum` : liste de messages"""
+    return [f"analyze_food_risk_batch @ {scale:,} : {speedup:.0f}x plus rapide par ligne que analyze_food_risk "
+            f"(minimum {minimum}x)"
+            for scale, speedup in batch_speedups(results).items() if scale >= min_scale and speedup < minimum]
+
+
+def compare(current, baseline, tolerance, memory_tolerance, metric="p50_ms", min_delta_ms=0.01):
+    """Régressions de `current` par rapport à `baseline` : liste de messages
+    
+    Une latence régresse si elle dépasse la référence de plus de `tolerance` (relatif) et
+    de plus de `min_delta_ms` (absolu, pour ignorer le bruit des mesures de l'ordre de la
+    microseconde). Les deux fichiers doivent provenir de la même machine.
+    """
+    reference = {(result["name"], result["scale"]): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = reference.get((result["name"], result["scale"]))
+        if before is None:
+            continue
+        label = result["name"] if result["scale"] is None else f"{result['name']} @ {result['scale']:,}"
+        if result[metric] > before[metric] * (1 + tolerance) and result[metric] - before[metric] > min_delta_ms:
+            regressions.append(f"{label} : {metric} {before[metric]:.4f} -> {result[metric]:.4f}")
+        if result["peak_mb"] > before["peak_mb"] * (1 + memory_tolerance) + 1:
+            regressions.append(f"{label} : pic mémoire {before['peak_mb']:.1f} -> {result['peak_mb']:.1f} Mo")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de performance FoodSafe")
+    parser.add_argument("--scales", default=DEFAULT_SCALES, help="échelles séparées par des virgules (jusqu'à 1e7)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=10_000, help="appels mesurés pour les cas unitaires")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="fichier JSON des résultats (sortie standard par défaut)")
+    parser.add_argument("--compare", help="résultats de référence à ne pas dépasser")
+    parser.add_argument("--metric", default="p50_ms", choices=["min_ms", "p50_ms", "p95_ms", "p99_ms"],
+                        help="latence comparée à la référence")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="hausse de latence tolérée (relative)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.01, help="hausse de latence ignorée (absolue)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.25, help="hausse du pic mémoire tolérée")
+    parser.add_argument("--min-batch-speedup", type=float, default=MIN_BATCH_SPEEDUP,
+                        help="accélération par ligne exigée de l'analyse par lots (0 pour ne pas la vérifier)")
+    args = parser.parse_args(argv)
+    
+    scales = [int(float(scale)) for scale in args.scales.split(",") if scale]
+    results = run(scales, args.repeats, args.calls, args.seed)
+    payload = json.dumps(results, indent=1, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(payload + "\n")
+    else:
+        print(payload)
+    
+    for scale, speedup in batch_speedups(results).items():
+        print(f"analyze_food_risk_batch @ {scale:,} : {speedup:,.0f}x plus rapide par ligne", file=sys.stderr)
+    failures = check_batch_speedup(results, args.min_batch_speedup) if args.min_batch_speedup else []
+    for failure in failures:
+        print(f"ÉCHEC {failure}", file=sys.stderr)
+    
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.memory_tolerance,
+                                  args.metric, args.min_delta_ms)
+        for regression in regressions:
+            print(f"RÉGRESSION {regression}", file=sys.stderr)
+        if not regressions:
+            print("Aucune régression par rapport à la référence", file=sys.stderr)
+        failures += regressions
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
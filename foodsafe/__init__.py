@@ -0,0 +1 @@
+"""Briques métier de FoodSafe AI, utilisables en dehors de l'interface Streamlit"""
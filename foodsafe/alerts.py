@@ -0,0 +1,234 @@
+"""Abonnements aux alertes et appariement des rappels par index inversés
+
+Un abonnement surveille des catégories de produits et des marques, à partir d'une
+sévérité minimale. Chaque catégorie et chaque marque devient un jeton (« cat:… »,
+« brand:… ») associé à la liste des abonnements qui le surveillent ; la sévérité
+minimale est un masque de bits. Apparier un rappel revient donc à réunir quelques
+listes de postings puis à filtrer par masque, sans parcourir les abonnements.
+
+Les abonnements sont persistés dans un journal JSON Lines en ajout seul, rejoué au
+chargement (la dernière version de chaque abonné l'emporte).
+"""
+import json
+import os
+import re
+import threading
+from array import array
+from collections import defaultdict
+
+import numpy as np
+
+from .text import normalize_name
+
+SEVERITY_BITS = {"Faible": 1, "Moyen": 2, "Élevé": 4}
+MIN_SEVERITY_MASKS = {"Tous": 7, "Faible": 7, "Moyen": 6, "Élevé": 4}
+DEFAULT_RECALL_SEVERITY = "Moyen"
+CHANNELS = ["Email", "SMS", "Push notification"]
+
+
+def category_token(category):
+    return "cat:" + normalize_name(category)
+
+
+def brand_tokens(brands):
+    """Jetons de marque d'un texte libre (une marque par ligne, ou séparées par , ; /)"""
+    if isinstance(brands, str):
+        brands = re.split(r"[\n,;/]", brands)
+    return {"brand:" + normalize_name(brand) for brand in brands if brand and normalize_name(brand)}
+
+
+def recall_tokens(recall):
+    """Jetons d'un rappel (dictionnaire ou ligne de DataFrame avec category et brand)"""
+    tokens = set()
+    category = recall.get("category")
+    if isinstance(category, str) and category.strip():
+        tokens.add(category_token(category))
+    brand = recall.get("brand")
+    if isinstance(brand, str):
+        tokens |= brand_tokens(brand)
+    return tokens
+
+
+def recall_severity_bit(recall):
+    severity = recall.get("severity")
+    return SEVERITY_BITS.get(severity if isinstance(severity, str) else None, SEVERITY_BITS[DEFAULT_RECALL_SEVERITY])
+
+
+class SubscriptionStore:
+    """Abonnements indexés par jeton de catégorie et de marque"""
+    
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._reset()
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record.get("deleted"):
+                            self._remove(record["subscriber"])
+                        else:
+                            self._add(record)
+    
+    def _reset(self):
+        self._slots = {}            # abonné -> emplacement actif
+        self._records = []          # emplacement -> abonnement (None une fois remplacé)
+        self._masks = array("B")    # emplacement -> masque de sévérité (0 si inactif)
+        self._postings = defaultdict(lambda: array("i"))
+        self._subscriber_array = None  # emplacement -> abonné, reconstruit après modification
+    
+    def __len__(self):
+        return len(self._slots)
+    
+    def __contains__(self, subscriber):
+        return subscriber in self._slots
+    
+    def get(self, subscriber):
+        slot = self._slots.get(subscriber)
+        return None if slot is None else self._records[slot]
+    
+    # Écriture
+    
+    def _append_log(self, record):
+        if self.path:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    
+    def _remove(self, subscriber):
+        slot = self._slots.pop(subscriber, None)
+        if slot is not None:
+            self._masks[slot] = 0
+            self._records[slot] = None
+            self._subscriber_array = None
+    
+    def _add(self, record):
+        self._remove(record["subscriber"])
+        slot = len(self._records)
+        self._records.append(record)
+        self._masks.append(MIN_SEVERITY_MASKS[record["min_severity"]])
+        self._slots[record["subscriber"]] = slot
+        self._subscriber_array = None
+        tokens = {category_token(category) for category in record["categories"]} | brand_tokens(record["brands"])
+        for token in tokens:
+            self._postings[token].append(slot)
+        # Les emplacements remplacés ne sont plus appariés ; on compacte quand ils dominent
+        if len(self._records) > 1024 and len(self._records) > 2 * len(self._slots):
+            self._compact_index()
+    
+    def _compact_index(self):
+        records = [record for record in self._records if record is not None]
+        self._reset()
+        for record in records:
+            self._add(record)
+    
+    @staticmethod
+    def _make_record(subscriber, categories=(), brands=(), min_severity="Moyen", channels=("Email",)):
+        if min_severity not in MIN_SEVERITY_MASKS:
+            raise ValueError(f"Sévérité minimale inconnue : {min_severity!r}")
+        if isinstance(brands, str):
+            brands = [brand.strip() for brand in re.split(r"[\n,;/]", brands) if brand.strip()]
+        return {
+            "subscriber": subscriber,
+            "categories": sorted(set(categories)),
+            "brands": sorted(set(brands)),
+            "min_severity": min_severity,
+            "channels": sorted(set(channels)),
+        }
+    
+    def subscribe(self, subscriber, categories=(), brands=(), min_severity="Moyen", channels=("Email",)):
+        """Crée ou remplace l'abonnement d'un abonné ; renvoie l'abonnement enregistré"""
+        record = self._make_record(subscriber, categories, brands, min_severity, channels)
+        with self._lock:
+            self._add(record)
+            self._append_log(record)
+        return record
+    
+    def subscribe_many(self, subscriptions):
+        """Chargement en masse : dictionnaires avec les mêmes champs que subscribe()"""
+        records = [self._make_record(**subscription) for subscription in subscriptions]
+        with self._lock:
+            for record in records:
+                self._add(record)
+            if self.path:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+        return len(records)
+    
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self._slots:
+                self._remove(subscriber)
+                self._append_log({"subscriber": subscriber, "deleted": True})
+    
+    def compact(self):
+        """Réécrit le journal avec uniquement les abonnements actifs"""
+        with self._lock:
+            self._compact_index()
+            if self.path:
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in self._records)
+                os.replace(tmp_path, self.path)
+    
+    # Appariement
+    
+    @staticmethod
+    def _matching_slots(lists, masks, bit):
+        """Union des listes de postings, restreinte aux abonnements acceptant la sévérité"""
+        if not lists:
+            return np.empty(0, dtype=np.int64)
+        if len(lists) == 1 or sum(len(slots) for slots in lists) * 16 < len(masks):
+            slots = lists[0] if len(lists) == 1 else np.unique(np.concatenate(lists))
+            return slots[(masks[slots] & bit) != 0]
+        # Listes volumineuses : un marquage sur tous les emplacements évite le tri
+        hit = np.zeros(len(masks), dtype=bool)
+        for slots in lists:
+            hit[slots] = True
+        hit &= (masks & bit) != 0
+        return np.flatnonzero(hit)
+    
+    def _subscribers(self):
+        if self._subscriber_array is None:
+            self._subscriber_array = np.array(
+                [None if record is None else record["subscriber"] for record in self._records], dtype=object)
+        return self._subscriber_array
+    
+    def match(self, recall):
+        """Abonnés concernés par un rappel"""
+        tokens = recall_tokens(recall)
+        with self._lock:
+            lists = [np.frombuffer(self._postings[token], dtype=np.int32) for token in tokens if token in self._postings]
+            masks = np.frombuffer(self._masks, dtype=np.uint8)
+            slots = self._matching_slots(lists, masks, recall_severity_bit(recall))
+            del lists, masks
+            return self._subscribers()[slots].tolist()
+    
+    def match_many(self, recalls):
+        """Appariement groupé d'une série de rappels (par exemple ceux de la journée)
+        
+        Chaque liste de postings n'est lue qu'une fois, quel que soit le nombre de rappels
+        qui portent le jeton. Renvoie deux tableaux alignés : indices des rappels dans
+        `recalls` et abonnés concernés.
+        """
+        recalls = list(recalls)
+        tokens_per_recall = [recall_tokens(recall) for recall in recalls]
+        with self._lock:
+            postings = {
+                token: np.frombuffer(self._postings[token], dtype=np.int32).copy()
+                for token in set().union(*tokens_per_recall) if token in self._postings
+            }
+            masks = np.frombuffer(self._masks, dtype=np.uint8).copy()
+            subscribers = self._subscribers()
+        
+        recall_parts, slot_parts = [], []
+        for i, (recall, tokens) in enumerate(zip(recalls, tokens_per_recall)):
+            slots = self._matching_slots(
+                [postings[token] for token in tokens if token in postings], masks, recall_severity_bit(recall))
+            recall_parts.append(np.full(len(slots), i, dtype=np.int64))
+            slot_parts.append(slots)
+        if not recall_parts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=object)
+        return np.concatenate(recall_parts), subscribers[np.concatenate(slot_parts)]
@@ -0,0 +1,152 @@
+"""Index code-barres → produit sur disque, ouvert en mmap
+
+Format du fichier (entiers little-endian) :
+
+- en-tête : signature, version du catalogue source, nombre d'enregistrements, nombre de produits ;
+- enregistrements de taille fixe triés par GTIN : GTIN-14 (u64) + identifiant produit (u32) ;
+- table des noms : offsets (u64, nombre de produits + 1) puis noms UTF-8 concaténés.
+
+La recherche est une dichotomie directement dans le fichier projeté en mémoire : seules
+les pages visitées sont lues, et elles sont partagées par tous les processus via le
+cache du système.
+"""
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"FSGTIN02"
+HEADER = struct.Struct("<8sQQI4x")
+RECORD = struct.Struct("<QI")
+NAME_OFFSET = struct.Struct("<Q")
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+
+def gtin_check_digit(body):
+    """Chiffre de contrôle GS1 (modulo 10) d'un GTIN privé de son dernier chiffre"""
+    total = sum(int(digit) * (3 if i % 2 == 0 else 1) for i, digit in enumerate(reversed(body)))
+    return (10 - total % 10) % 10
+
+
+def normalize_gtin(code):
+    """Normalise un GTIN-8/12/13/14 en GTIN-14 ; lève ValueError s'il est invalide"""
+    digits = "".join(str(code).split()).replace("-", "")
+    if not digits.isdigit() or len(digits) not in GTIN_LENGTHS:
+        raise ValueError(f"Code-barres invalide : {code!r}")
+    if gtin_check_digit(digits[:-1]) != int(digits[-1]):
+        raise ValueError(f"Chiffre de contrôle invalide : {code!r}")
+    return digits.zfill(14)
+
+
+def is_valid_gtin(code):
+    """Indique si le code est un GTIN-8/12/13/14 valide"""
+    try:
+        normalize_gtin(code)
+    except ValueError:
+        return False
+    return True
+
+
+def barcode_index_version(path):
+    """Version du catalogue dont l'index `path` est issu, None s'il n'existe pas ou est d'un autre format"""
+    try:
+        with open(path, "rb") as f:
+            magic, catalog_version, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return None
+    return catalog_version if magic == MAGIC else None
+
+
+def build_barcode_index(path, entries, catalog_version=0):
+    """Écrit l'index à partir de couples (code-barres, nom du produit)
+    
+    Les codes sont normalisés en GTIN-14 ; un code en double garde le dernier produit vu.
+    `catalog_version` est la version du catalogue d'où viennent les couples.
+    Le fichier est écrit à côté puis renommé, les lecteurs ne voient jamais un index partiel.
+    """
+    product_ids, names = {}, []
+    gtins, ids = [], []
+    for code, name in entries:
+        gtins.append(int(normalize_gtin(code)))
+        if name not in product_ids:
+            product_ids[name] = len(names)
+            names.append(name)
+        ids.append(product_ids[name])
+    
+    records = np.zeros(len(gtins), dtype=[("gtin", "<u8"), ("product", "<u4")])
+    records["gtin"] = gtins
+    records["product"] = ids
+    # Tri stable puis dernier doublon conservé
+    records = records[np.argsort(records["gtin"], kind="stable")]
+    if len(records):
+        last = np.append(records["gtin"][1:] != records["gtin"][:-1], True)
+        records = records[last]
+    
+    encoded = [name.encode("utf-8") for name in names]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, catalog_version, len(records), len(names)))
+        f.write(records.tobytes())
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+    os.replace(tmp_path, path)
+
+
+class BarcodeIndex:
+    """Lecture de l'index code-barres, en O(log n) sans chargement du fichier"""
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"Index code-barres tronqué : {path}")
+        magic, self.catalog_version, self._count, self._name_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Fichier d'index code-barres inconnu : {path}")
+        self._names_offsets_start = HEADER.size + self._count * RECORD.size
+        self._names_start = self._names_offsets_start + (self._name_count + 1) * NAME_OFFSET.size
+        if len(self._mm) < self._names_start:
+            raise ValueError(f"Index code-barres tronqué : {path}")
+    
+    def __len__(self):
+        return self._count
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self._mm.close()
+    
+    def _record(self, position):
+        return RECORD.unpack_from(self._mm, HEADER.size + position * RECORD.size)
+    
+    def _product_name(self, product_id):
+        start, = NAME_OFFSET.unpack_from(self._mm, self._names_offsets_start + product_id * NAME_OFFSET.size)
+        end, = NAME_OFFSET.unpack_from(self._mm, self._names_offsets_start + (product_id + 1) * NAME_OFFSET.size)
+        return self._mm[self._names_start + start:self._names_start + end].decode("utf-8")
+    
+    def lookup(self, code):
+        """Nom du produit associé au code-barres, None s'il est inconnu
+        
+        Lève ValueError si le code n'est pas un GTIN valide.
+        """
+        gtin = int(normalize_gtin(code))
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key, product_id = self._record(mid)
+            if key < gtin:
+                lo = mid + 1
+            elif key > gtin:
+                hi = mid
+            else:
+                return self._product_name(product_id)
+        return None
@@ -0,0 +1,84 @@
+"""Cache partagé des résultats d'analyse : taille bornée, éviction LRU, expiration et compteurs"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class AnalysisCache:
+    """Cache LRU thread-safe dont chaque entrée porte sa propre date d'expiration
+
+    Les entrées ne sont jamais invalidées une à une : les clés portent la version des
+    données, qui change à chaque ingestion, et set_data_version retire d'un coup les
+    entrées calculées sur une version précédente.
+    """
+
+    def __init__(self, maxsize=10_000, max_ttl=3600, clock=time.time):
+        self.maxsize = maxsize
+        self.max_ttl = max_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # clé -> (valeur, expiration)
+        self._data_version = None
+        self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Valeur en cache pour `key`, ou `default` si elle est absente ou expirée"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[1] <= self._clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value, ttl=None):
+        """Enregistre une valeur pour `ttl` secondes au plus (plafonné à max_ttl)"""
+        ttl = self.max_ttl if ttl is None else min(ttl, self.max_ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def set_data_version(self, version):
+        """Déclare la version courante des données ; si elle a changé, vide le cache et renvoie le nombre d'entrées retirées"""
+        with self._lock:
+            if version == self._data_version:
+                return 0
+            self._data_version = version
+            dropped = len(self._entries)
+            self.invalidations += dropped
+            self._entries.clear()
+            return dropped
+
+    def clear(self):
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self):
+        """Compteurs du cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,209 @@
+"""Index du catalogue produits : recherche par préfixe et recherche approchée par trigrammes"""
+import math
+from array import array
+from bisect import bisect_left
+
+import numpy as np
+
+from .text import normalize_name
+
+
+def trigrams(normalized):
+    """Trigrammes d'un nom normalisé, chaque mot étant bordé d'espaces"""
+    grams = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _build_postings(keys, ids, n_keys):
+    """Construit des listes de postings au format CSR (offsets, identifiants triés)"""
+    order = np.lexsort((ids, keys))
+    offsets = np.zeros(n_keys + 1, dtype=np.int64)
+    np.cumsum(np.bincount(keys, minlength=n_keys), out=offsets[1:])
+    return offsets, ids[order]
+
+
+class CatalogIndex:
+    """Index en mémoire des noms de produits
+    
+    - recherche par préfixe insensible à la casse et aux accents (le dernier mot
+      saisi est un préfixe, les précédents doivent être complets), pour l'autocomplétion ;
+    - recherche approchée par trigrammes (part des trigrammes de la requête présents
+      dans le nom) ;
+    - classement des k meilleurs résultats.
+    
+    Les produits sont numérotés par longueur de nom croissante : les listes de postings,
+    triées par identifiant, donnent donc directement les noms les plus courts en premier.
+    """
+    
+    # Nombre maximal d'entrées de postings parcourues par requête
+    MAX_POSTINGS = 200_000
+    
+    def __init__(self, names):
+        normalized_names = {}
+        for name in names:
+            normalized_names.setdefault(name, normalize_name(name))
+        self.names = sorted(normalized_names, key=lambda name: (len(normalized_names[name]), name))
+        self._exact = {}
+        token_ids, gram_ids = {}, {}
+        token_pairs, token_products = array("i"), array("i")
+        gram_pairs, gram_products = array("i"), array("i")
+        gram_counts = np.zeros(len(self.names), dtype=np.int32)
+        
+        for product_id, name in enumerate(self.names):
+            normalized = normalized_names[name]
+            self._exact.setdefault(normalized, product_id)
+            for token in set(normalized.split()):
+                token_pairs.append(token_ids.setdefault(token, len(token_ids)))
+                token_products.append(product_id)
+            grams = trigrams(normalized)
+            gram_counts[product_id] = len(grams)
+            for gram in grams:
+                gram_pairs.append(gram_ids.setdefault(gram, len(gram_ids)))
+                gram_products.append(product_id)
+        
+        # Vocabulaire trié pour la recherche par préfixe de mot
+        self._vocab = sorted(token_ids)
+        remap = np.empty(len(token_ids), dtype=np.int32)
+        for rank, token in enumerate(self._vocab):
+            remap[token_ids[token]] = rank
+        token_ranks = remap[np.frombuffer(token_pairs, dtype=np.int32)]
+        token_products = np.frombuffer(token_products, dtype=np.int32)
+        self._token_offsets, self._token_postings = _build_postings(token_ranks, token_products, len(self._vocab))
+        # Mots de chaque produit (rangs dans le vocabulaire), au format CSR : les paires
+        # sont déjà rangées par produit
+        self._product_token_offsets = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(token_products, minlength=len(self.names)), out=self._product_token_offsets[1:])
+        self._product_tokens = token_ranks
+        
+        self._gram_ids = gram_ids
+        self._gram_offsets, self._gram_postings = _build_postings(
+            np.frombuffer(gram_pairs, dtype=np.int32), np.frombuffer(gram_products, dtype=np.int32), len(gram_ids))
+        self._gram_counts = gram_counts
+    
+    @classmethod
+    def from_products(cls, products_db):
+        """Construit l'index à partir du dictionnaire produits de load_sample_data"""
+        return cls(products_db.keys())
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def lookup(self, text):
+        """Nom canonique du produit correspondant exactement (après normalisation), sinon None"""
+        product_id = self._exact.get(normalize_name(text))
+        return None if product_id is None else self.names[product_id]
+    
+    def _postings_for_token(self, token):
+        rank = bisect_left(self._vocab, token)
+        if rank == len(self._vocab) or self._vocab[rank] != token:
+            return np.empty(0, dtype=np.int32)
+        return self._token_postings[self._token_offsets[rank]:self._token_offsets[rank + 1]]
+    
+    def _postings_for_prefix(self, prefix, limit=None):
+        """Postings des mots commençant par `prefix`, tronqués à `limit` entrées par mot"""
+        lo = bisect_left(self._vocab, prefix)
+        hi = bisect_left(self._vocab, prefix + "\U0010ffff", lo)
+        total = 0
+        for rank in range(lo, hi):
+            start, end = self._token_offsets[rank], self._token_offsets[rank + 1]
+            if limit is not None:
+                end = min(end, start + limit)
+            yield self._token_postings[start:end]
+            total += end - start
+            if total >= self.MAX_POSTINGS:
+                break
+    
+    def _with_prefix(self, candidates, prefix, k, block=4096):
+        """Les k premiers candidats ayant un mot qui commence par `prefix`
+        
+        Les mots des candidats sont comparés à l'intervalle du préfixe dans le vocabulaire,
+        par blocs, jusqu'à en trouver k : le coût ne dépend pas du nombre de mots du
+        vocabulaire commençant par le préfixe.
+        """
+        lo = bisect_left(self._vocab, prefix)
+        hi = bisect_left(self._vocab, prefix + "\U0010ffff", lo)
+        if lo == hi:
+            return candidates[:0]
+        found = []
+        for first in range(0, len(candidates), block):
+            chunk = candidates[first:first + block]
+            starts, ends = self._product_token_offsets[chunk], self._product_token_offsets[chunk + 1]
+            lengths = ends - starts
+            positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+            ranks = self._product_tokens[positions]
+            hits = np.add.reduceat((ranks >= lo) & (ranks < hi), np.cumsum(lengths) - lengths) > 0
+            found.append(chunk[hits])
+            if sum(len(part) for part in found) >= k:
+                break
+        return np.concatenate(found)[:k]
+    
+    def prefix_search(self, query, k=10):
+        """Produits dont les mots commencent par ceux de la requête, les noms courts en premier"""
+        tokens = normalize_name(query).split()
+        if not tokens:
+            return []
+        
+        if len(tokens) == 1:
+            # Les k premiers identifiants de chaque mot suffisent : ce sont les noms les plus courts
+            chunks = list(self._postings_for_prefix(tokens[0], limit=k))
+            candidates = np.unique(np.concatenate(chunks))[:k] if chunks else []
+        else:
+            full_postings = sorted((self._postings_for_token(token) for token in set(tokens[:-1])), key=len)
+            candidates = full_postings[0]
+            for posting in full_postings[1:]:
+                if len(candidates) == 0:
+                    break
+                candidates = np.intersect1d(candidates, posting, assume_unique=True)
+            if len(candidates):
+                candidates = self._with_prefix(candidates, tokens[-1], k)
+        return [(self.names[i], 1.0) for i in candidates]
+    
+    def fuzzy_search(self, query, k=10, min_similarity=0.5):
+        """Produits les plus proches selon la part des trigrammes de la requête qu'ils contiennent"""
+        grams = trigrams(normalize_name(query))
+        postings = []
+        for gram in grams:
+            gram_id = self._gram_ids.get(gram)
+            if gram_id is not None:
+                postings.append(self._gram_postings[self._gram_offsets[gram_id]:self._gram_offsets[gram_id + 1]])
+        required = max(1, math.ceil(min_similarity * len(grams)))
+        if len(postings) < required:
+            return []
+        
+        # Un produit partageant au moins `required` trigrammes figure forcément dans l'une
+        # des listes les plus rares : celles-ci sont toujours comptées, les autres dans la
+        # limite du budget
+        postings.sort(key=len)
+        n_candidate_lists = len(postings) - required + 1
+        counts = np.zeros(len(self.names), dtype=np.int16)
+        budget = self.MAX_POSTINGS
+        for i, posting in enumerate(postings):
+            if i >= n_candidate_lists and len(posting) > budget:
+                # Trigramme trop fréquent : compté comme présent pour n'écarter aucun candidat
+                counts += 1
+                continue
+            counts[posting] += 1
+            budget -= len(posting)
+        candidates = np.flatnonzero(counts >= required)
+        # Plus de trigrammes partagés d'abord, puis identifiant croissant (nom le plus court)
+        rank_keys = -counts[candidates].astype(np.int64) * len(self.names) + candidates
+        if len(candidates) > k:
+            top = np.argpartition(rank_keys, k - 1)[:k]
+            candidates, rank_keys = candidates[top], rank_keys[top]
+        candidates = candidates[np.argsort(rank_keys)]
+        return [(self.names[i], float(counts[i]) / len(grams)) for i in candidates]
+    
+    def search(self, query, k=10, min_similarity=0.5):
+        """k meilleurs produits : correspondances par préfixe puis correspondances approchées"""
+        results = self.prefix_search(query, k)
+        if len(results) < k:
+            seen = {name for name, _ in results}
+            for name, score in self.fuzzy_search(query, k, min_similarity):
+                if name not in seen:
+                    results.append((name, score))
+                    if len(results) == k:
+                        break
+        return results
@@ -0,0 +1,60 @@
+"""Données des pages tableau de bord des rappels et statistiques, calculées depuis les agrégats
+
+Ces fonctions ne dépendent pas de Streamlit : l'application les appelle pour ses
+métriques et ses graphiques, et le banc de performance mesure les mêmes calculs.
+"""
+from datetime import timedelta
+
+import pandas as pd
+
+from .figures import downsample
+
+SEVERITY_LEVELS = ("Faible", "Moyen", "Élevé")
+
+
+def recall_metrics(rollups, table, as_of, start=None):
+    """Rappels des 7 derniers jours, rappels de sévérité élevée depuis `start` et total de la table"""
+    week = rollups.series("day", start=(as_of - timedelta(days=7)).date())
+    return {
+        "week": int(week["recalls"].sum()),
+        "high_severity": int(rollups.counts("recalls_by_severity", "day", start=start).get("Élevé", 0)),
+        "total": len(table),
+    }
+
+
+def recall_timeline(rollups, start=None):
+    """Nombre cumulé de rappels par jour depuis `start`, sous-échantillonné pour l'affichage"""
+    daily = rollups.series("day", start=start)
+    daily = daily[daily["recalls"] > 0]
+    timeline = pd.DataFrame({"date": daily["period"].to_numpy(), "cumul": daily["recalls"].cumsum().to_numpy()})
+    return downsample(timeline, "date", "cumul")
+
+
+def analysis_summary(rollups):
+    """Nombre total d'analyses et croissance du dernier mois (None sans mois précédent)"""
+    monthly = rollups.series("month")
+    total = int(monthly["analyses"].sum())
+    if len(monthly) >= 2 and monthly["analyses"].iloc[-2]:
+        return total, monthly["analyses"].iloc[-1] / monthly["analyses"].iloc[-2] - 1
+    return total, None
+
+
+def risk_trend(rollups, granularity):
+    """Score de risque moyen par période, sous-échantillonné pour l'affichage"""
+    trend = rollups.series(granularity).rename(columns={
+        "period": "Date",
+        "mean_score": "Score_Risque_Moyen",
+        "analyses": "Analyses",
+    })
+    return downsample(trend, "Date", "Score_Risque_Moyen")
+
+
+def category_counts(rollups):
+    """Nombre de rappels par catégorie"""
+    return dict(rollups.counts("recalls_by_category"))
+
+
+def severity_counts(rollups):
+    """Nombre de rappels par niveau de sévérité, dans l'ordre des niveaux"""
+    counts = rollups.counts("recalls_by_severity")
+    return {level: counts.get(level, 0) for level in SEVERITY_LEVELS}
@@ -0,0 +1,175 @@
+"""Suivi des dates de péremption : évènements au franchissement des paliers de 7, 3 et 0 jours
+
+Les paliers sont ceux de la pénalité de péremption (scoring.EXPIRY_PENALTIES). Un article
+de date limite E change de palier au début des jours E - 7, E - 3 et E : tous les
+articles d'une même date limite changent donc ensemble. Le planificateur regroupe les
+articles par date limite et garde, dans un tas, le prochain franchissement de chaque
+groupe ; avancer l'horloge ne dépile que les groupes qui changent de palier. Le travail
+est proportionnel au nombre de transitions, quel que soit le nombre d'articles suivis.
+
+Les articles sont identifiés par des entiers (par exemple leur rang dans l'inventaire) :
+leur date limite courante tient dans un tableau dense, et les entrées devenues obsolètes
+(article retiré ou dont la date a changé) sont écartées au moment où leur groupe est traité.
+"""
+import heapq
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+from .scoring import EXPIRY_PENALTIES
+
+# Seuils en jours, du plus large au plus strict : le palier d'un article est le nombre de seuils franchis
+THRESHOLDS = tuple(sorted((threshold for threshold, _ in EXPIRY_PENALTIES), reverse=True))
+FINAL_BAND = len(THRESHOLDS)
+BAND_LABELS = (f"Au moins {THRESHOLDS[0]} jours",) + tuple(
+    "Périmé" if threshold <= 0 else f"Expire dans moins de {threshold} jours" for threshold in THRESHOLDS
+)
+
+_UNTRACKED = np.iinfo(np.int32).min
+_EPOCH = date(1970, 1, 1)
+
+
+def epoch_day(value):
+    """Jour (nombre de jours depuis le 1er janvier 1970) d'une date, d'un datetime ou d'une chaîne AAAA-MM-JJ"""
+    if isinstance(value, datetime):
+        value = value.date()
+    elif isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - _EPOCH).days
+
+
+def from_epoch_day(day):
+    return date.fromordinal(_EPOCH.toordinal() + int(day))
+
+
+def band_at(expiry_day, today):
+    """Palier d'une date limite au jour `today` (0 : au moins 7 jours, FINAL_BAND : périmé)"""
+    return sum(1 for threshold in THRESHOLDS if today >= expiry_day - threshold)
+
+
+def _next_crossing(expiry_day, today):
+    """Jour du prochain changement de palier, ou None une fois le produit périmé"""
+    for threshold in THRESHOLDS:
+        if expiry_day - threshold > today:
+            return expiry_day - threshold
+    return None
+
+
+class ExpiryScheduler:
+    """Articles suivis, groupés par date limite, avec le prochain franchissement de chaque groupe"""
+    
+    def __init__(self, now=None):
+        self._lock = threading.Lock()
+        self.today = epoch_day(now or datetime.now())
+        self._expiry = np.full(0, _UNTRACKED, dtype=np.int32)  # article -> date limite suivie
+        self._groups = {}   # date limite -> liste de tableaux d'articles (entrées obsolètes comprises)
+        self._heap = []     # (jour du prochain franchissement, date limite), une entrée par groupe
+        self._tracked = 0
+    
+    def __len__(self):
+        return self._tracked
+    
+    def _reserve(self, size):
+        if size > len(self._expiry):
+            grown = np.full(max(size, 2 * len(self._expiry), 1024), _UNTRACKED, dtype=np.int32)
+            grown[:len(self._expiry)] = self._expiry
+            self._expiry = grown
+    
+    def _add_group_members(self, expiry_day, items):
+        crossing = _next_crossing(expiry_day, self.today)
+        if crossing is None:
+            return  # déjà périmés : plus aucun changement de palier
+        group = self._groups.get(expiry_day)
+        if group is None:
+            self._groups[expiry_day] = [items]
+            heapq.heappush(self._heap, (crossing, expiry_day))
+        else:
+            group.append(items)
+    
+    def track(self, item, expiry_date):
+        """Suit un article (ou met à jour sa date limite) ; renvoie son palier actuel"""
+        expiry_day = epoch_day(expiry_date)
+        with self._lock:
+            self._reserve(item + 1)
+            if self._expiry[item] == _UNTRACKED:
+                self._tracked += 1
+            self._expiry[item] = expiry_day
+            self._add_group_members(expiry_day, np.array([item], dtype=np.int64))
+            return band_at(expiry_day, self.today)
+    
+    def track_many(self, items, expiry_dates):
+        """Suivi en masse : identifiants entiers et dates limites (chaînes AAAA-MM-JJ ou datetime64)
+        
+        Les articles sans date (NaT) sont ignorés. Renvoie le palier actuel de chaque article
+        (-1 pour ceux sans date).
+        """
+        items = np.asarray(items, dtype=np.int64)
+        days = np.asarray(expiry_dates, dtype="datetime64[D]").astype(np.int64)
+        dated = days != np.datetime64("NaT", "D").astype(np.int64)
+        bands = np.full(len(items), -1, dtype=np.int8)
+        bands[dated] = np.sum([self.today >= days[dated] - threshold for threshold in THRESHOLDS], axis=0)
+        items, days = items[dated], days[dated]
+        if not len(items):
+            return bands
+        with self._lock:
+            self._reserve(int(items.max()) + 1)
+            new = np.zeros(len(self._expiry), dtype=bool)
+            new[items[self._expiry[items] == _UNTRACKED]] = True
+            self._tracked += int(np.count_nonzero(new))
+            self._expiry[items] = days
+            # Peu de dates distinctes : sur 16 bits, le tri stable de NumPy est un tri par base
+            offsets = days - days.min()
+            order = np.argsort(offsets.astype(np.uint16) if offsets.max() < 2 ** 16 else offsets, kind="stable")
+            sorted_days = days[order]
+            starts = np.flatnonzero(np.diff(sorted_days)) + 1
+            for expiry_day, members in zip(sorted_days[np.r_[0, starts]].tolist(), np.split(items[order], starts)):
+                self._add_group_members(expiry_day, members)
+        return bands
+    
+    def untrack(self, item):
+        with self._lock:
+            if item < len(self._expiry) and self._expiry[item] != _UNTRACKED:
+                self._expiry[item] = _UNTRACKED
+                self._tracked -= 1
+    
+    def band(self, item):
+        """Palier actuel d'un article suivi (None s'il n'est pas suivi)"""
+        if item >= len(self._expiry) or self._expiry[item] == _UNTRACKED:
+            return None
+        return band_at(int(self._expiry[item]), self.today)
+    
+    def next_transition(self):
+        """Jour (date) du prochain changement de palier d'un groupe, ou None"""
+        return from_epoch_day(self._heap[0][0]) if self._heap else None
+    
+    def advance(self, now=None):
+        """Avance l'horloge et renvoie les transitions survenues depuis le dernier appel
+        
+        Une transition par date limite concernée : {"items": tableau des articles,
+        "expiry_date": date, "from_band", "to_band", "label"}. Si l'horloge saute plusieurs
+        paliers, l'article passe directement au dernier.
+        """
+        today = epoch_day(now or datetime.now())
+        events = []
+        with self._lock:
+            previous, self.today = self.today, max(self.today, today)
+            while self._heap and self._heap[0][0] <= self.today:
+                _, expiry_day = heapq.heappop(self._heap)
+                parts = self._groups.pop(expiry_day)
+                members = parts[0] if len(parts) == 1 else np.concatenate(parts)
+                # Entrées obsolètes : article retiré, ou suivi depuis sous une autre date
+                members = members[self._expiry[members] == expiry_day]
+                if not len(members):
+                    continue
+                members = np.unique(members)
+                to_band = band_at(expiry_day, self.today)
+                events.append({
+                    "items": members,
+                    "expiry_date": from_epoch_day(expiry_day),
+                    "from_band": band_at(expiry_day, previous),
+                    "to_band": to_band,
+                    "label": BAND_LABELS[to_band],
+                })
+                self._add_group_members(expiry_day, members)
+        return events
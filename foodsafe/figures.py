@@ -0,0 +1,66 @@
+"""Figures Plotly : sous-échantillonnage des longues séries et mise en cache des figures construites"""
+import numpy as np
+
+from .metrics import span
+
+DEFAULT_MAX_POINTS = 1500
+
+
+def lttb_indices(x, y, threshold):
+    """Indices retenus par l'algorithme LTTB (Largest-Triangle-Three-Buckets)
+    
+    Garde le premier et le dernier point, puis dans chaque seau le point formant le plus
+    grand triangle avec le point retenu précédemment et la moyenne du seau suivant :
+    les pics et les creux visibles sont conservés.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.nanargmax(areas)) if np.isfinite(areas).any() else start
+        selected[i + 1] = previous
+    return selected
+
+
+def downsample(frame, x, y, max_points=DEFAULT_MAX_POINTS):
+    """Sous-ensemble de `frame` d'au plus `max_points` lignes par colonne `y`, trié selon `x`"""
+    if len(frame) <= max_points:
+        return frame
+    columns = [y] if isinstance(y, str) else list(y)
+    x_values = frame[x].to_numpy()
+    if np.issubdtype(x_values.dtype, np.datetime64):
+        x_values = x_values.astype("datetime64[ns]").astype(np.int64)
+    keep = np.unique(np.concatenate([
+        lttb_indices(x_values, frame[column].to_numpy(dtype=np.float64, na_value=np.nan), max_points)
+        for column in columns
+    ]))
+    return frame.iloc[keep]
+
+
+def cached_figure(cache, key, build):
+    """Spécification de la figure `key` ; `build()` n'est appelé qu'en l'absence d'entrée en cache
+    
+    La figure est conservée sous forme sérialisée (dictionnaire Plotly), prête à être
+    transmise à st.plotly_chart. `cache` est un AnalysisCache (ou tout objet offrant
+    get/put) ; la clé doit inclure la version des données et les paramètres de filtre.
+    """
+    spec = cache.get(key)
+    if spec is None:
+        with span(f"figure.{key[0]}" if isinstance(key, tuple) else "figure"):
+            spec = build().to_dict()
+        cache.put(key, spec)
+    return spec
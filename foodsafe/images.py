@@ -0,0 +1,224 @@
+"""Identification d'un produit par photo : empreintes perceptuelles et index de Hamming
+
+Une photo est décodée directement à taille réduite (mode brouillon JPEG de PIL), ramenée
+à une vignette bornée, puis résumée par deux empreintes de 64 bits : pHash (basses
+fréquences de la DCT) et dHash (gradients horizontaux). Deux photos du même emballage
+ont des empreintes proches en distance de Hamming, même recadrées ou recompressées.
+
+L'index de référence découpe chaque pHash en 4 blocs de 16 bits (multi-index hashing) :
+deux empreintes à distance d ont au moins un bloc à distance ⌊d/4⌋ au plus. On ne visite
+donc que les seaux voisins des blocs de la requête, puis on vérifie les candidats.
+"""
+import argparse
+import io
+import os
+from itertools import combinations
+
+import numpy as np
+from PIL import Image, ImageOps
+
+THUMBNAIL_SIZE = 256
+HASH_BITS = 64
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+DEFAULT_MAX_DISTANCE = 10
+
+_BYTE_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _popcount(values):
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.int64)
+
+
+def hamming_distance(a, b):
+    return bin(int(a) ^ int(b)).count("1")
+
+
+def load_thumbnail(source, size=THUMBNAIL_SIZE):
+    """Vignette RVB d'au plus `size` pixels de côté, orientée selon l'EXIF
+    
+    `source` est un chemin, un fichier ou des octets. Pour un JPEG, le décodeur produit
+    directement une image réduite d'un facteur 2, 4 ou 8 : la pleine résolution n'est
+    jamais matérialisée. Lève PIL.UnidentifiedImageError si l'image est illisible.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    with Image.open(source) as image:
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size), reducing_gap=2.0)
+        image = ImageOps.exif_transpose(image)
+        return image.convert("RGB")
+
+
+def _bits_to_int(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2)
+    return matrix * np.sqrt(2 / n)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def phash(image):
+    """pHash 64 bits : signe des 8×8 plus basses fréquences de la DCT par rapport à leur médiane"""
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].ravel()
+    return _bits_to_int(low > np.median(low[1:]))
+
+
+def dhash(image):
+    """dHash 64 bits : chaque pixel d'une image 9×8 comparé à son voisin de droite"""
+    pixels = np.asarray(image.convert("L").resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    return _bits_to_int(pixels[:, 1:] > pixels[:, :-1])
+
+
+def encode_jpeg(image, quality=80):
+    """Octets JPEG d'une image PIL (aperçu compact, réaffichable sans nouveau décodage)"""
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def image_hashes(image):
+    """(pHash, dHash) d'une image PIL"""
+    return phash(image), dhash(image)
+
+
+def _neighbour_masks(radius):
+    """Masques XOR de 16 bits ayant au plus `radius` bits à 1"""
+    masks = [0]
+    for r in range(1, radius + 1):
+        masks.extend(sum(1 << bit for bit in bits) for bits in combinations(range(CHUNK_BITS), r))
+    return np.array(masks, dtype=np.int64)
+
+
+class ImageIndex:
+    """Empreintes des photos de référence, interrogées au plus proche voisin"""
+    
+    def __init__(self, phashes, dhashes, products, names):
+        self.phashes = np.asarray(phashes, dtype=np.uint64)
+        self.dhashes = np.asarray(dhashes, dtype=np.uint64)
+        self.products = np.asarray(products, dtype=np.int32)  # image -> indice dans names
+        self.names = list(names)
+        self._tables = []
+        for chunk in range(CHUNKS):
+            keys = ((self.phashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.int64)
+            order = np.argsort(keys, kind="stable").astype(np.int32)
+            offsets = np.zeros(2 ** CHUNK_BITS + 1, dtype=np.int64)
+            np.cumsum(np.bincount(keys, minlength=2 ** CHUNK_BITS), out=offsets[1:])
+            self._tables.append((offsets, order))
+        self._masks = {}
+    
+    def __len__(self):
+        return len(self.phashes)
+    
+    @classmethod
+    def from_entries(cls, entries):
+        """Index construit depuis des triplets (nom du produit, pHash, dHash)"""
+        product_ids, names, phashes, dhashes, products = {}, [], [], [], []
+        for name, p, d in entries:
+            if name not in product_ids:
+                product_ids[name] = len(names)
+                names.append(name)
+            products.append(product_ids[name])
+            phashes.append(p)
+            dhashes.append(d)
+        return cls(np.array(phashes, dtype=np.uint64), np.array(dhashes, dtype=np.uint64), products, names)
+    
+    def save(self, path):
+        """Écrit l'index (npz) de façon atomique"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, phashes=self.phashes, dhashes=self.dhashes, products=self.products,
+                     names=np.array(self.names, dtype=object).astype(str))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path):
+        """Index enregistré, ou un index vide si le fichier n'existe pas"""
+        if not os.path.exists(path):
+            return cls([], [], [], [])
+        with np.load(path) as data:
+            return cls(data["phashes"], data["dhashes"], data["products"], data["names"].tolist())
+    
+    def _candidates(self, query, chunk_radius):
+        if chunk_radius not in self._masks:
+            self._masks[chunk_radius] = _neighbour_masks(chunk_radius)
+        masks = self._masks[chunk_radius]
+        parts = []
+        for chunk, (offsets, order) in enumerate(self._tables):
+            keys = ((query >> (chunk * CHUNK_BITS)) & 0xFFFF) ^ masks
+            starts, ends = offsets[keys], offsets[keys + 1]
+            lengths = ends - starts
+            total = int(lengths.sum())
+            if total:
+                # Concaténation vectorisée des seaux visités
+                shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+                parts.append(order[shifts + np.arange(total)])
+        if not parts:
+            return np.empty(0, dtype=np.int32)
+        return np.unique(np.concatenate(parts))
+    
+    def nearest(self, query_phash, query_dhash=None, max_distance=DEFAULT_MAX_DISTANCE, k=1):
+        """Produits les plus proches : liste de (nom, distance pHash), au plus `k`, à `max_distance` au plus
+        
+        Les images d'un même produit ne comptent qu'une fois ; à distance pHash égale, le
+        dHash départage.
+        """
+        if not len(self):
+            return []
+        candidates = self._candidates(int(query_phash), max_distance // CHUNKS)
+        distances = _popcount(self.phashes[candidates] ^ np.uint64(query_phash))
+        keep = distances <= max_distance
+        candidates, distances = candidates[keep], distances[keep]
+        secondary = (_popcount(self.dhashes[candidates] ^ np.uint64(query_dhash))
+                     if query_dhash is not None else np.zeros(len(candidates), dtype=np.int64))
+        results, seen = [], set()
+        for i in np.lexsort((secondary, distances)):
+            product = int(self.products[candidates[i]])
+            if product not in seen:
+                seen.add(product)
+                results.append((self.names[product], int(distances[i])))
+                if len(results) == k:
+                    break
+        return results
+
+
+def build_image_index(path, images):
+    """Calcule les empreintes de couples (nom du produit, chemin de l'image) et écrit l'index"""
+    entries = []
+    for name, image_path in images:
+        entries.append((name, *image_hashes(load_thumbnail(image_path))))
+    index = ImageIndex.from_entries(entries)
+    index.save(path)
+    return index
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Index des photos de référence : un sous-répertoire par produit, nommé comme lui")
+    parser.add_argument("directory", help="répertoire des photos de référence")
+    parser.add_argument("--index", default=os.environ.get("FOODSAFE_IMAGE_INDEX", "data/images.npz"))
+    args = parser.parse_args(argv)
+    
+    images = []
+    for product in sorted(os.listdir(args.directory)):
+        product_dir = os.path.join(args.directory, product)
+        if os.path.isdir(product_dir):
+            images.extend((product, os.path.join(product_dir, name)) for name in sorted(os.listdir(product_dir))
+                          if name.lower().endswith((".jpg", ".jpeg", ".png")))
+    index = build_image_index(args.index, images)
+    print(f"{len(index)} images, {len(index.names)} produits -> {args.index}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""Rapprochement des rappels avec les produits du catalogue (MinHash et LSH)
+
+Un nom est représenté par l'ensemble de ses trigrammes (ceux de catalog.trigrams) et
+deux noms se ressemblent d'autant plus que l'indice de Jaccard de ces ensembles est
+élevé. Chaque nom reçoit une signature MinHash de `num_perm` valeurs : la probabilité
+que deux signatures coïncident sur une valeur est précisément cet indice. Les signatures
+sont découpées en bandes de quelques valeurs ; deux noms qui partagent une bande entière
+sont candidats. Le nombre de bandes et leur largeur sont choisis pour que les paires
+au-delà du seuil soient presque toujours candidates, les autres presque jamais.
+
+Le catalogue n'est donc jamais parcouru en entier : chaque rappel interroge une table
+triée par bande, puis seuls les meilleurs candidats (ceux qui partagent le plus de
+bandes) sont vérifiés par un calcul exact de l'indice de Jaccard.
+
+L'index est construit hors ligne (`python -m foodsafe.linkage`, ou à l'ingestion avec
+`python -m foodsafe.recalls --link`) : les correspondances recall_id -> produit du
+catalogue sont écrites dans le magasin de rappels (_links.parquet), que l'application
+se contente de lire.
+"""
+import argparse
+import json
+import os
+import sys
+import zlib
+
+import numpy as np
+
+from .catalog import trigrams
+from .text import normalize_name
+
+DEFAULT_THRESHOLD = 0.5
+DEFAULT_NUM_PERM = 64
+# Taille maximale d'un seau lu par bande (noms très génériques) et candidats vérifiés par nom
+MAX_BUCKET = 256
+TOP_CANDIDATES = 5
+# Correspondances rappel -> produit du catalogue, à côté du manifeste du magasin
+LINKS = "_links.parquet"
+_PRIME = (1 << 31) - 1
+_EMPTY = np.uint32(_PRIME)
+
+
+def jaccard(first, second):
+    """Indice de Jaccard des trigrammes de deux noms"""
+    first, second = trigrams(normalize_name(first)), trigrams(normalize_name(second))
+    if not first or not second:
+        return 0.0
+    return len(first & second) / len(first | second)
+
+
+def _collision_probability(similarity, bands, rows):
+    return 1 - (1 - similarity ** rows) ** bands
+
+
+def lsh_params(threshold, num_perm=DEFAULT_NUM_PERM, false_negative_weight=0.7):
+    """(bandes, largeur) minimisant la part pondérée de faux positifs et de faux négatifs autour du seuil"""
+    below = np.linspace(0, threshold, 64)
+    above = np.linspace(threshold, 1, 64)
+    best, best_error = None, None
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        false_positives = np.trapezoid(_collision_probability(below, bands, rows), below)
+        false_negatives = np.trapezoid(1 - _collision_probability(above, bands, rows), above)
+        error = (1 - false_negative_weight) * false_positives + false_negative_weight * false_negatives
+        if best_error is None or error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class _Shingler:
+    """Identifiants des trigrammes d'une série de noms, avec un cache par mot"""
+    
+    def __init__(self):
+        self.vocabulary = {}
+        self._words = {}
+    
+    def _word_ids(self, word):
+        ids = self._words.get(word)
+        if ids is None:
+            ids = []
+            for gram in trigrams(word):
+                gram_id = self.vocabulary.get(gram)
+                if gram_id is None:
+                    gram_id = self.vocabulary[gram] = len(self.vocabulary)
+                ids.append(gram_id)
+            ids = self._words[word] = ids
+        return ids
+    
+    def shingle(self, names):
+        """(identifiants concaténés, bornes par nom) ; les doublons n'ont pas d'effet sur le minimum"""
+        ids, offsets = [], [0]
+        for name in names:
+            for word in set(normalize_name(name).split()) if isinstance(name, str) else ():
+                ids.extend(self._word_ids(word))
+            offsets.append(len(ids))
+        return np.array(ids, dtype=np.int64), np.array(offsets, dtype=np.int64)
+    
+    def gram_hashes(self):
+        hashes = np.empty(len(self.vocabulary), dtype=np.uint64)
+        for gram, gram_id in self.vocabulary.items():
+            hashes[gram_id] = zlib.crc32(gram.encode("utf-8"))
+        return hashes
+
+
+class ProductLinker:
+    """Index LSH des noms du catalogue
+    
+    `threshold` est l'indice de Jaccard (sur les trigrammes) en deçà duquel un rappel
+    n'est rattaché à aucun produit.
+    """
+    
+    def __init__(self, names, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, seed=1,
+                 max_bucket=MAX_BUCKET, chunksize=50_000):
+        self.names = list(names)
+        self.threshold = threshold
+        self.max_bucket = max_bucket
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+        self._band_weights = rng.integers(1, 2 ** 63, size=self.rows, dtype=np.uint64) | np.uint64(1)
+        
+        keys = np.empty((self.bands, len(self.names)), dtype=np.uint64)
+        for start in range(0, len(self.names), chunksize):
+            keys[:, start:start + chunksize] = self._band_keys(self.names[start:start + chunksize]).T
+        self._order = np.argsort(keys, axis=1, kind="stable").astype(np.int32)
+        self._keys = np.take_along_axis(keys, self._order, axis=1)
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def _signatures(self, names):
+        """Signatures MinHash (uint32) ; les noms sans trigramme gardent une signature vide"""
+        shingler = _Shingler()
+        ids, offsets = shingler.shingle(names)
+        signatures = np.full((len(names), len(self._a)), _EMPTY, dtype=np.uint32)
+        if not len(ids):
+            return signatures
+        hashes = shingler.gram_hashes()[:, None]
+        table = ((hashes * self._a + self._b) % np.uint64(_PRIME)).astype(np.uint32)
+        filled = np.flatnonzero(np.diff(offsets))
+        signatures[filled] = np.minimum.reduceat(table[ids], offsets[filled], axis=0)
+        return signatures
+    
+    def _band_keys(self, names):
+        """Clé de 64 bits par bande (combinaison des valeurs de la bande), 0 pour un nom vide"""
+        signatures = self._signatures(names)
+        bands = signatures[:, :self.bands * self.rows].reshape(len(names), self.bands, self.rows).astype(np.uint64)
+        keys = (bands * self._band_weights).sum(axis=2, dtype=np.uint64)
+        keys[(signatures == _EMPTY).all(axis=1)] = 0
+        return keys
+    
+    def _candidate_pairs(self, names):
+        """(rang du nom, position dans le catalogue, bandes partagées) des paires candidates"""
+        keys = self._band_keys(names)
+        queries, positions = [], []
+        for band in range(self.bands):
+            band_keys = keys[:, band]
+            lo = np.searchsorted(self._keys[band], band_keys, side="left")
+            hi = np.searchsorted(self._keys[band], band_keys, side="right")
+            hi = np.minimum(hi, lo + self.max_bucket)
+            hi[band_keys == 0] = lo[band_keys == 0]
+            lengths = hi - lo
+            total = int(lengths.sum())
+            if not total:
+                continue
+            owner = np.repeat(np.arange(len(names), dtype=np.int64), lengths)
+            starts = np.repeat(lo - np.cumsum(lengths) + lengths, lengths)
+            queries.append(owner)
+            positions.append(self._order[band][starts + np.arange(total)])
+        if not queries:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        pairs = np.concatenate(queries) * len(self.names) + np.concatenate(positions)
+        pairs, shared = np.unique(pairs, return_counts=True)
+        return pairs // len(self.names), pairs % len(self.names), shared
+    
+    def _matches(self, names, limit):
+        """Candidats vérifiés de chaque nom : liste de (position, similarité), par similarité décroissante"""
+        queries, positions, shared = self._candidate_pairs(names)
+        # Meilleurs candidats d'abord (le plus de bandes partagées), au plus `limit` par nom
+        order = np.lexsort((positions, -shared, queries))
+        queries, positions = queries[order], positions[order]
+        starts = np.searchsorted(queries, queries, side="left")
+        keep = np.arange(len(queries)) - starts < limit
+        matches = [[] for _ in names]
+        query_grams = {}
+        for query, position in zip(queries[keep].tolist(), positions[keep].tolist()):
+            grams = query_grams.get(query)
+            if grams is None:
+                grams = query_grams[query] = trigrams(normalize_name(names[query]))
+            candidate = trigrams(normalize_name(self.names[position]))
+            similarity = len(grams & candidate) / len(grams | candidate) if grams and candidate else 0.0
+            if similarity >= self.threshold:
+                matches[query].append((position, similarity))
+        for found in matches:
+            found.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+    
+    def candidates(self, name, limit=TOP_CANDIDATES):
+        """Produits du catalogue proches de `name` : liste de (nom, similarité)"""
+        return [(self.names[position], similarity) for position, similarity in self._matches([name], limit)[0]]
+    
+    def link(self, names, chunksize=4096):
+        """Meilleur produit de chaque nom : liste de (nom du catalogue ou None, similarité)"""
+        names = list(names)
+        links = []
+        for start in range(0, len(names), chunksize):
+            for found in self._matches(names[start:start + chunksize], TOP_CANDIDATES):
+                links.append((self.names[found[0][0]], found[0][1]) if found else (None, 0.0))
+        return links
+
+
+def link_recalls(recalls, linker):
+    """Correspondances des rappels (DataFrame ou dictionnaires avec recall_id et product)
+    
+    Renvoie un DataFrame recall_id, recall_product, catalog_product (None sans
+    correspondance), link_similarity. Chaque nom distinct n'est rapproché qu'une fois.
+    """
+    import pandas as pd
+    
+    frame = recalls if hasattr(recalls, "columns") else pd.DataFrame(list(recalls))
+    frame = frame.reindex(columns=["recall_id", "product"]).dropna(subset=["recall_id"])
+    products = frame["product"].dropna().unique().tolist()
+    links = dict(zip(products, linker.link(products)))
+    matched = frame["product"].map(lambda product: links.get(product, (None, 0.0)))
+    return pd.DataFrame({
+        "recall_id": frame["recall_id"].astype("string").to_numpy(),
+        "recall_product": frame["product"].astype("string").to_numpy(),
+        "catalog_product": pd.array([link[0] for link in matched], dtype="string"),
+        "link_similarity": np.array([link[1] for link in matched], dtype=np.float32),
+    })
+
+
+def apply_links(recalls, links):
+    """Rappels dont le produit est remplacé par le produit du catalogue rapproché
+    
+    `links` est le résultat de link_recalls (ou de read_links). Le nom d'origine est
+    conservé dans recall_product et la similarité dans link_similarity ; un rappel sans
+    correspondance garde son nom.
+    """
+    import pandas as pd
+    
+    frame = recalls.copy() if hasattr(recalls, "columns") else pd.DataFrame(list(recalls))
+    if "product" not in frame.columns or "recall_id" not in frame.columns or links is None or links.empty:
+        return frame
+    matched = links.dropna(subset=["catalog_product"]).drop_duplicates("recall_id", keep="last").set_index("recall_id")
+    recall_ids = frame["recall_id"].astype("string")
+    linked = recall_ids.map(matched["catalog_product"])
+    frame["recall_product"] = frame["product"]
+    frame["product"] = linked.where(linked.notna(), frame["product"]).to_numpy()
+    frame["link_similarity"] = recall_ids.map(matched["link_similarity"]).fillna(0.0).astype("float32").to_numpy()
+    return frame
+
+
+# Correspondances calculées hors ligne, rangées à côté du magasin de rappels
+
+
+def links_path(store_root):
+    return os.path.join(store_root, LINKS)
+
+
+def links_stamp(path):
+    """Identifiant de la version du fichier de correspondances (0 s'il n'existe pas)"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def read_links(path, with_metadata=False):
+    """Correspondances enregistrées par write_links (None si le fichier n'existe pas)"""
+    import pyarrow.parquet as pq
+    
+    if not os.path.exists(path):
+        return (None, {}) if with_metadata else None
+    table = pq.read_table(path)
+    links = table.to_pandas()
+    if not with_metadata:
+        return links
+    metadata = json.loads((table.schema.metadata or {}).get(b"foodsafe.links", b"{}"))
+    return links, metadata
+
+
+def write_links(path, links, **metadata):
+    """Écrit les correspondances de façon atomique, avec leurs paramètres (version du catalogue, seuil)"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    table = pa.Table.from_pandas(links, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                           b"foodsafe.links": json.dumps(metadata).encode("utf-8")})
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def link_store(store, linker, catalog_version=None):
+    """Met à jour les correspondances du magasin `store` (RecallStore) ; renvoie le nombre de rappels rapprochés
+    
+    Seuls les rappels absents du fichier sont rapprochés, sauf si le catalogue ou le
+    seuil ont changé depuis : tout est alors recalculé.
+    """
+    import pandas as pd
+    
+    path = links_path(store.root)
+    links, metadata = read_links(path, with_metadata=True)
+    current = {"catalog_version": catalog_version, "threshold": linker.threshold}
+    if links is None or {key: metadata.get(key) for key in current} != current:
+        links = None
+    recalls = store.read(columns=["recall_id", "product"])
+    if links is not None:
+        recalls = recalls[~recalls["recall_id"].isin(links["recall_id"])]
+    if recalls.empty and links is not None:
+        return 0
+    added = link_recalls(recalls, linker)
+    links = added if links is None else pd.concat([links, added], ignore_index=True)
+    write_links(path, links, store_version=store.version, **current)
+    return len(added)
+
+
+def main(argv=None):
+    import time
+    
+    from .recalls import RecallStore
+    from .scoring import default_catalog
+    
+    parser = argparse.ArgumentParser(description="Rapproche les rappels du magasin des produits du catalogue")
+    parser.add_argument("--store", default=os.environ.get("FOODSAFE_RECALL_STORE", "data/recalls"))
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="indice de Jaccard minimal")
+    parser.add_argument("--num-perm", type=int, default=DEFAULT_NUM_PERM, help="taille des signatures MinHash")
+    parser.add_argument("--output", help="exporte aussi les correspondances dans ce fichier CSV")
+    args = parser.parse_args(argv)
+    
+    start = time.perf_counter()
+    catalog = default_catalog()
+    linker = ProductLinker(catalog, args.threshold, args.num_perm)
+    indexed = time.perf_counter()
+    store = RecallStore(args.store)
+    added = link_store(store, linker, getattr(catalog, "version", None))
+    done = time.perf_counter()
+    print(f"{len(linker)} produits indexés en {indexed - start:.1f} s ({linker.bands} bandes de {linker.rows}), "
+          f"{added} rappel(s) rapproché(s) en {done - indexed:.1f} s -> {links_path(store.root)}", file=sys.stderr)
+    if args.output:
+        read_links(links_path(store.root)).to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+"""Index des lots et des périodes visés par les rappels
+
+Un rappel vise rarement tout un produit : il cite des lots (« L240601 à L240615 ») et/ou
+une plage de dates limites. Chaque code de lot est normalisé puis découpé en famille
+(lettres qui l'entourent) et numéro ; une plage de lots est un intervalle de numéros
+dans une famille. Pour chaque produit, les intervalles de lots de chaque famille et les
+plages de dates sont rangés dans des arbres d'intervalles statiques : « ce lot est-il
+rappelé ? » est une recherche dichotomique.
+
+NumPy et pandas ne sont importés que par la version vectorisée (`match_many`) : le
+module reste léger pour les traitements ligne à ligne.
+"""
+import re
+from bisect import bisect_right
+from datetime import date, datetime
+
+from .text import normalize_name
+
+_LOT_LABEL = re.compile(r"^(?:N[O°º]\s*)?(?:LOTS?\b|LOTS?(?=\d))\s*(?:N[O°º])?\s*[:#]?\s*")
+_SEPARATORS = re.compile(r"[\s\-./_]+")
+_LOT_CODE = re.compile(r"^([A-Z]*)(\d+)(.*)$")
+_LIST_SEPARATORS = re.compile(r"[,;\n]+")
+_RANGE_SEPARATORS = re.compile(r"\s+(?:À|A|AU|TO)\s+|\.\.|…")
+_EPOCH = date(1970, 1, 1)
+
+
+def _is_missing(value):
+    """None, NaN, NaT ou pd.NA"""
+    if value is None or isinstance(value, str):
+        return value is None
+    try:
+        return bool(value != value)
+    except TypeError:
+        # pd.NA : la comparaison n'a pas de valeur de vérité
+        return True
+
+
+def normalize_lot(code):
+    """Code de lot en majuscules, sans mention « LOT » ni séparateurs ; None s'il est vide"""
+    if _is_missing(code):
+        return None
+    text = _LOT_LABEL.sub("", str(code).strip().upper())
+    text = _SEPARATORS.sub("", text)
+    return text or None
+
+
+def parse_lot(code):
+    """(famille, numéro) d'un code de lot ; None si le code est vide
+    
+    La famille réunit le préfixe alphabétique et ce qui suit le premier groupe de chiffres :
+    seuls des lots de la même famille sont comparables. Un code sans chiffres forme sa
+    propre famille, de numéro 0.
+    """
+    code = normalize_lot(code)
+    if code is None:
+        return None
+    match = _LOT_CODE.match(code)
+    if match is None:
+        return code, 0
+    prefix, digits, suffix = match.groups()
+    return f"{prefix}#{suffix}", int(digits)
+
+
+def parse_lot_ranges(text):
+    """Plages de lots d'un texte libre (« L240601-L240615, L240620 ») : liste de (famille, début, fin)"""
+    if _is_missing(text):
+        return []
+    ranges = []
+    for item in _LIST_SEPARATORS.split(str(text).upper()):
+        item = item.strip()
+        if not item:
+            continue
+        bounds = _RANGE_SEPARATORS.split(item)
+        if len(bounds) != 2 and item.count("-") == 1:
+            # « L240601-L240615 » : plage seulement si les deux bornes sont de la même famille
+            bounds = item.split("-")
+            first, last = parse_lot(bounds[0]), parse_lot(bounds[1])
+            if first is None or last is None or first[0] != last[0]:
+                bounds = [item]
+        if len(bounds) == 2:
+            first, last = parse_lot(bounds[0]), parse_lot(bounds[1])
+            if first is not None and last is not None and first[0] == last[0]:
+                ranges.append((first[0], min(first[1], last[1]), max(first[1], last[1])))
+                continue
+        lot = parse_lot(item)
+        if lot is not None:
+            ranges.append((lot[0], lot[1], lot[1]))
+    return ranges
+
+
+def _day(value):
+    """Jour (entier depuis 1970) d'une date, None si elle est absente ou invalide"""
+    if _is_missing(value) or (isinstance(value, str) and not value.strip()):
+        return None
+    if isinstance(value, str):
+        try:
+            value = date.fromisoformat(value.strip()[:10])
+        except ValueError:
+            pass
+    if isinstance(value, datetime):
+        value = value.date()
+    if not isinstance(value, date):
+        import pandas as pd
+        
+        timestamp = pd.to_datetime(value, errors="coerce")
+        if pd.isna(timestamp):
+            return None
+        value = timestamp.date()
+    return (value - _EPOCH).days
+
+
+def _merge(intervals):
+    """Union d'intervalles fermés d'entiers, triée et sans recouvrement"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class IntervalTree:
+    """Arbre d'intervalles fermés statique, stocké à plat
+    
+    Les intervalles sont triés par début ; le nœud d'un sous-tableau est son milieu et
+    retient la plus grande fin du sous-tableau. `stab` renvoie les intervalles contenant
+    un point en O(log n + k) ; `covers` répond par oui ou non en O(log n) grâce à l'union
+    des intervalles.
+    """
+    
+    def __init__(self, intervals):
+        """`intervals` : itérable de (début, fin, valeur)"""
+        intervals = sorted(intervals, key=lambda interval: (interval[0], interval[1]))
+        self.starts = [interval[0] for interval in intervals]
+        self.ends = [interval[1] for interval in intervals]
+        self.values = [interval[2] for interval in intervals]
+        self._max_end = list(self.ends)
+        self._build(0, len(intervals))
+        merged = _merge(zip(self.starts, self.ends))
+        self._union_starts = [start for start, _ in merged]
+        self._union_ends = [end for _, end in merged]
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    def _build(self, lo, hi):
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        for child in (self._build(lo, mid), self._build(mid + 1, hi)):
+            if child is not None and child > self._max_end[mid]:
+                self._max_end[mid] = child
+        return self._max_end[mid]
+    
+    def covers(self, point):
+        i = bisect_right(self._union_starts, point) - 1
+        return i >= 0 and self._union_ends[i] >= point
+    
+    def stab(self, point):
+        """Valeurs des intervalles contenant `point`"""
+        found = []
+        stack = [(0, len(self.starts))]
+        while stack:
+            lo, hi = stack.pop()
+            if lo >= hi:
+                continue
+            mid = (lo + hi) // 2
+            if self._max_end[mid] < point:
+                continue
+            stack.append((lo, mid))
+            if self.starts[mid] <= point:
+                if self.ends[mid] >= point:
+                    found.append(self.values[mid])
+                stack.append((mid + 1, hi))
+        return found
+
+
+class LotIndex:
+    """Rappels par produit, avec leurs lots et plages de dates limites
+    
+    Pour un article (produit, lot, date limite), chaque rappel du produit est :
+    
+    - confirmé : il vise tout le produit, ou le lot ou la date de l'article ;
+    - incertain : il vise des lots ou des dates que l'article ne précise pas ;
+    - écarté : l'article précise un lot (ou une date) que le rappel ne vise pas.
+    
+    Les rappels confirmés et incertains comptent dans la pénalité de rappel.
+    """
+    
+    def __init__(self):
+        self._products = {}  # produit normalisé -> rappels, arbres et ensembles de ciblage
+    
+    def __len__(self):
+        return sum(len(entry["recalls"]) for entry in self._products.values())
+    
+    def __contains__(self, product):
+        return normalize_name(product) in self._products
+    
+    @classmethod
+    def from_recalls(cls, recalls):
+        """Index construit depuis des rappels : DataFrame ou dictionnaires (recall_id, product, lots, expiry_start, expiry_end)"""
+        if hasattr(recalls, "to_dict"):
+            recalls = recalls.to_dict("records")
+        index = cls()
+        pending = {}
+        for recall in recalls:
+            product = recall.get("product")
+            if not isinstance(product, str) or not normalize_name(product):
+                continue
+            recall_id = recall.get("recall_id")
+            ranges = parse_lot_ranges(recall.get("lots"))
+            window = (_day(recall.get("expiry_start")), _day(recall.get("expiry_end")))
+            if window == (None, None):
+                window = None
+            else:
+                window = (window[0] if window[0] is not None else -2 ** 62,
+                          window[1] if window[1] is not None else 2 ** 62)
+            pending.setdefault(normalize_name(product), []).append((recall_id, ranges, window))
+        for key, recalls in pending.items():
+            index._products[key] = cls._build_entry(recalls)
+        return index
+    
+    @staticmethod
+    def _build_entry(recalls):
+        lot_intervals, windows, recall_ranges = {}, [], []
+        for i, (_, ranges, window) in enumerate(recalls):
+            by_family = {}
+            for family, start, end in ranges:
+                by_family.setdefault(family, []).append((start, end))
+            merged_by_family = {}
+            for family, intervals in by_family.items():
+                merged_by_family[family] = _merge(intervals)
+                lot_intervals.setdefault(family, []).extend((start, end, i) for start, end in merged_by_family[family])
+            recall_ranges.append(merged_by_family)
+            if window is not None:
+                windows.append((window[0], window[1], i))
+        return {
+            "recalls": [recall_id for recall_id, _, _ in recalls],
+            "lots": {family: IntervalTree(intervals) for family, intervals in lot_intervals.items()},
+            "expiry": IntervalTree(windows),
+            "lot_targeted": frozenset(i for i, (_, ranges, _) in enumerate(recalls) if ranges),
+            "expiry_targeted": frozenset(i for i, (_, _, window) in enumerate(recalls) if window is not None),
+            "product_wide": frozenset(i for i, (_, ranges, window) in enumerate(recalls) if not ranges and window is None),
+            "ranges": recall_ranges,     # rappel -> famille -> plages fusionnées [début, fin]
+            "windows": [window for _, _, window in recalls],
+        }
+    
+    def is_recalled(self, product, lot):
+        """Le lot est-il explicitement visé par un rappel du produit ? (O(log n))"""
+        entry = self._products.get(normalize_name(product))
+        parsed = parse_lot(lot)
+        if entry is None or parsed is None:
+            return False
+        tree = entry["lots"].get(parsed[0])
+        return tree is not None and tree.covers(parsed[1])
+    
+    def match(self, product, lot=None, expiry_date=None):
+        """Rappels concernant un article : {"confirmed": [...], "uncertain": [...], "lot_recalled": bool}"""
+        entry = self._products.get(normalize_name(product)) if isinstance(product, str) else None
+        if entry is None:
+            return {"confirmed": [], "uncertain": [], "lot_recalled": False}
+        parsed = parse_lot(lot)
+        day = _day(expiry_date)
+        targeted = set()
+        evaluable = set()
+        if parsed is not None:
+            evaluable |= entry["lot_targeted"]
+            if parsed[0] in entry["lots"]:
+                targeted.update(entry["lots"][parsed[0]].stab(parsed[1]))
+        if day is not None:
+            evaluable |= entry["expiry_targeted"]
+            targeted.update(entry["expiry"].stab(day))
+        # Incertain : aucun des critères du rappel n'est renseigné pour l'article
+        uncertain = (entry["lot_targeted"] | entry["expiry_targeted"]) - evaluable
+        recalls = entry["recalls"]
+        return {
+            "confirmed": [recalls[i] for i in sorted(targeted | entry["product_wide"])],
+            "uncertain": [recalls[i] for i in sorted(uncertain)],
+            "lot_recalled": bool(targeted),
+        }
+    
+    @staticmethod
+    def _vectors(entry):
+        """Bornes triées des intervalles d'un produit, construites au premier appel de match_many
+        
+        Pour chaque famille de lots et pour les dates limites : débuts et fins triés
+        séparément, de tous les rappels et des seuls rappels qui visent à la fois des lots
+        et des dates (« both », dont on garde aussi les plages rappel par rappel). Les plages
+        d'un même rappel étant fusionnées, le nombre d'intervalles contenant x est le nombre
+        de rappels qui le visent.
+        """
+        vectors = entry.get("vectors")
+        if vectors is None:
+            import numpy as np
+            
+            def bounds(intervals):
+                intervals = list(intervals)
+                return (np.sort(np.array([start for start, _ in intervals], dtype=np.int64)),
+                        np.sort(np.array([end for _, end in intervals], dtype=np.int64)))
+            
+            def rectangles(family):
+                # Plages (début, fin) des rappels qui visent lots et dates, groupées par rappel, et leurs fenêtres
+                intervals = [(start, end, i) for i in sorted(both) for start, end in entry["ranges"][i].get(family, ())]
+                recalls = np.array([i for _, _, i in intervals], dtype=np.int64)
+                first = np.flatnonzero(np.r_[True, recalls[1:] != recalls[:-1]]) if len(recalls) else recalls
+                windows = np.array([entry["windows"][i] for i in recalls[first]], dtype=np.int64).reshape(-1, 2)
+                return (np.array([start for start, _, _ in intervals], dtype=np.int64),
+                        np.array([end for _, end, _ in intervals], dtype=np.int64), first, windows[:, 0], windows[:, 1])
+            
+            both = entry["lot_targeted"] & entry["expiry_targeted"]
+            both_rectangles = {family: rectangles(family) for family in entry["lots"]}
+            vectors = entry["vectors"] = {
+                "lots": {family: (bounds(zip(tree.starts, tree.ends)), bounds(zip(*both_rectangles[family][:2])))
+                         for family, tree in entry["lots"].items()},
+                "expiry": (bounds(zip(entry["expiry"].starts, entry["expiry"].ends)),
+                           bounds(entry["windows"][i] for i in both)),
+                "both": both_rectangles,
+                "product_wide": len(entry["product_wide"]),
+                "lot_only": len(entry["lot_targeted"] - entry["expiry_targeted"]),
+                "expiry_only": len(entry["expiry_targeted"] - entry["lot_targeted"]),
+                "both_count": len(both),
+            }
+        return vectors
+    
+    def match_many(self, products, lots, expiry_dates):
+        """Version vectorisée de match : (nombre de rappels confirmés ou incertains, lot visé) par article
+        
+        `expiry_dates` est un tableau datetime64 (NaT si absente). Les articles sont groupés
+        par produit puis par famille de lots ; chaque groupe compte les intervalles qui le
+        contiennent par deux recherches dichotomiques (np.searchsorted) sur les bornes triées,
+        sans parcourir les rappels un à un. Seuls les articles susceptibles d'être visés à la
+        fois par le lot et par la date d'un même rappel sont confrontés aux rappels qui visent
+        lots et dates, pour ne compter ce rappel qu'une fois.
+        """
+        import numpy as np
+        import pandas as pd
+        
+        def covering(bounds, values):
+            starts, ends = bounds
+            return np.searchsorted(starts, values, "right") - np.searchsorted(ends, values, "left")
+        
+        def inside(rectangles, numbers, days, block=1 << 20):
+            # Rappels dont une plage contient le numéro de lot et la fenêtre la date, par blocs d'articles
+            starts, ends, first, window_starts, window_ends = rectangles
+            found = np.empty(len(numbers), dtype=np.int64)
+            step = max(1, block // len(starts))
+            for lo in range(0, len(numbers), step):
+                number, day = numbers[lo:lo + step, None], days[lo:lo + step, None]
+                by_lot = np.add.reduceat((starts <= number) & (ends >= number), first, axis=1)
+                found[lo:lo + step] = (by_lot & (window_starts <= day) & (window_ends >= day)).sum(axis=1)
+            return found
+        
+        products = np.asarray(products, dtype=object)
+        n = len(products)
+        counts = np.zeros(n, dtype=np.int64)
+        recalled = np.zeros(n, dtype=bool)
+        if not self._products or not n:
+            return counts, recalled
+        # Noms et lots normalisés une fois par valeur distincte
+        product_codes, product_uniques = pd.factorize(products)
+        key_codes, uniques = pd.factorize(np.array(
+            [normalize_name(name) if isinstance(name, str) else None for name in product_uniques] + [None], dtype=object))
+        codes = key_codes[product_codes]
+        lot_codes, lot_uniques = pd.factorize(np.asarray(lots, dtype=object))
+        normalized = pd.Series(np.append(lot_uniques.astype(object), None), dtype=object).map(normalize_lot)
+        extracted = normalized.str.extract(_LOT_CODE)
+        has_lot = normalized.notna().to_numpy()[lot_codes]
+        family_codes, family_uniques = pd.factorize(
+            np.where(extracted[1].notna(), extracted[0] + "#" + extracted[2], normalized).astype(object))
+        families = family_codes[lot_codes]
+        family_index = {family: i for i, family in enumerate(family_uniques)}
+        numbers = pd.to_numeric(extracted[1], errors="coerce").fillna(0).to_numpy(dtype=np.int64)[lot_codes]
+        days = np.asarray(expiry_dates, dtype="datetime64[ns]").astype("datetime64[D]")
+        has_day = ~np.isnat(days)
+        days = days.astype(np.int64)
+        
+        # Articles groupés par produit : un tri, puis une tranche par produit
+        order = np.argsort(codes, kind="stable")
+        starts = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        for code, key in enumerate(uniques):
+            entry = self._products.get(key)
+            if entry is None or starts[code] == starts[code + 1]:
+                continue
+            vectors = self._vectors(entry)
+            rows = order[starts[code]:starts[code + 1]]
+            row_lot, row_day, row_family = has_lot[rows], has_day[rows], families[rows]
+            dated = np.flatnonzero(row_day)
+            day_hits = np.zeros(len(rows), dtype=np.int64)
+            day_hits_both = np.zeros(len(rows), dtype=np.int64)
+            day_hits[dated] = covering(vectors["expiry"][0], days[rows[dated]])
+            day_hits_both[dated] = covering(vectors["expiry"][1], days[rows[dated]])
+            lot_hits = np.zeros(len(rows), dtype=np.int64)
+            twice = np.zeros(len(rows), dtype=np.int64)
+            for family, (all_bounds, both_bounds) in vectors["lots"].items():
+                if family not in family_index:
+                    continue
+                in_family = np.flatnonzero(row_lot & (row_family == family_index[family]))
+                lot_hits[in_family] = covering(all_bounds, numbers[rows[in_family]])
+                # Rappels visés à la fois par le lot et par la date : comptés une fois
+                candidates = in_family[(covering(both_bounds, numbers[rows[in_family]]) > 0) & (day_hits_both[in_family] > 0)]
+                if len(candidates):
+                    twice[candidates] = inside(vectors["both"][family], numbers[rows[candidates]], days[rows[candidates]])
+            no_lot, no_day = ~row_lot, ~row_day
+            counts[rows] = (vectors["product_wide"] + lot_hits + day_hits - twice
+                            + vectors["lot_only"] * no_lot + vectors["expiry_only"] * no_day
+                            + vectors["both_count"] * (no_lot & no_day))
+            recalled[rows] = (lot_hits + day_hits) > 0
+        return counts, recalled
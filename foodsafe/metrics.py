@@ -0,0 +1,208 @@
+"""Mesures internes : durées des étapes, compteurs et statistiques des caches
+
+Désactivé par défaut. Avec FOODSAFE_METRICS=1 dans l'environnement, chaque étape
+instrumentée alimente un histogramme de durées en mémoire ; les compteurs des caches
+enregistrés sont lus à la demande. Le tout s'exporte au format texte de Prometheus,
+dans un fichier ou sur un point d'accès HTTP.
+
+Désactivé, le coût est nul pour les fonctions décorées par `timed` (la fonction
+d'origine est renvoyée telle quelle) et se limite à un test de booléen pour `span` et
+`increment`.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from functools import wraps
+
+# Bornes supérieures des seaux d'histogramme, en secondes
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float("inf"))
+CACHE_COUNTERS = ("hits", "misses", "evictions", "expirations", "invalidations", "size")
+
+_NOOP = nullcontext()
+
+
+class Histogram:
+    """Histogramme cumulable de durées (seaux fixes, somme et nombre d'observations)"""
+    
+    __slots__ = ("counts", "count", "sum")
+    
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+    
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+    
+    def quantile(self, q):
+        """Quantile estimé par interpolation linéaire dans le seau concerné"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                lower = BUCKETS[i - 1] if i else 0.0
+                upper = BUCKETS[i] if BUCKETS[i] != float("inf") else lower * 2 or 1.0
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return BUCKETS[-2]
+
+
+class _Span:
+    __slots__ = ("registry", "name", "start")
+    
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Registry:
+    """Histogrammes, compteurs et caches observés d'un processus"""
+    
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._caches = {}
+    
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+    
+    def span(self, name):
+        """Contexte mesurant la durée d'un bloc sous le nom `name`"""
+        return _Span(self, name) if self.enabled else _NOOP
+    
+    def timed(self, name):
+        """Décorateur mesurant chaque appel ; sans effet si les mesures sont désactivées"""
+        def decorator(function):
+            if not self.enabled:
+                return function
+            
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+    
+    def increment(self, name, value=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+    
+    def register_cache(self, name, cache):
+        """Suit un cache exposant stats() (AnalysisCache) sous le nom `name`"""
+        if self.enabled:
+            self._caches[name] = cache
+    
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+    
+    def snapshot(self):
+        """État courant : {"spans": {nom: résumé}, "counters": {...}, "caches": {nom: stats}}"""
+        with self._lock:
+            histograms = {name: (list(h.counts), h.count, h.sum) for name, h in self._histograms.items()}
+            counters = dict(self._counters)
+        spans = {}
+        for name, (counts, count, total) in sorted(histograms.items()):
+            histogram = Histogram()
+            histogram.counts, histogram.count, histogram.sum = counts, count, total
+            spans[name] = {
+                "count": count,
+                "total_s": total,
+                "mean_ms": total / count * 1e3 if count else None,
+                "p50_ms": histogram.quantile(0.5) * 1e3,
+                "p95_ms": histogram.quantile(0.95) * 1e3,
+                "buckets": counts,
+            }
+        caches = {name: cache.stats() for name, cache in sorted(self._caches.items())}
+        return {"spans": spans, "counters": dict(sorted(counters.items())), "caches": caches}
+    
+    def render_prometheus(self):
+        """Export au format texte de Prometheus"""
+        snapshot = self.snapshot()
+        lines = [
+            "# HELP foodsafe_span_seconds Durée des étapes instrumentées",
+            "# TYPE foodsafe_span_seconds histogram",
+        ]
+        for name, span in snapshot["spans"].items():
+            cumulative = 0
+            for bound, count in zip(BUCKETS, span["buckets"]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'foodsafe_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'foodsafe_span_seconds_sum{{span="{name}"}} {span["total_s"]!r}')
+            lines.append(f'foodsafe_span_seconds_count{{span="{name}"}} {span["count"]}')
+        lines += ["# HELP foodsafe_events_total Évènements comptés", "# TYPE foodsafe_events_total counter"]
+        for name, value in snapshot["counters"].items():
+            lines.append(f'foodsafe_events_total{{event="{name}"}} {value}')
+        for counter in CACHE_COUNTERS:
+            metric = "foodsafe_cache_size" if counter == "size" else f"foodsafe_cache_{counter}_total"
+            lines.append(f"# TYPE {metric} {'gauge' if counter == 'size' else 'counter'}")
+            for name, stats in snapshot["caches"].items():
+                lines.append(f'{metric}{{cache="{name}"}} {stats.get(counter, 0)}')
+        return "\n".join(lines) + "\n"
+    
+    def write_prometheus(self, path):
+        """Écrit l'export de façon atomique (collecte par fichier, node_exporter par exemple)"""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp_path, path)
+    
+    def serve_prometheus(self, port, host="127.0.0.1"):
+        """Sert l'export sur http://host:port/metrics depuis un thread dédié ; renvoie le serveur"""
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        
+        registry = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip("/") not in ("", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, *args):
+                pass
+        
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="foodsafe-metrics", daemon=True).start()
+        return server
+
+
+REGISTRY = Registry(enabled=os.environ.get("FOODSAFE_METRICS", "").lower() in ("1", "true", "yes", "on"))
+span = REGISTRY.span
+timed = REGISTRY.timed
+increment = REGISTRY.increment
+register_cache = REGISTRY.register_cache
@@ -0,0 +1,232 @@
+"""Envoi des alertes par lots, canal par canal, avec asyncio
+
+Chaque canal (Email, SMS, Push notification) a sa file bornée, ses travailleurs et son
+backend. Les travailleurs regroupent les notifications en lots, limitent le nombre
+d'envois simultanés du canal et réessaient avec un délai exponentiel. Lorsqu'un canal
+est lent, sa file se remplit et `submit` attend : le producteur est freiné au lieu
+d'accumuler des millions de notifications en mémoire.
+
+Les backends fournis sont des substituts locaux : `FileSink` écrit les notifications en
+JSON Lines (SMS, push, ou email pour les tests) et `SmtpBackend` les remet à un serveur
+SMTP, par exemple un serveur de test local.
+"""
+import asyncio
+import json
+import os
+import random
+import smtplib
+import threading
+from collections import defaultdict
+from email.message import EmailMessage
+
+
+def _recall_summary(recall):
+    """Champs du rappel en texte, valeurs manquantes (None, NaN, NA, NaT) ramenées à None"""
+    summary = {}
+    for key, value in dict(recall).items():
+        text = None if value is None else str(value)
+        summary[key] = None if text in ("nan", "<NA>", "NaT") else text
+    return summary
+
+
+class FileSink:
+    """Backend local : ajoute chaque lot de notifications à un fichier JSON Lines"""
+    
+    def __init__(self, path, batch_size=1000, concurrency=1):
+        self.path = path
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self._lock = threading.Lock()
+    
+    def _write(self, notifications):
+        lines = [json.dumps(notification, ensure_ascii=False, default=str) + "\n" for notification in notifications]
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.writelines(lines)
+    
+    async def send_batch(self, notifications):
+        await asyncio.to_thread(self._write, notifications)
+
+
+class SmtpBackend:
+    """Backend email : une connexion SMTP par lot"""
+    
+    def __init__(self, host="localhost", port=1025, sender="alertes@foodsafe.local", batch_size=100, concurrency=4):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+    
+    def _message(self, notification):
+        recall = notification["recall"]
+        message = EmailMessage()
+        message["From"] = self.sender
+        message["To"] = notification["subscriber"]
+        message["Subject"] = f"Rappel produit : {recall.get('product') or 'produit alimentaire'}"
+        message.set_content(
+            f"Produit : {recall.get('product')}\n"
+            f"Marque : {recall.get('brand')}\n"
+            f"Motif : {recall.get('reason')}\n"
+            f"Sévérité : {recall.get('severity')}\n"
+        )
+        return message
+    
+    def _send(self, notifications):
+        with smtplib.SMTP(self.host, self.port, timeout=30) as smtp:
+            for notification in notifications:
+                smtp.send_message(self._message(notification))
+    
+    async def send_batch(self, notifications):
+        await asyncio.to_thread(self._send, notifications)
+
+
+def default_backends(outbox_dir, smtp_host=None, smtp_port=1025):
+    """Backends locaux : fichiers dans `outbox_dir`, et SMTP pour l'email si un hôte est fourni"""
+    email = SmtpBackend(smtp_host, smtp_port) if smtp_host else FileSink(os.path.join(outbox_dir, "email.jsonl"))
+    return {
+        "Email": email,
+        "SMS": FileSink(os.path.join(outbox_dir, "sms.jsonl")),
+        "Push notification": FileSink(os.path.join(outbox_dir, "push.jsonl")),
+    }
+
+
+class NotificationDispatcher:
+    """Répartition des notifications vers les backends de chaque canal"""
+    
+    def __init__(self, backends, queue_size=10_000, max_retries=5, base_delay=0.5, max_delay=30.0):
+        self.backends = backends
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = defaultdict(lambda: {"sent": 0, "failed": 0, "retries": 0, "batches": 0})
+        self.failed = []  # lots abandonnés après max_retries tentatives
+        self._queues = {}
+        self._workers = []
+    
+    async def start(self):
+        for channel, backend in self.backends.items():
+            self._queues[channel] = asyncio.Queue(maxsize=self.queue_size)
+            for _ in range(backend.concurrency):
+                self._workers.append(asyncio.create_task(self._worker(channel, backend)))
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.join()
+        await self.close()
+    
+    async def submit(self, notification):
+        """Met une notification en file ; attend si la file du canal est pleine"""
+        channel = notification["channel"]
+        if channel not in self._queues:
+            raise ValueError(f"Canal de notification inconnu : {channel!r}")
+        await self._queues[channel].put(notification)
+    
+    async def submit_many(self, notifications):
+        count = 0
+        for notification in notifications:
+            await self.submit(notification)
+            count += 1
+        return count
+    
+    async def join(self):
+        """Attend que toutes les notifications en file aient été traitées"""
+        await asyncio.gather(*(queue.join() for queue in self._queues.values()))
+    
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+    
+    async def _worker(self, channel, backend):
+        queue = self._queues[channel]
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < backend.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._send_with_retry(channel, backend, batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+    
+    async def _send_with_retry(self, channel, backend, batch):
+        stats = self.stats[channel]
+        for attempt in range(self.max_retries + 1):
+            try:
+                await backend.send_batch(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as error:
+                if attempt == self.max_retries:
+                    stats["failed"] += len(batch)
+                    self.failed.append((channel, batch, repr(error)))
+                    return
+                stats["retries"] += 1
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                await asyncio.sleep(delay * (0.5 + random.random()))
+            else:
+                stats["sent"] += len(batch)
+                stats["batches"] += 1
+                return
+
+
+def iter_notifications(recalls, recall_indices, subscribers, subscription_store):
+    """Notifications à envoyer pour des couples (rappel, abonné) issus de match_many"""
+    summaries = {}
+    for index, subscriber in zip(recall_indices, subscribers):
+        subscription = subscription_store.get(subscriber)
+        if subscription is None:
+            continue
+        if index not in summaries:
+            summaries[index] = _recall_summary(recalls[index])
+        for channel in subscription["channels"]:
+            yield {"channel": channel, "subscriber": subscriber, "recall": summaries[index]}
+
+
+async def notify_recalls(recalls, subscription_store, backends, **dispatcher_options):
+    """Apparie des rappels aux abonnements et envoie les alertes ; renvoie les statistiques par canal"""
+    recalls = list(recalls)
+    recall_indices, subscribers = subscription_store.match_many(recalls)
+    async with NotificationDispatcher(backends, **dispatcher_options) as dispatcher:
+        notifications = iter_notifications(recalls, recall_indices, subscribers, subscription_store)
+        await dispatcher.submit_many(n for n in notifications if n["channel"] in backends)
+    return {channel: dict(stats) for channel, stats in dispatcher.stats.items()}
+
+
+class BackgroundDispatcher:
+    """Dispatcher tournant dans sa propre boucle asyncio, sur un thread dédié
+    
+    Permet à un script synchrone (l'interface Streamlit) de déposer des notifications
+    sans attendre leur envoi.
+    """
+    
+    def __init__(self, backends, **dispatcher_options):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="foodsafe-notifications", daemon=True)
+        self._thread.start()
+        self.dispatcher = NotificationDispatcher(backends, **dispatcher_options)
+        asyncio.run_coroutine_threadsafe(self.dispatcher.start(), self._loop).result()
+    
+    def submit(self, notifications):
+        """Dépose des notifications ; renvoie un concurrent.futures.Future du nombre déposé"""
+        return asyncio.run_coroutine_threadsafe(self.dispatcher.submit_many(list(notifications)), self._loop)
+    
+    def stats(self):
+        return {channel: dict(stats) for channel, stats in self.dispatcher.stats.items()}
+    
+    def close(self, timeout=None):
+        async def shutdown():
+            await self.dispatcher.join()
+            await self.dispatcher.close()
+        
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(timeout)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+
@@ -0,0 +1,268 @@
+"""A priori de risque par catégorie et par marque, tenus à jour au fil des évènements
+
+Pour chaque catégorie et chaque marque (et pour l'ensemble), on tient : le nombre
+d'analyses avec la moyenne et la variance de leurs scores (algorithme de Welford), le
+nombre de rappels et leur répartition par sévérité. Chaque évènement (analyse ou rappel)
+met à jour quelques agrégats en O(1), et une requête n'en lit que quelques-uns : le
+score a priori d'un produit non référencé s'obtient sans relire l'historique.
+
+Ce score est déterministe : deux analyses du même produit avec les mêmes données
+donnent le même résultat, qui peut donc être mis en cache.
+
+Les agrégats d'analyses sont persistés par AnalysisPriorStore, partagé entre les
+processus ; ceux des rappels se reconstruisent depuis le magasin.
+"""
+import atexit
+import copy
+import json
+import math
+import os
+import threading
+
+from .text import normalize_name
+
+SEVERITY_WEIGHTS = {"Faible": 1 / 3, "Moyen": 2 / 3, "Élevé": 1.0}
+DEFAULT_SEVERITY = "Moyen"
+# Nombre d'observations fictives qui ramènent un petit groupe vers la moyenne globale
+PRIOR_STRENGTH = 20
+
+
+def _empty_aggregate():
+    return {"analyses": 0, "mean": 0.0, "m2": 0.0, "recalls": 0, "severity": {}}
+
+
+def _merge_analyses(aggregate, analyses, mean, m2):
+    """Fusionne des statistiques (effectif, moyenne, m2) dans un agrégat (formule de Chan)"""
+    if not analyses:
+        return
+    total = aggregate["analyses"] + analyses
+    delta = mean - aggregate["mean"]
+    aggregate["m2"] += m2 + delta * delta * aggregate["analyses"] * analyses / total
+    aggregate["mean"] += delta * analyses / total
+    aggregate["analyses"] = total
+
+
+def _text(value):
+    return value.strip() if isinstance(value, str) and value.strip() else None
+
+
+class RiskPriors:
+    """Agrégats de risque par catégorie et par marque"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._global = _empty_aggregate()
+        self._groups = {}     # ("category" | "brand", nom normalisé) -> agrégat
+        self._products = {}   # produit normalisé -> (catégorie, marque) relevées dans les rappels
+        self.version = 0
+    
+    def _aggregates(self, category, brand, create):
+        aggregates = []
+        for kind, value in (("category", category), ("brand", brand)):
+            value = _text(value)
+            if value is None:
+                continue
+            key = (kind, normalize_name(value))
+            aggregate = self._groups.get(key)
+            if aggregate is None and create:
+                aggregate = self._groups[key] = _empty_aggregate()
+            if aggregate is not None:
+                aggregates.append(aggregate)
+        return aggregates
+    
+    # Mise à jour
+    
+    def add_analysis(self, score, category=None, brand=None, product=None):
+        """Comptabilise le score d'une analyse ; catégorie et marque sont retrouvées d'après `product` si absentes"""
+        if category is None and brand is None and product:
+            category, brand = self._products.get(normalize_name(product), (None, None))
+        score = float(score)
+        with self._lock:
+            for aggregate in [self._global] + self._aggregates(category, brand, create=True):
+                aggregate["analyses"] += 1
+                delta = score - aggregate["mean"]
+                aggregate["mean"] += delta / aggregate["analyses"]
+                aggregate["m2"] += delta * (score - aggregate["mean"])
+            self.version += 1
+    
+    def add_recall(self, category=None, brand=None, severity=None, product=None, count=1):
+        severity = severity if severity in SEVERITY_WEIGHTS else DEFAULT_SEVERITY
+        with self._lock:
+            if _text(product):
+                self._products[normalize_name(product)] = (_text(category), _text(brand))
+            for aggregate in [self._global] + self._aggregates(category, brand, create=True):
+                aggregate["recalls"] += count
+                aggregate["severity"][severity] = aggregate["severity"].get(severity, 0) + count
+            self.version += 1
+    
+    def add_recalls(self, recalls):
+        """Ajoute une série de rappels (DataFrame ou liste de dictionnaires : product, category, brand, severity)"""
+        if hasattr(recalls, "columns"):
+            # DataFrame : un appel par combinaison distincte plutôt que par rappel
+            frame = recalls.reindex(columns=["product", "category", "brand", "severity"]).astype(object).fillna("")
+            for (product, category, brand, severity), count in frame.value_counts().items():
+                self.add_recall(category or None, brand or None, severity or None, product or None, int(count))
+            return
+        for recall in recalls:
+            self.add_recall(recall.get("category"), recall.get("brand"), recall.get("severity"), recall.get("product"))
+    
+    def copy(self):
+        """Copie indépendante des agrégats"""
+        priors = RiskPriors()
+        with self._lock:
+            priors._global = copy.deepcopy(self._global)
+            priors._groups = copy.deepcopy(self._groups)
+            priors._products = dict(self._products)
+            priors.version = self.version
+        return priors
+    
+    def analysis_aggregates(self):
+        """Statistiques des analyses, globales et par groupe, sérialisables en JSON"""
+        with self._lock:
+            return {
+                "global": [self._global["analyses"], self._global["mean"], self._global["m2"]],
+                "groups": {
+                    f"{kind}:{value}": [aggregate["analyses"], aggregate["mean"], aggregate["m2"]]
+                    for (kind, value), aggregate in self._groups.items() if aggregate["analyses"]
+                },
+            }
+    
+    def merge_analyses(self, data):
+        """Ajoute des statistiques d'analyses exportées par analysis_aggregates"""
+        with self._lock:
+            _merge_analyses(self._global, *data.get("global", (0, 0.0, 0.0)))
+            for key, stats in data.get("groups", {}).items():
+                kind, value = key.split(":", 1)
+                _merge_analyses(self._groups.setdefault((kind, value), _empty_aggregate()), *stats)
+            self.version += 1
+    
+    # Lecture
+    
+    @staticmethod
+    def _summary(aggregate):
+        analyses, recalls = aggregate["analyses"], aggregate["recalls"]
+        return {
+            "analyses": analyses,
+            "mean": aggregate["mean"] if analyses else None,
+            "std": math.sqrt(aggregate["m2"] / (analyses - 1)) if analyses > 1 else None,
+            "recalls": recalls,
+            "recall_rate": recalls / analyses if analyses else None,
+            "severity_mix": {severity: count / recalls for severity, count in aggregate["severity"].items()},
+        }
+    
+    def stats(self, kind=None, value=None):
+        """Résumé d'une catégorie (kind="category") ou d'une marque (kind="brand") ; global sans argument"""
+        if kind is None:
+            return self._summary(self._global)
+        aggregate = self._groups.get((kind, normalize_name(value)))
+        return None if aggregate is None else self._summary(aggregate)
+    
+    def groups_for(self, product_name):
+        """(catégorie, marque) d'un produit : relevées dans les rappels, sinon marque reconnue dans le nom"""
+        normalized = normalize_name(product_name or "")
+        if normalized in self._products:
+            return self._products[normalized]
+        words = normalized.split()
+        for candidate in words + [" ".join(pair) for pair in zip(words, words[1:])]:
+            if ("brand", candidate) in self._groups:
+                return None, candidate
+        return None, None
+    
+    def prior_score(self, category=None, brand=None, product_name=None, score_range=(15, 45)):
+        """Score a priori d'un produit non référencé, entier compris dans `score_range`
+        
+        Mélange à parts égales le score moyen des analyses du groupe (ramené vers la
+        moyenne globale s'il y en a peu) et la pression des rappels du groupe (nombre
+        atténué pour les petits effectifs, pondéré par la sévérité). Sans donnée, le score
+        correspond à un risque de 25 % de l'intervalle.
+        """
+        if category is None and brand is None and product_name:
+            category, brand = self.groups_for(product_name)
+        groups = self._aggregates(category, brand, create=False)
+        global_mean = self._global["mean"] if self._global["analyses"] else None
+        
+        means, pressure = [], 0.0
+        for aggregate in groups:
+            count = aggregate["analyses"]
+            if count and global_mean is not None:
+                weight = count / (count + PRIOR_STRENGTH)
+                means.append(weight * aggregate["mean"] + (1 - weight) * global_mean)
+            recalls = aggregate["recalls"]
+            if recalls:
+                severity = sum(SEVERITY_WEIGHTS[name] * n for name, n in aggregate["severity"].items()) / recalls
+                pressure = max(pressure, recalls / (recalls + PRIOR_STRENGTH) * severity)
+        mean = sum(means) / len(means) if means else global_mean
+        risk = 0.5 * (min(max(mean, 0.0), 100.0) / 100 if mean is not None else 0.5) + 0.5 * pressure
+        low, high = score_range
+        return int(round(low + (high - low) * risk))
+
+
+class AnalysisPriorStore:
+    """Agrégats des scores d'analyse enregistrés sur disque, partagés entre les processus
+    
+    Chaque processus accumule ses analyses puis, à l'écriture, relit le fichier, y
+    fusionne ses analyses en attente et le remplace de façon atomique : les analyses
+    enregistrées par les autres processus sont conservées.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = RiskPriors()
+    
+    def add_analysis(self, score, category=None, brand=None):
+        with self._lock:
+            self._pending.add_analysis(score, category, brand)
+    
+    @property
+    def pending(self):
+        """Nombre d'analyses pas encore écrites"""
+        return self._pending.stats()["analyses"]
+    
+    def stamp(self):
+        """Date de modification du fichier (0 s'il n'existe pas), pour les clés de cache"""
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    
+    def read(self):
+        """Statistiques enregistrées (voir RiskPriors.analysis_aggregates)"""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+    
+    def save(self):
+        """Fusionne les analyses en attente dans le fichier"""
+        with self._lock:
+            pending, self._pending = self._pending, RiskPriors()
+            priors = RiskPriors()
+            priors.merge_analyses(self.read())
+            priors.merge_analyses(pending.analysis_aggregates())
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(priors.analysis_aggregates(), f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+    
+    def autosave(self, interval=30.0):
+        """Écrit les analyses en attente toutes les `interval` secondes depuis un thread, et à l'arrêt du processus"""
+        stopped = threading.Event()
+        
+        def flush():
+            if self.pending:
+                self.save()
+        
+        def loop():
+            while not stopped.wait(interval):
+                flush()
+        
+        def stop():
+            stopped.set()
+            flush()
+        
+        threading.Thread(target=loop, name="priors-autosave", daemon=True).start()
+        atexit.register(stop)
+        return stop
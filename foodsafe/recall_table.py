@@ -0,0 +1,116 @@
+"""Vue paginée et filtrable des rappels, adossée à des index précalculés"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+SEVERITY_ORDER = ["Élevé", "Moyen", "Faible"]
+SORT_KEYS = {"date": "Date", "severity": "Sévérité", "product": "Produit"}
+
+
+class RecallTable:
+    """Rappels triés une fois, interrogés page par page
+    
+    Pour chaque ordre de tri, les positions des lignes de chaque sévérité et de chaque
+    motif sont calculées à la première utilisation puis conservées : un filtre combine
+    ces listes triées sans parcourir la table, et une page ne lit que ses propres lignes.
+    """
+    
+    def __init__(self, frame, memo_size=64):
+        self.frame = frame.sort_values("date", kind="stable").reset_index(drop=True)
+        self._dates = self.frame["date"].to_numpy(dtype="datetime64[ns]")
+        n = len(self.frame)
+        
+        severity = self.frame["severity"].astype(object).fillna("")
+        extra = sorted(set(severity) - set(SEVERITY_ORDER))
+        self._codes = {
+            "severity": pd.Categorical(severity, categories=SEVERITY_ORDER + extra),
+            "reason": pd.Categorical(self.frame["reason"].astype(object).fillna("")),
+        }
+        product_codes = pd.Categorical(self.frame["product"].astype(object).fillna("")).codes
+        self._orders = {
+            "date": np.arange(n),
+            # Ordre croissant : du moins grave au plus grave
+            "severity": np.lexsort((np.arange(n), -self._codes["severity"].codes)),
+            "product": np.lexsort((np.arange(n), product_codes)),
+        }
+        self._postings = {}
+        self._memo = OrderedDict()
+        self._memo_size = memo_size
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.frame)
+    
+    def values(self, column):
+        """Valeurs possibles d'un filtre ("severity" ou "reason"), les plus fréquentes en premier"""
+        codes = self._codes[column]
+        counts = np.bincount(codes.codes[codes.codes >= 0], minlength=len(codes.categories))
+        if column == "severity":
+            return [value for value, count in zip(codes.categories, counts) if count]
+        return [codes.categories[i] for i in np.argsort(-counts, kind="stable") if counts[i]]
+    
+    def _positions_for(self, sort, column, value):
+        """Positions (dans l'ordre de tri) des lignes ayant `value` dans `column`"""
+        key = (sort, column, value)
+        if key not in self._postings:
+            codes = self._codes[column]
+            code = codes.categories.get_loc(value) if value in codes.categories else -2
+            self._postings[key] = np.flatnonzero(codes.codes[self._orders[sort]] == code)
+        return self._postings[key]
+    
+    def _filtered_positions(self, sort, severities, reasons, start, end):
+        key = (sort, severities, reasons, start, end)
+        with self._lock:
+            if key in self._memo:
+                self._memo.move_to_end(key)
+                return self._memo[key]
+        
+        positions = None
+        for column, selected in (("severity", severities), ("reason", reasons)):
+            if not selected:
+                continue
+            # Les listes d'un même filtre sont disjointes : leur union triée est sans doublon
+            union = np.sort(np.concatenate([self._positions_for(sort, column, value) for value in selected]))
+            positions = union if positions is None else np.intersect1d(positions, union, assume_unique=True)
+        
+        if start is not None or end is not None:
+            lo = 0 if start is None else np.searchsorted(self._dates, np.datetime64(pd.Timestamp(start), "ns"), "left")
+            hi = len(self._dates) if end is None else np.searchsorted(
+                self._dates, np.datetime64(pd.Timestamp(end), "ns"), "right")
+            if sort == "date":
+                # Dans l'ordre chronologique, la période est un intervalle de positions
+                if positions is None:
+                    positions = np.arange(lo, hi)
+                else:
+                    positions = positions[np.searchsorted(positions, lo):np.searchsorted(positions, hi)]
+            else:
+                if positions is None:
+                    positions = np.arange(len(self.frame))
+                rows = self._orders[sort][positions]
+                positions = positions[(rows >= lo) & (rows < hi)]
+        
+        with self._lock:
+            self._memo[key] = positions
+            if len(self._memo) > self._memo_size:
+                self._memo.popitem(last=False)
+        return positions
+    
+    def query(self, severities=(), reasons=(), start=None, end=None, sort="date", descending=True,
+              page=0, page_size=25):
+        """Page de rappels filtrés et triés ; renvoie (DataFrame de la page, nombre total de résultats)"""
+        positions = self._filtered_positions(sort, tuple(severities), tuple(reasons), start, end)
+        total = len(self.frame) if positions is None else len(positions)
+        first = page * page_size
+        last = min(first + page_size, total)
+        if first >= total:
+            return self.frame.iloc[[]], total
+        if descending:
+            # Page lue depuis la fin de l'ordre croissant
+            selected = np.arange(total - 1 - first, total - 1 - last, -1)
+        else:
+            selected = np.arange(first, last)
+        if positions is not None:
+            selected = positions[selected]
+        return self.frame.iloc[self._orders[sort][selected]], total
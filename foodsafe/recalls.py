@@ -0,0 +1,374 @@
+"""Ingestion incrémentale des flux de rappels dans un magasin Parquet en ajout seul
+
+Organisation du magasin :
+    
+    <racine>/_manifest.json             version publiée, partitions, positions de lecture des flux
+    <racine>/month=AAAA-MM/part-N.parquet   rappels du mois, un fichier par ingestion
+
+Chaque ingestion n'écrit que de nouveaux fichiers puis remplace le manifeste de façon
+atomique : les lecteurs voient soit l'ancienne version, soit la nouvelle. Un seul
+processus d'ingestion doit écrire dans un magasin donné.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+
+import pandas as pd
+
+from .rollups import RollupStore
+
+RECALL_COLUMNS = [
+    "recall_id", "date", "product", "brand", "category", "reason", "severity",
+    # Lots visés (texte libre, voir foodsafe.lots) et plage de dates limites concernées
+    "lots", "expiry_start", "expiry_end",
+]
+DEFAULT_SEVERITY = "Moyen"
+
+# Noms de colonnes de l'export officiel (Rappel Conso) vers le schéma du magasin
+FEED_COLUMNS = {
+    "id": "recall_id",
+    "reference_fiche": "recall_id",
+    "date_publication": "date",
+    "date_de_publication": "date",
+    "noms_des_modeles_ou_references": "product",
+    "nom_du_produit": "product",
+    "nom_de_la_marque_du_produit": "brand",
+    "marque": "brand",
+    "sous_categorie_de_produit": "category",
+    "categorie": "category",
+    "motif_du_rappel": "reason",
+    "motif": "reason",
+    "niveau_de_gravite": "severity",
+    "gravite": "severity",
+    "lots": "lots",
+    "numeros_de_lot": "lots",
+    "lot": "lots",
+    "date_limite_debut": "expiry_start",
+    "date_limite_fin": "expiry_end",
+}
+
+MANIFEST = "_manifest.json"
+ROLLUPS = "_rollups.json"
+
+
+def normalize_records(records):
+    """Convertit des enregistrements bruts du flux en DataFrame au schéma du magasin
+    
+    Les lignes sans identifiant ou sans date exploitable sont écartées.
+    """
+    frame = pd.DataFrame.from_records(records)
+    frame = frame.rename(columns={column: FEED_COLUMNS.get(column, column) for column in frame.columns})
+    frame = frame.loc[:, ~frame.columns.duplicated()]
+    for column in RECALL_COLUMNS:
+        if column not in frame:
+            frame[column] = None
+    frame = frame[RECALL_COLUMNS]
+    frame["recall_id"] = frame["recall_id"].astype("string").str.strip()
+    frame["date"] = pd.to_datetime(frame["date"], format="ISO8601", errors="coerce", utc=True).dt.tz_localize(None).dt.normalize()
+    for column in ("expiry_start", "expiry_end"):
+        frame[column] = pd.to_datetime(frame[column], format="ISO8601", errors="coerce", utc=True).dt.tz_localize(None).dt.normalize().astype("datetime64[us]")
+    frame["severity"] = frame["severity"].fillna(DEFAULT_SEVERITY)
+    for column in ("product", "brand", "category", "reason", "severity", "lots"):
+        frame[column] = frame[column].astype("string")
+    return frame[frame["recall_id"].notna() & (frame["recall_id"] != "") & frame["date"].notna()]
+
+
+def _iter_line_chunks(path, offset, chunksize):
+    """Lit les lignes complètes d'un fichier à partir d'un offset, par paquets
+    
+    Renvoie des couples (lignes, offset après le paquet) ; une dernière ligne sans
+    retour à la ligne est laissée pour la prochaine lecture.
+    """
+    with open(path, "rb") as f:
+        f.seek(offset)
+        lines = []
+        for raw in f:
+            if not raw.endswith(b"\n"):
+                break
+            offset += len(raw)
+            if raw.strip():
+                lines.append(raw.decode("utf-8"))
+            if len(lines) >= chunksize:
+                yield lines, offset
+                lines = []
+        if lines:
+            yield lines, offset
+
+
+def _read_csv_dialect(path):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        header = f.readline()
+    return ";" if header.count(";") > header.count(",") else ","
+
+
+def _iter_csv_records(path, offset, delimiter):
+    """Enregistrements CSV complets à partir d'un offset, avec l'offset qui suit chacun
+    
+    Un champ entre guillemets peut s'étendre sur plusieurs lignes : l'offset n'est relevé
+    qu'en fin d'enregistrement, et un enregistrement inachevé en fin de fichier est laissé
+    pour la prochaine lecture.
+    """
+    state = {"offset": offset, "eof": False}
+    with open(path, "rb") as f:
+        f.seek(offset)
+        
+        def lines():
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                state["offset"] += len(raw)
+                yield raw.decode("utf-8")
+            state["eof"] = True
+        
+        for row in csv.reader(lines(), delimiter=delimiter):
+            # Le lecteur ne rend une ligne après la fin des données que si elle est inachevée
+            if state["eof"]:
+                break
+            if row:
+                yield row, state["offset"]
+
+
+def iter_feed_chunks(path, offset=0, chunksize=50_000):
+    """Parcourt un export JSON Lines ou CSV par paquets d'enregistrements bruts
+    
+    Renvoie des couples (enregistrements, offset de reprise).
+    """
+    if path.endswith(".csv"):
+        delimiter = _read_csv_dialect(path)
+        fieldnames, header_end = next(_iter_csv_records(path, 0, delimiter), ([], 0))
+        if not fieldnames:
+            return
+        records, end = [], None
+        for row, end in _iter_csv_records(path, max(offset, header_end), delimiter):
+            records.append(dict(zip(fieldnames, row)))
+            if len(records) >= chunksize:
+                yield records, end
+                records = []
+        if records:
+            yield records, end
+    else:
+        for lines, end in _iter_line_chunks(path, offset, chunksize):
+            yield [json.loads(line) for line in lines], end
+
+
+class RecallStore:
+    """Magasin local des rappels, partitionné par mois"""
+    
+    def __init__(self, root):
+        self.root = root
+        self._manifest = None
+        self._manifest_mtime = None
+        self._known_ids = None
+    
+    # Manifeste
+    
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST)
+    
+    def manifest(self):
+        """Manifeste publié, relu uniquement s'il a changé sur disque"""
+        try:
+            mtime = os.stat(self._manifest_path()).st_mtime_ns
+        except FileNotFoundError:
+            return {"version": 0, "partitions": {}, "sources": {}}
+        if mtime != self._manifest_mtime:
+            with open(self._manifest_path(), encoding="utf-8") as f:
+                self._manifest = json.load(f)
+            self._manifest_mtime = mtime
+        return self._manifest
+    
+    def _publish(self, manifest):
+        tmp_path = self._manifest_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+        os.replace(tmp_path, self._manifest_path())
+    
+    @property
+    def version(self):
+        """Numéro de version des données, incrémenté à chaque ingestion non vide"""
+        return self.manifest()["version"]
+    
+    def months(self):
+        """Mois disponibles (AAAA-MM), par ordre croissant"""
+        return sorted(self.manifest()["partitions"])
+    
+    def __len__(self):
+        return sum(partition["rows"] for partition in self.manifest()["partitions"].values())
+    
+    # Lecture
+    
+    def _files(self, months):
+        partitions = self.manifest()["partitions"]
+        return [
+            os.path.join(self.root, f"month={month}", name)
+            for month in months
+            for name in partitions[month]["files"]
+        ]
+    
+    def read(self, start=None, end=None, columns=None):
+        """Rappels publiés entre `start` et `end` (inclus), en ne lisant que les mois concernés"""
+        import pyarrow.parquet as pq
+        
+        start = pd.Timestamp(start) if start is not None else None
+        end = pd.Timestamp(end) if end is not None else None
+        months = [
+            month for month in self.months()
+            if (start is None or month >= start.strftime("%Y-%m")) and (end is None or month <= end.strftime("%Y-%m"))
+        ]
+        files = self._files(months)
+        if columns is not None and "date" not in columns:
+            columns = ["date"] + list(columns)
+        if not files:
+            return pd.DataFrame(columns=columns or RECALL_COLUMNS)
+        frame = pq.ParquetDataset(files, partitioning=None).read(columns=columns).to_pandas()
+        if start is not None:
+            frame = frame[frame["date"] >= start]
+        if end is not None:
+            frame = frame[frame["date"] <= end]
+        return frame.reset_index(drop=True)
+    
+    def _stored_rollups(self, version):
+        """Agrégats enregistrés s'ils correspondent à la version `version` du magasin, sinon None"""
+        path = os.path.join(self.root, ROLLUPS)
+        if not os.path.exists(path):
+            return None
+        rollups = RollupStore.load(path)
+        return rollups if rollups.data_version == version else None
+    
+    def rollups(self):
+        """Agrégats jour/semaine/mois des rappels stockés, reconstruits s'ils manquent ou sont d'une autre version"""
+        version = self.version
+        rollups = self._stored_rollups(version)
+        if rollups is None:
+            rollups = RollupStore()
+            if version:
+                rollups.add_recalls(self.read(columns=["category", "severity"]))
+            rollups.data_version = version
+        return rollups
+    
+    # Écriture
+    
+    def known_ids(self):
+        """Identifiants déjà stockés (seule la colonne recall_id est relue, une fois)"""
+        if self._known_ids is None:
+            import pyarrow.parquet as pq
+            
+            self._known_ids = set()
+            files = self._files(self.months())
+            if files:
+                self._known_ids.update(pq.ParquetDataset(files, partitioning=None).read(columns=["recall_id"]).column(0).to_pylist())
+        return self._known_ids
+    
+    def append(self, frame, sources=None):
+        """Ajoute les rappels inédits de `frame` et publie une nouvelle version
+        
+        `sources` met à jour les positions de lecture des flux dans le même manifeste.
+        Renvoie les lignes effectivement ajoutées.
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        
+        known = self.known_ids()
+        frame = frame.drop_duplicates("recall_id", keep="last")
+        frame = frame[~frame["recall_id"].isin(known)]
+        manifest = json.loads(json.dumps(self.manifest()))
+        if sources:
+            manifest["sources"].update(sources)
+        if frame.empty:
+            if sources:
+                self._publish(manifest)
+            return frame
+        
+        previous_rollups = self._stored_rollups(manifest["version"])
+        version = manifest["version"] + 1
+        for month, rows in frame.groupby(frame["date"].dt.strftime("%Y-%m")):
+            directory = os.path.join(self.root, f"month={month}")
+            os.makedirs(directory, exist_ok=True)
+            name = f"part-{version:08d}.parquet"
+            tmp_path = os.path.join(directory, f".{name}.tmp")
+            pq.write_table(pa.Table.from_pandas(rows, preserve_index=False), tmp_path)
+            os.replace(tmp_path, os.path.join(directory, name))
+            partition = manifest["partitions"].setdefault(month, {"files": [], "rows": 0})
+            partition["files"].append(name)
+            partition["rows"] += len(rows)
+        manifest["version"] = version
+        self._publish(manifest)
+        known.update(frame["recall_id"])
+        # Agrégats enregistrés après la publication, marqués de sa version : mis à jour avec les seuls
+        # nouveaux rappels s'ils étaient à jour, sinon reconstruits
+        if previous_rollups is None:
+            rollups = self.rollups()
+        else:
+            rollups = previous_rollups
+            rollups.add_recalls(frame)
+            rollups.data_version = version
+        rollups.save(os.path.join(self.root, ROLLUPS))
+        return frame
+
+
+def ingest_file(store, path, chunksize=50_000):
+    """Ingère la partie non encore lue d'un export de rappels ; renvoie les rappels ajoutés"""
+    source = os.path.abspath(path)
+    offset = store.manifest()["sources"].get(source, 0)
+    if offset > os.path.getsize(path):
+        # Fichier tronqué ou remplacé : relecture complète, les doublons sont écartés
+        offset = 0
+    added = []
+    for records, offset in iter_feed_chunks(path, offset, chunksize):
+        added.append(store.append(normalize_records(records), sources={source: offset}))
+    return pd.concat(added, ignore_index=True) if added else normalize_records([])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingestion des exports de rappels (JSON Lines ou CSV)")
+    parser.add_argument("files", nargs="+", help="fichiers .jsonl ou .csv à ingérer")
+    parser.add_argument("--store", default=os.environ.get("FOODSAFE_RECALL_STORE", "data/recalls"))
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--follow", type=float, metavar="SECONDES",
+                        help="surveille les fichiers et ingère les nouvelles lignes à cet intervalle")
+    parser.add_argument("--notify", action="store_true",
+                        help="envoie les alertes aux abonnés concernés par les rappels ajoutés")
+    parser.add_argument("--subscriptions", default=os.environ.get("FOODSAFE_SUBSCRIPTIONS", "data/subscriptions.jsonl"))
+    parser.add_argument("--outbox", default=os.environ.get("FOODSAFE_OUTBOX", "data/outbox"),
+                        help="répertoire des notifications SMS/push (et email sans serveur SMTP)")
+    parser.add_argument("--link", type=float, nargs="?", const=-1.0, metavar="SEUIL",
+                        help="rattache les rappels ajoutés aux produits du catalogue (voir foodsafe.linkage)")
+    args = parser.parse_args(argv)
+    
+    store = RecallStore(args.store)
+    if args.notify:
+        import asyncio
+        
+        from .alerts import SubscriptionStore
+        from .notifications import default_backends, notify_recalls
+        
+        subscriptions = SubscriptionStore(args.subscriptions)
+        backends = default_backends(args.outbox, os.environ.get("FOODSAFE_SMTP_HOST"))
+    linker = None
+    if args.link is not None:
+        from .linkage import DEFAULT_THRESHOLD, ProductLinker, link_store
+        from .scoring import default_catalog
+        
+        catalog = default_catalog()
+        linker = ProductLinker(catalog, DEFAULT_THRESHOLD if args.link < 0 else args.link)
+    while True:
+        for path in args.files:
+            added = ingest_file(store, path, args.chunksize)
+            if len(added):
+                print(f"{path}: {len(added)} rappel(s) ajouté(s), version {store.version}")
+                if args.notify:
+                    stats = asyncio.run(notify_recalls(added.to_dict("records"), subscriptions, backends))
+                    for channel, counts in stats.items():
+                        print(f"  {channel}: {counts['sent']} envoyée(s), {counts['failed']} en échec")
+                if linker is not None:
+                    linked = link_store(store, linker, getattr(catalog, "version", None))
+                    print(f"  {linked} rappel(s) rattaché(s) au catalogue")
+        if not args.follow:
+            break
+        time.sleep(args.follow)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,523 @@
+"""Rapports d'analyse (CSV, HTML et PDF) par produit ou par magasin, générés en parallèle
+
+Les résultats d'analyse arrivent en flux (paquets de analyze_food_risk_batch ou
+dictionnaires) et sont découpés en tâches de quelques documents, rendues par un pool
+de processus. Le nombre de tâches en vol est borné par la taille du pool : la mémoire
+dépend du nombre de processus, pas de la taille du lot. Chaque processus écrit ses
+fichiers directement dans le répertoire de sortie ; pour une archive zip, les
+documents rendus remontent au processus principal, seul à écrire dans l'archive (qui
+ne garde en mémoire que son index, quelques centaines d'octets par fichier).
+
+Les illustrations statiques (échelle de risque de chaque niveau) sont dessinées une
+fois, transmises aux processus à leur démarrage et partagées par tous les documents.
+Les PDF sont écrits directement (texte en Helvetica, images compressées), sans
+bibliothèque de mise en page.
+"""
+import argparse
+import csv
+import hashlib
+import html
+import io
+import os
+import re
+import sys
+import textwrap
+import unicodedata
+import zipfile
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+
+from .results import GENERIC_CODE, RECOMMENDATIONS, RISK_LEVELS
+
+FORMATS = ("csv", "html", "pdf")
+GROUPINGS = ("product", "store")
+REPORT_COLUMNS = ("product_name", "store", "lot_number", "expiry_date", "risk_score", "risk_level",
+                  "recalls_count", "lot_recalled", "lot_info", "recommendation_code")
+COLUMN_LABELS = {
+    "product_name": "Produit", "store": "Magasin", "lot_number": "Lot", "expiry_date": "Date limite",
+    "risk_score": "Score", "risk_level": "Niveau", "recalls_count": "Rappels", "lot_recalled": "Lot rappelé",
+    "lot_info": "Lot analysé", "recommendation_code": "Code recommandations",
+}
+# Couleurs des niveaux, celles de l'application
+LEVEL_COLORS = {"Faible": "#4ECDC4", "Moyen": "#FFE66D", "Élevé": "#FF6B6B"}
+ASSETS_DIR = "assets"
+# Documents rendus par tâche, et lignes au plus par partie d'un rapport de magasin
+BATCH_SIZE = 64
+STORE_PART_ROWS = 5_000
+
+_WORKER = {}
+
+
+# Illustrations statiques
+
+
+def chart_name(level):
+    return f"{ASSETS_DIR}/risque-{slug(level)}.png"
+
+
+def render_static_charts(width=480, height=72):
+    """Échelle de risque de chaque niveau, dessinée une fois : {niveau: {"png", "size", "rgb"}}
+    
+    "rgb" contient les pixels bruts compressés (zlib), insérés tels quels dans les PDF.
+    """
+    from PIL import Image, ImageDraw
+    
+    charts = {}
+    segment = width // len(RISK_LEVELS)
+    for level in RISK_LEVELS:
+        image = Image.new("RGB", (width, height), "white")
+        draw = ImageDraw.Draw(image)
+        for i, name in enumerate(RISK_LEVELS):
+            color = LEVEL_COLORS[name] if name == level else "#E6E6E6"
+            draw.rectangle((i * segment + 2, 8, (i + 1) * segment - 2, height - 26), fill=color)
+            draw.text((i * segment + 8, height - 20), name, fill="black" if name == level else "gray")
+        png = io.BytesIO()
+        image.save(png, format="PNG", optimize=True)
+        charts[level] = {"png": png.getvalue(), "size": image.size, "rgb": zlib.compress(image.tobytes(), 6)}
+    return charts
+
+
+# Mise en forme
+
+
+def slug(text, limit=60):
+    """Nom de fichier ASCII d'un texte libre"""
+    ascii_text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_text.lower()).strip("-")[:limit] or "sans-nom"
+
+
+def store_stem(store):
+    """Nom de fichier d'un magasin : slug lisible et empreinte du nom exact, distincte pour deux magasins"""
+    return f"{slug(store)}-{hashlib.sha1(str(store).encode('utf-8')).hexdigest()[:10]}"
+
+
+def _value(value):
+    """Valeur affichable : manquants (None, NaN) vides, types NumPy ramenés aux types Python"""
+    if value is None or value != value:
+        return ""
+    return value.item() if hasattr(value, "item") else value
+
+
+def _level(row):
+    return row["risk_level"] if row["risk_level"] in RISK_LEVELS else RISK_LEVELS[0]
+
+
+def _row(record):
+    row = {column: _value(record.get(column)) for column in REPORT_COLUMNS}
+    if row["recommendation_code"] == "":
+        row["recommendation_code"] = GENERIC_CODE
+    row["lot_recalled"] = bool(row["lot_recalled"])
+    return row
+
+
+def recommendations(row):
+    return RECOMMENDATIONS[int(row["recommendation_code"])]
+
+
+def _product_fields(row):
+    return [
+        ("Magasin", row["store"]),
+        ("Lot", row["lot_info"] or row["lot_number"]),
+        ("Date limite", row["expiry_date"]),
+        ("Score de risque", f"{row['risk_score']}/100"),
+        ("Niveau", row["risk_level"]),
+        ("Rappels enregistrés", row["recalls_count"]),
+        ("Lot rappelé", "Oui" if row["lot_recalled"] else "Non"),
+    ]
+
+
+def _level_counts(rows):
+    counts = {level: 0 for level in RISK_LEVELS}
+    for row in rows:
+        if row["risk_level"] in counts:
+            counts[row["risk_level"]] += 1
+    return counts
+
+
+def _csv(rows, with_recommendations):
+    out = io.StringIO()
+    columns = [column for column in REPORT_COLUMNS if column != "recommendation_code"]
+    writer = csv.writer(out, lineterminator="\n")
+    writer.writerow(columns + (["recommendations"] if with_recommendations else []))
+    for row in rows:
+        values = [row[column] for column in columns]
+        writer.writerow(values + ([" | ".join(recommendations(row))] if with_recommendations else []))
+    return out.getvalue().encode("utf-8")
+
+
+_HTML_PAGE = """<!DOCTYPE html>
+<html lang="fr"><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:sans-serif;margin:2em;color:#222}}table{{border-collapse:collapse}}
+td,th{{border:1px solid #ccc;padding:4px 8px;text-align:left}}.recalled{{color:#c0392b;font-weight:bold}}</style>
+</head><body>
+<h1>{title}</h1>
+<p>Généré le {generated_at}</p>
+{body}
+</body></html>
+"""
+
+
+def _html_product(row, generated_at, asset_prefix):
+    escape = html.escape
+    fields = "".join(f"<tr><th>{escape(label)}</th><td>{escape(str(value))}</td></tr>" for label, value in _product_fields(row))
+    items = "".join(f"<li>{escape(message)}</li>" for message in recommendations(row))
+    level = _level(row)
+    body = (f'<img src="{asset_prefix}{chart_name(level)}" alt="Niveau de risque : {escape(level)}">'
+            f"<table>{fields}</table><h2>Recommandations</h2><ol>{items}</ol>")
+    return _HTML_PAGE.format(title=escape(f"Rapport d'analyse : {row['product_name']}"),
+                             generated_at=generated_at, body=body).encode("utf-8")
+
+
+def _html_store(store, rows, generated_at):
+    escape = html.escape
+    counts = _level_counts(rows)
+    summary = "".join(f"<li>{escape(level)} : {count}</li>" for level, count in counts.items())
+    recalled = sum(row["lot_recalled"] for row in rows)
+    columns = ("product_name", "lot_info", "expiry_date", "risk_score", "risk_level", "lot_recalled")
+    header = "".join(f"<th>{escape(COLUMN_LABELS[column])}</th>" for column in columns)
+    lines = []
+    for row in rows:
+        cells = "".join(
+            f"<td>{'Oui' if row[column] else ''}</td>" if column == "lot_recalled" else f"<td>{escape(str(row[column]))}</td>"
+            for column in columns
+        )
+        lines.append(f'<tr class="recalled">{cells}</tr>' if row["lot_recalled"] else f"<tr>{cells}</tr>")
+    body = (f"<p>{len(rows)} produit(s) analysé(s), {recalled} lot(s) rappelé(s)</p><ul>{summary}</ul>"
+            f"<table><tr>{header}</tr>{''.join(lines)}</table>")
+    return _HTML_PAGE.format(title=escape(f"Rapport magasin : {store}"), generated_at=generated_at,
+                             body=body).encode("utf-8")
+
+
+# PDF
+
+
+def _pdf_text(text):
+    """Chaîne PDF en WinAnsi : caractères hors jeu (pictogrammes) retirés"""
+    encoded = str(text).encode("cp1252", "ignore").strip()
+    return b"(" + encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class _PdfPages:
+    """Pages A4 composées ligne à ligne, de haut en bas"""
+    
+    WIDTH, HEIGHT, MARGIN = 595, 842, 50
+    
+    def __init__(self):
+        self.pages = []
+        self.new_page()
+    
+    def new_page(self):
+        self.pages.append([])
+        self.y = self.HEIGHT - self.MARGIN
+    
+    def text(self, text, size=10, bold=False, indent=0, wrap=95):
+        for line in textwrap.wrap(str(text), wrap) or [""]:
+            if self.y < self.MARGIN + size:
+                self.new_page()
+            self.y -= size + 4
+            font = b"/F2" if bold else b"/F1"
+            self.pages[-1].append(b"BT %s %d Tf %d %d Td %s Tj ET" % (font, size, self.MARGIN + indent, self.y, _pdf_text(line)))
+    
+    def image(self, size, scale=0.75):
+        width, height = int(size[0] * scale), int(size[1] * scale)
+        self.y -= height + 6
+        self.pages[-1].append(b"q %d 0 0 %d %d %d cm /Im1 Do Q" % (width, height, self.MARGIN, self.y))
+    
+    def render(self, chart=None):
+        """Document PDF complet ; `chart` est l'illustration statique (taille et pixels compressés)"""
+        objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+                   b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+                   b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"]
+        resources = b"/Font << /F1 3 0 R /F2 4 0 R >>"
+        if chart is not None:
+            (width, height), data = chart["size"], chart["rgb"]
+            objects.append(b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+                           b"/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n%s\nendstream"
+                           % (width, height, len(data), data))
+            resources += b" /XObject << /Im1 %d 0 R >>" % len(objects)
+        kids = []
+        for operations in self.pages:
+            content = zlib.compress(b"\n".join(operations))
+            objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (len(content), content))
+            objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] /Resources << %s >> /Contents %d 0 R >>"
+                           % (self.WIDTH, self.HEIGHT, resources, len(objects)))
+            kids.append(b"%d 0 R" % len(objects))
+        objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+        
+        out = io.BytesIO()
+        out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(out.tell())
+            out.write(b"%d 0 obj\n%s\nendobj\n" % (number, body))
+        xref = out.tell()
+        out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        out.write(b"".join(b"%010d 00000 n \n" % offset for offset in offsets))
+        out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+        return out.getvalue()
+
+
+def _pdf_product(row, generated_at, charts):
+    pages = _PdfPages()
+    pages.text(f"Rapport d'analyse : {row['product_name']}", size=16, bold=True)
+    pages.text(f"Généré le {generated_at}", size=9)
+    level = _level(row)
+    pages.image(charts[level]["size"])
+    for label, value in _product_fields(row):
+        pages.text(f"{label} : {value}")
+    pages.text("Recommandations", size=12, bold=True)
+    for i, message in enumerate(recommendations(row), 1):
+        pages.text(f"{i}. {message}", indent=10)
+    return pages.render(charts[level])
+
+
+def _pdf_store(store, rows, generated_at):
+    pages = _PdfPages()
+    pages.text(f"Rapport magasin : {store}", size=16, bold=True)
+    pages.text(f"Généré le {generated_at}", size=9)
+    recalled = sum(row["lot_recalled"] for row in rows)
+    pages.text(f"{len(rows)} produit(s) analysé(s), {recalled} lot(s) rappelé(s)", bold=True)
+    pages.text(", ".join(f"{level} : {count}" for level, count in _level_counts(rows).items()))
+    for row in rows:
+        flag = "RAPPELÉ " if row["lot_recalled"] else ""
+        pages.text(f"{flag}{row['product_name'][:45]} | lot {row['lot_info']} | {row['expiry_date']} | "
+                   f"{row['risk_score']}/100 {row['risk_level']}", size=8, wrap=130)
+    return pages.render()
+
+
+# Rendu des documents
+
+
+def render_documents(job, charts, generated_at, formats=FORMATS):
+    """Documents d'une tâche : liste de (chemin relatif, contenu)
+    
+    Une tâche est ("product", [(numéro, ligne), ...]) ou ("store", (magasin, partie, lignes)).
+    """
+    kind, payload = job
+    documents = []
+    if kind == "product":
+        for number, row in payload:
+            stem = f"produits/{number:07d}-{slug(row['product_name'])}"
+            if "csv" in formats:
+                documents.append((f"{stem}.csv", _csv([row], with_recommendations=True)))
+            if "html" in formats:
+                documents.append((f"{stem}.html", _html_product(row, generated_at, "../")))
+            if "pdf" in formats:
+                documents.append((f"{stem}.pdf", _pdf_product(row, generated_at, charts)))
+    else:
+        store, part, rows = payload
+        stem = f"magasins/{store_stem(store)}" + (f"-{part}" if part > 1 else "")
+        if "csv" in formats:
+            documents.append((f"{stem}.csv", _csv(rows, with_recommendations=True)))
+        if "html" in formats:
+            documents.append((f"{stem}.html", _html_store(store, rows, generated_at)))
+        if "pdf" in formats:
+            documents.append((f"{stem}.pdf", _pdf_store(store, rows, generated_at)))
+    return documents
+
+
+def _write(directory, name, content):
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(charts, generated_at, formats, directory):
+    _WORKER.update(charts=charts, generated_at=generated_at, formats=formats, directory=directory)
+
+
+def _run_job(job):
+    """Tâche exécutée dans un processus du pool : fichiers écrits (répertoire) ou contenus (archive)"""
+    documents = render_documents(job, _WORKER["charts"], _WORKER["generated_at"], _WORKER["formats"])
+    if _WORKER["directory"] is None:
+        return documents
+    for name, content in documents:
+        _write(_WORKER["directory"], name, content)
+    return [(name, len(content)) for name, content in documents]
+
+
+def _records(analyses):
+    """Lignes de rapport d'un flux de DataFrame ou de dictionnaires"""
+    for item in analyses:
+        if hasattr(item, "to_dict"):
+            frame = item.reindex(columns=list(REPORT_COLUMNS)).astype(object)
+            for record in frame.where(frame.notna(), None).to_dict("records"):
+                yield _row(record)
+        else:
+            yield _row(item)
+
+
+def _jobs(rows, by, batch_size, part_size=STORE_PART_ROWS):
+    if by == "product":
+        batch = []
+        for number, row in enumerate(rows, 1):
+            batch.append((number, row))
+            if len(batch) == batch_size:
+                yield "product", batch
+                batch = []
+        if batch:
+            yield "product", batch
+        return
+    # Par magasin : lignes consécutives d'un même magasin, par parties d'au plus `part_size` lignes
+    parts, store, group = {}, None, []
+    for row in rows:
+        current = row["store"] or "Sans magasin"
+        if current != store and current in parts:
+            raise ValueError(f"Lignes non groupées par magasin : {current!r} réapparaît après d'autres magasins")
+        if group and (current != store or len(group) >= part_size):
+            parts[store] = parts.get(store, 0) + 1
+            yield "store", (store, parts[store], group)
+            group = []
+        store = current
+        parts.setdefault(store, 0)
+        group.append(row)
+    if group:
+        parts[store] = parts.get(store, 0) + 1
+        yield "store", (store, parts[store], group)
+
+
+def generate_reports(analyses, output, by="product", formats=FORMATS, workers=None, batch_size=BATCH_SIZE,
+                     generated_at=None, charts=None, part_size=STORE_PART_ROWS):
+    """Génère les rapports d'un flux de résultats dans le répertoire ou l'archive zip `output`
+    
+    `analyses` : paquets de analyze_food_risk_batch (colonnes supplémentaires store,
+    lot_number, expiry_date reprises si présentes) ou dictionnaires. `by` vaut "product"
+    (un document par magasin, lignes groupées par magasin en entrée, découpé en parties
+    d'au plus `part_size` lignes : un gros magasin n'est jamais rassemblé en entier dans le
+    processus principal ni dans une tâche). Lève ValueError si un magasin réapparaît
+    après d'autres.
+    Avec `workers` à 0, tout est rendu dans le processus courant.
+    Renvoie {"documents", "files", "bytes"}.
+    """
+    if by not in GROUPINGS:
+        raise ValueError(f"Regroupement inconnu : {by} (attendu : {', '.join(GROUPINGS)})")
+    formats = tuple(formats)
+    unknown = set(formats) - set(FORMATS)
+    if unknown:
+        raise ValueError(f"Format(s) inconnu(s) : {', '.join(sorted(unknown))}")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    generated_at = generated_at or datetime.now().strftime("%d/%m/%Y %H:%M")
+    charts = charts or render_static_charts()
+    archive = zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) if str(output).endswith(".zip") else None
+    directory = None if archive else output
+    stats = {"documents": 0, "files": 0, "bytes": 0}
+    
+    def store(documents):
+        for name, content in documents:
+            if archive is not None:
+                archive.writestr(name, content)
+            stats["files"] += 1
+            stats["bytes"] += content if isinstance(content, int) else len(content)
+    
+    try:
+        # Illustrations : un seul exemplaire, référencé par tous les documents HTML
+        if "html" in formats and by == "product":
+            for level, chart in charts.items():
+                if archive is not None:
+                    archive.writestr(chart_name(level), chart["png"])
+                else:
+                    _write(directory, chart_name(level), chart["png"])
+        jobs = _jobs(_records(analyses), by, batch_size, part_size)
+        if workers <= 0:
+            _init_worker(charts, generated_at, formats, directory)
+            for job in jobs:
+                stats["documents"] += len(job[1]) if job[0] == "product" else 1
+                store(_run_job(job))
+            return stats
+        
+        import multiprocessing
+        
+        # spawn : pas de fork d'un processus multithread (serveur Streamlit)
+        with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker,
+                                 initargs=(charts, generated_at, formats, directory)) as pool:
+            pending = set()
+            for job in jobs:
+                stats["documents"] += len(job[1]) if job[0] == "product" else 1
+                pending.add(pool.submit(_run_job, job))
+                if len(pending) >= 2 * workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        store(future.result())
+            for future in pending:
+                store(future.result())
+        return stats
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def analysis_report_archive(row, charts, generated_at=None, formats=FORMATS):
+    """Archive zip (octets) des rapports d'une seule analyse, rendue dans le processus courant"""
+    generated_at = generated_at or datetime.now().strftime("%d/%m/%Y %H:%M")
+    row = _row(row)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        if "html" in formats:
+            archive.writestr(chart_name(_level(row)), charts[_level(row)]["png"])
+        for name, content in render_documents(("product", [(1, row)]), charts, generated_at, formats):
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def main(argv=None):
+    import time
+    
+    import pandas as pd
+    
+    from .scoring import INPUT_COLUMNS, analyze_food_risk_batch, build_lot_index, build_risk_priors, default_catalog
+    
+    parser = argparse.ArgumentParser(description="Rapports d'analyse d'un inventaire CSV (product_name, lot_number, expiry_date, store)")
+    parser.add_argument("input", nargs="?", default="-", help="fichier CSV, ou - pour l'entrée standard")
+    parser.add_argument("--output", required=True, help="répertoire de sortie, ou archive .zip")
+    parser.add_argument("--by", choices=GROUPINGS, default="product",
+                        help="un rapport par analyse, ou par magasin")
+    parser.add_argument("--formats", default=",".join(FORMATS), help="formats séparés par des virgules")
+    parser.add_argument("--workers", type=int, default=None, help="processus de rendu (par défaut : un par cœur)")
+    parser.add_argument("--store", default=os.environ.get("FOODSAFE_RECALL_STORE"), help="magasin de rappels")
+    parser.add_argument("--as-of", help="date d'évaluation AAAA-MM-JJ (par défaut : maintenant)")
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    parser.add_argument("--part-size", type=int, default=STORE_PART_ROWS,
+                        help="avec --by store : lignes au plus par partie d'un rapport de magasin")
+    args = parser.parse_args(argv)
+    
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d") if args.as_of else None
+    products_db, lot_index, priors = default_catalog(), build_lot_index(args.store), build_risk_priors(args.store)
+    
+    def chunks(source):
+        if args.by == "product":
+            yield from pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=args.chunksize)
+            return
+        # Par magasin : l'inventaire est regroupé par magasin (ordre des lignes conservé)
+        inventory = pd.read_csv(source, dtype=str, keep_default_na=False)
+        if "store" in inventory:
+            inventory = inventory.sort_values("store", kind="stable", key=lambda store: store.replace("", "Sans magasin"))
+        for first in range(0, len(inventory), args.chunksize):
+            yield inventory.iloc[first:first + args.chunksize]
+    
+    def analyses(source):
+        for chunk in chunks(source):
+            chunk = chunk.reindex(columns=INPUT_COLUMNS + ["store"]).replace("", None)
+            scores = analyze_food_risk_batch(chunk, as_of=as_of, products_db=products_db, lot_index=lot_index, priors=priors)
+            yield scores.assign(store=chunk["store"].to_numpy(), lot_number=chunk["lot_number"].to_numpy(),
+                                expiry_date=chunk["expiry_date"].to_numpy())
+    
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    start = time.perf_counter()
+    try:
+        stats = generate_reports(analyses(source), args.output, by=args.by, formats=args.formats.split(","),
+                                 workers=args.workers, part_size=args.part_size)
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    elapsed = time.perf_counter() - start
+    print(f"{stats['documents']} rapport(s), {stats['files']} fichier(s), {stats['bytes'] / 1e6:.1f} Mo "
+          f"en {elapsed:.1f} s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
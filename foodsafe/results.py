@@ -0,0 +1,148 @@
+"""Représentation compacte des résultats d'analyse
+
+Les recommandations ne dépendent que de trois paliers : score (sûr, modéré, élevé),
+péremption (rien à signaler, moins de 3 jours, périmé) et lot rappelé. Chaque
+combinaison reçoit un code d'un octet, indice dans RECOMMENDATIONS ; le texte n'est
+reconstitué qu'à l'affichage. Un résultat unitaire est un AnalysisResult (à __slots__),
+un résultat par lots un DataFrame de colonnes NumPy, exportable vers Arrow et Parquet
+sans copie des colonnes numériques.
+"""
+import json
+import os
+
+RISK_LEVELS = ("Faible", "Moyen", "Élevé")
+
+LOT_RECALLED_MESSAGE = "🚨 LOT RAPPELÉ - Ne pas consommer, rapportez le produit au point de vente"
+# Messages par palier de score (indice donné par score_band)
+SCORE_MESSAGES = (
+    ("✅ Produit considéré comme sûr", "Respectez les dates de péremption", "Conservez selon les instructions"),
+    ("⚡ Risque modéré identifié", "Vérifiez l'aspect et l'odeur avant consommation",
+     "Respectez scrupuleusement les conditions de conservation"),
+    ("⚠️ ATTENTION: Risque élevé détecté", "Ne consommez pas ce produit",
+     "Vérifiez les rappels officiels sur le site de la DGCCRF"),
+)
+# Messages par palier de péremption (indice donné par expiry_band)
+EXPIRY_MESSAGES = ((), ("⏰ Consommer rapidement (expire dans moins de 3 jours)",), ("🚨 PRODUIT PÉRIMÉ - Ne pas consommer",))
+GENERIC_RECOMMENDATIONS = ("Produit non référencé dans notre base de données", "Vérifiez les dates de péremption",
+                           "Conservez dans de bonnes conditions")
+
+# Code = 9 × lot rappelé + 3 × palier de score + palier de péremption ; le dernier code désigne un produit non référencé
+RECOMMENDATIONS = tuple(
+    ((LOT_RECALLED_MESSAGE,) if recalled else ()) + SCORE_MESSAGES[score] + EXPIRY_MESSAGES[expiry]
+    for recalled in (False, True) for score in range(3) for expiry in range(3)
+) + (GENERIC_RECOMMENDATIONS,)
+GENERIC_CODE = len(RECOMMENDATIONS) - 1
+
+
+def score_band(risk_score):
+    return 2 if risk_score > 70 else 1 if risk_score > 40 else 0
+
+
+def expiry_band(days_to_expiry):
+    if days_to_expiry is None or days_to_expiry >= 3:
+        return 0
+    return 2 if days_to_expiry < 0 else 1
+
+
+def recommendation_code(risk_score, days_to_expiry, lot_recalled=False):
+    """Code des recommandations d'un résultat (days_to_expiry vaut None sans date exploitable)"""
+    return 9 * bool(lot_recalled) + 3 * score_band(risk_score) + expiry_band(days_to_expiry)
+
+
+def recommendation_codes(score_bands, expiry_bands, lot_recalled, known):
+    """Version vectorisée de recommendation_code à partir des paliers (tableaux NumPy), en uint8"""
+    import numpy as np
+    
+    codes = lot_recalled * np.uint8(9) + score_bands.astype(np.uint8) * np.uint8(3) + expiry_bands.astype(np.uint8)
+    return np.where(known, codes, np.uint8(GENERIC_CODE))
+
+
+def recommendation_texts(codes, separator=" | "):
+    """Recommandations d'un tableau de codes, jointes par `separator` (pandas.Categorical)"""
+    import numpy as np
+    import pandas as pd
+    
+    texts = [separator.join(messages) for messages in RECOMMENDATIONS]
+    return pd.Categorical.from_codes(np.asarray(codes, dtype=np.int8), categories=texts)
+
+
+class AnalysisResult:
+    """Résultat d'une analyse unitaire
+    
+    Se lit aussi comme le dictionnaire renvoyé historiquement (result["risk_score"],
+    result.get("lot_recalled")) ; niveau et recommandations sont dérivés à la lecture.
+    """
+    
+    __slots__ = ("risk_score", "recalls_count", "lot_recalled", "lot_info", "recommendation_code")
+    FIELDS = ("risk_score", "risk_level", "recalls_count", "recommendations", "lot_info", "lot_recalled")
+    
+    def __init__(self, risk_score, recalls_count, lot_recalled, lot_info, recommendation_code):
+        self.risk_score = risk_score
+        self.recalls_count = recalls_count
+        self.lot_recalled = lot_recalled
+        self.lot_info = lot_info
+        self.recommendation_code = recommendation_code
+    
+    @property
+    def risk_level(self):
+        if self.recommendation_code == GENERIC_CODE:
+            return RISK_LEVELS[0]
+        return RISK_LEVELS[score_band(self.risk_score)]
+    
+    @property
+    def recommendations(self):
+        return list(RECOMMENDATIONS[self.recommendation_code])
+    
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+    
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+    
+    def keys(self):
+        return self.FIELDS
+    
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+    
+    def __eq__(self, other):
+        if not isinstance(other, AnalysisResult):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+    
+    def __repr__(self):
+        return f"AnalysisResult({self.risk_score}, {self.risk_level!r}, recalls={self.recalls_count}, lot={self.lot_info!r})"
+
+
+def to_arrow(results):
+    """Table Arrow d'un résultat par lots (DataFrame de analyze_food_risk_batch)
+    
+    Les colonnes numériques et booléennes sans valeur manquante sont reprises sans copie,
+    le niveau de risque devient une colonne dictionnaire. La table des recommandations
+    est jointe aux métadonnées du schéma pour que les codes restent interprétables.
+    """
+    import pyarrow as pa
+    
+    table = pa.Table.from_pandas(results, preserve_index=False)
+    # Indices des colonnes dictionnaire élargis : le schéma reste le même d'un paquet à l'autre
+    for i, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(i, field.name, table.column(i).cast(pa.dictionary(pa.int32(), field.type.value_type)))
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"foodsafe.recommendations"] = json.dumps(RECOMMENDATIONS, ensure_ascii=False).encode("utf-8")
+    return table.replace_schema_metadata(metadata)
+
+
+def write_parquet(results, path, compression="zstd"):
+    """Écrit un résultat par lots (DataFrame ou table Arrow) en Parquet, de façon atomique"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    table = results if isinstance(results, pa.Table) else to_arrow(results)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path, compression=compression)
+    os.replace(tmp_path, path)
+    return table
@@ -0,0 +1,217 @@
+"""Agrégats temporels matérialisés : jour, semaine et mois
+
+Chaque évènement (analyse ou rappel) met à jour un seau par granularité : nombre,
+somme et somme des carrés des scores, et compteurs par niveau, catégorie et sévérité.
+Les tendances se lisent ensuite en O(nombre de seaux), sans relire les évènements bruts.
+"""
+import atexit
+import json
+import math
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+GRANULARITIES = ("day", "week", "month")
+COUNTERS = ("analyses_by_level", "recalls_by_category", "recalls_by_severity")
+
+
+def bucket_key(day, granularity):
+    """Début du seau contenant `day`, au format AAAA-MM-JJ"""
+    if isinstance(day, datetime):
+        day = day.date()
+    elif not isinstance(day, date):
+        day = pd.Timestamp(day).date()
+    if granularity == "week":
+        day -= timedelta(days=day.weekday())
+    elif granularity == "month":
+        day = day.replace(day=1)
+    return day.isoformat()
+
+
+def _empty_bucket():
+    return {"analyses": 0, "score_sum": 0.0, "score_sumsq": 0.0, "recalls": 0, **{name: {} for name in COUNTERS}}
+
+
+class RollupStore:
+    """Seaux d'agrégats par granularité, mis à jour au fil des évènements"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {granularity: {} for granularity in GRANULARITIES}
+        self._keys = {granularity: [] for granularity in GRANULARITIES}
+        self._changes = 0
+        self._saved_changes = 0
+        # Version des données source reflétée par ces agrégats (magasin de rappels), None si sans objet
+        self.data_version = None
+    
+    def __len__(self):
+        return len(self._keys["day"])
+    
+    @property
+    def version(self):
+        """Compteur de modifications, pour les clés de cache dérivées de ces agrégats"""
+        return self._changes
+    
+    def _bucket(self, granularity, key):
+        buckets = self._buckets[granularity]
+        self._changes += 1
+        if key not in buckets:
+            buckets[key] = _empty_bucket()
+            keys = self._keys[granularity]
+            if keys and key < keys[-1]:
+                insort(keys, key)
+            else:
+                keys.append(key)
+        return buckets[key]
+    
+    # Mise à jour
+    
+    def add_analysis_aggregate(self, day, count, score_sum, score_sumsq, levels=None):
+        """Ajoute un groupe d'analyses du même jour, déjà agrégé"""
+        with self._lock:
+            for granularity in GRANULARITIES:
+                bucket = self._bucket(granularity, bucket_key(day, granularity))
+                bucket["analyses"] += int(count)
+                bucket["score_sum"] += float(score_sum)
+                bucket["score_sumsq"] += float(score_sumsq)
+                for level, level_count in (levels or {}).items():
+                    counter = bucket["analyses_by_level"]
+                    counter[level] = counter.get(level, 0) + int(level_count)
+    
+    def add_analysis(self, day, score, level=None):
+        self.add_analysis_aggregate(day, 1, score, score * score, {level: 1} if level else None)
+    
+    def add_recall_aggregate(self, day, count, category=None, severity=None):
+        """Ajoute `count` rappels du même jour, de même catégorie et sévérité"""
+        with self._lock:
+            for granularity in GRANULARITIES:
+                bucket = self._bucket(granularity, bucket_key(day, granularity))
+                bucket["recalls"] += int(count)
+                for name, value in (("recalls_by_category", category), ("recalls_by_severity", severity)):
+                    if isinstance(value, str) and value:
+                        bucket[name][value] = bucket[name].get(value, 0) + int(count)
+    
+    def add_recall(self, day, category=None, severity=None):
+        self.add_recall_aggregate(day, 1, category, severity)
+    
+    def add_analyses(self, frame, date_column="date"):
+        """Ajoute un lot d'analyses (colonnes date, risk_score et éventuellement risk_level)"""
+        days = pd.to_datetime(frame[date_column]).dt.normalize()
+        scores = frame["risk_score"].astype(float)
+        grouped = pd.DataFrame({"day": days, "score": scores, "sq": scores * scores}).groupby("day")
+        totals = grouped.agg(count=("score", "size"), score_sum=("score", "sum"), score_sumsq=("sq", "sum"))
+        levels = {}
+        if "risk_level" in frame:
+            level_counts = pd.DataFrame({"day": days, "level": frame["risk_level"].astype(str)}).value_counts()
+            for (day, level), count in level_counts.items():
+                levels.setdefault(day, {})[level] = count
+        for day, row in totals.iterrows():
+            self.add_analysis_aggregate(day, row["count"], row["score_sum"], row["score_sumsq"], levels.get(day))
+    
+    def add_recalls(self, frame):
+        """Ajoute un lot de rappels (colonnes date, category, severity)"""
+        grouped = pd.DataFrame({
+            "day": pd.to_datetime(frame["date"]).dt.normalize(),
+            "category": frame["category"].astype(object) if "category" in frame else None,
+            "severity": frame["severity"].astype(object) if "severity" in frame else None,
+        }).fillna("").value_counts(dropna=False)
+        for (day, category, severity), count in grouped.items():
+            self.add_recall_aggregate(day, count, category or None, severity or None)
+    
+    # Lecture
+    
+    def _range(self, granularity, start, end):
+        keys = self._keys[granularity]
+        lo = 0 if start is None else bisect_left(keys, bucket_key(start, granularity))
+        hi = len(keys) if end is None else bisect_right(keys, bucket_key(end, granularity))
+        return keys[lo:hi]
+    
+    def series(self, granularity="day", start=None, end=None):
+        """Série des seaux entre `start` et `end` : volumes, score moyen et écart-type"""
+        with self._lock:
+            keys = self._range(granularity, start, end)
+            rows = [self._buckets[granularity][key] for key in keys]
+        records = []
+        for key, bucket in zip(keys, rows):
+            count = bucket["analyses"]
+            mean = bucket["score_sum"] / count if count else math.nan
+            variance = max(0.0, bucket["score_sumsq"] / count - mean * mean) if count else math.nan
+            records.append({
+                "period": pd.Timestamp(key),
+                "analyses": count,
+                "mean_score": mean,
+                "std_score": math.sqrt(variance) if count else math.nan,
+                "recalls": bucket["recalls"],
+            })
+        return pd.DataFrame(records, columns=["period", "analyses", "mean_score", "std_score", "recalls"])
+    
+    def counts(self, name, granularity="month", start=None, end=None):
+        """Somme d'un compteur (analyses_by_level, recalls_by_category, recalls_by_severity) sur la période"""
+        total = Counter()
+        with self._lock:
+            for key in self._range(granularity, start, end):
+                total.update(self._buckets[granularity][key][name])
+        return total
+    
+    # Persistance
+    
+    def to_dict(self):
+        with self._lock:
+            return json.loads(json.dumps(self._buckets))
+    
+    @classmethod
+    def from_dict(cls, data):
+        rollups = cls()
+        for granularity in GRANULARITIES:
+            rollups._buckets[granularity] = dict(data.get(granularity, {}))
+            rollups._keys[granularity] = sorted(rollups._buckets[granularity])
+        rollups.data_version = data.get("data_version")
+        return rollups
+    
+    def save(self, path):
+        """Écrit les agrégats de façon atomique"""
+        with self._lock:
+            data = self._buckets if self.data_version is None else {**self._buckets, "data_version": self.data_version}
+            payload = json.dumps(data, ensure_ascii=False)
+            changes = self._changes
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        self._saved_changes = changes
+    
+    def autosave(self, path, interval=30.0):
+        """Écrit les agrégats modifiés toutes les `interval` secondes depuis un thread, et à l'arrêt du processus
+        
+        Les derniers évènements sont ainsi enregistrés même si aucun autre n'arrive ensuite.
+        """
+        stopped = threading.Event()
+        
+        def flush():
+            if self._changes != self._saved_changes:
+                self.save(path)
+        
+        def loop():
+            while not stopped.wait(interval):
+                flush()
+        
+        def stop():
+            stopped.set()
+            flush()
+        
+        threading.Thread(target=loop, name="rollups-autosave", daemon=True).start()
+        atexit.register(stop)
+        return stop
+    
+    @classmethod
+    def load(cls, path):
+        """Agrégats enregistrés, ou un magasin vide si le fichier n'existe pas"""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, encoding="utf-8") as f:
+            return cls.from_dict(json.load(f))
@@ -0,0 +1,421 @@
+"""Cœur du calcul de risque, sans dépendance à l'interface
+
+Score d'un produit (unitaire ou par inventaire), recommandations et accès aux données
+(catalogue et rappels d'exemple, magasin de rappels). Le module n'importe que la
+bibliothèque standard : NumPy et pandas sont chargés par l'analyse par lots et par la
+lecture du magasin, au premier usage. Il s'utilise aussi en ligne de commande :
+
+    python -m foodsafe.scoring inventaire.csv > scores.csv
+    cat inventaire.csv | python -m foodsafe.scoring -
+    python -m foodsafe.scoring --batch inventaire.csv --parquet scores.parquet
+"""
+import argparse
+import csv
+import os
+import sys
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from .lots import LotIndex
+from .priors import RiskPriors
+from .results import (GENERIC_CODE, RECOMMENDATIONS, RISK_LEVELS, AnalysisResult, recommendation_code,
+                      recommendation_codes, to_arrow)
+
+INPUT_COLUMNS = ["product_name", "lot_number", "expiry_date"]
+OUTPUT_COLUMNS = INPUT_COLUMNS + ["risk_score", "risk_level", "recalls_count", "lot_recalled", "lot_info"]
+
+
+@lru_cache(maxsize=None)
+def load_sample_data():
+    """Catalogue (nom -> informations) et rappels d'exemple ; résultat partagé, à ne pas modifier"""
+    # Base de données des produits avec risques
+    products_db = {
+        "Lait entier Carrefour": {"risk": "low", "dlu": "2024-06-15", "lot": "L240601", "ean": "3270200000019"},
+        "Yaourt Danone": {"risk": "low", "dlu": "2024-06-20", "lot": "Y240605", "ean": "3044900000026"},
+        "Fromage Roquefort AOP": {"risk": "medium", "dlu": "2024-07-01", "lot": "R240520", "ean": "3228600000030"},
+        "Salade Caesar prête": {"risk": "high", "dlu": "2024-06-12", "lot": "S240610", "ean": "3261850000047"},
+        "Saumon fumé Label Rouge": {"risk": "medium", "dlu": "2024-06-18", "lot": "SF240608", "ean": "3560070000050"},
+        "Chocolat noir Lindt": {"risk": "low", "dlu": "2024-12-01", "lot": "C240301", "ean": "3036360000067"},
+        "Épinards surgelés": {"risk": "high", "dlu": "2024-08-15", "lot": "E240515", "ean": "3083680000079"}
+    }
+    
+    # Données des rappels récents
+    recalls_data = [
+        {"recall_id": "RC-2024-0612", "date": "2024-06-10", "product": "Salade Caesar prête", "brand": "Carrefour", "category": "Légumes", "reason": "Listeria monocytogenes", "severity": "Élevé", "lots": "S240601 à S240610"},
+        {"recall_id": "RC-2024-0598", "date": "2024-06-08", "product": "Épinards surgelés", "brand": "Picard", "category": "Surgelés", "reason": "Pesticides non conformes", "severity": "Moyen", "lots": "E240510-E240520"},
+        {"recall_id": "RC-2024-0571", "date": "2024-06-05", "product": "Fromage Roquefort AOP", "brand": "Société", "category": "Produits laitiers", "reason": "E. coli", "severity": "Élevé", "lots": "R240518, R240520, R240522"},
+        {"recall_id": "RC-2024-0549", "date": "2024-06-03", "product": "Saumon fumé Label Rouge", "brand": "Labeyrie", "category": "Poissons", "reason": "Température non respectée", "severity": "Moyen", "expiry_start": "2024-06-15", "expiry_end": "2024-06-20"},
+        {"recall_id": "RC-2024-0103", "date": "2024-02-02", "product": "Salade Caesar prête", "brand": "Carrefour", "category": "Légumes", "reason": "Corps étranger", "severity": "Moyen", "expiry_start": "2024-02-01", "expiry_end": "2024-02-06"},
+        {"recall_id": "RC-2023-0934", "date": "2023-09-14", "product": "Salade Caesar prête", "brand": "Carrefour", "category": "Légumes", "reason": "Salmonella", "severity": "Élevé", "lots": "S230901-S230910"},
+        {"recall_id": "RC-2023-0688", "date": "2023-07-21", "product": "Épinards surgelés", "brand": "Picard", "category": "Surgelés", "reason": "Corps étranger", "severity": "Faible", "lots": "E230601-E230630"},
+    ]
+    
+    return products_db, recalls_data
+
+
+def load_recall_records(store_path=None, columns=("recall_id", "product", "lots", "expiry_start", "expiry_end")):
+    """Rappels du magasin `store_path` s'il est alimenté, sinon les rappels d'exemple"""
+    if store_path and os.path.exists(os.path.join(store_path, "_manifest.json")):
+        from .recalls import RecallStore
+        
+        store = RecallStore(store_path)
+        if store.version:
+            return store.read(columns=list(columns))
+    _, recalls_data = load_sample_data()
+    return recalls_data
+
+
+def _linked(recalls, store_path):
+    """Rappels rattachés aux produits du catalogue si le magasin contient des correspondances"""
+    if not store_path:
+        return recalls
+    from .linkage import apply_links, links_path, read_links
+    
+    links = read_links(links_path(store_path))
+    return recalls if links is None else apply_links(recalls, links)
+
+
+def build_lot_index(store_path=None):
+    """Index des lots et dates limites rappelés (voir foodsafe.lots)
+    
+    Les correspondances calculées par `python -m foodsafe.linkage` rattachent chaque
+    rappel au produit du catalogue dont le nom est le plus proche.
+    """
+    return LotIndex.from_recalls(_linked(load_recall_records(store_path), store_path))
+
+
+@lru_cache(maxsize=1)
+def default_lot_index():
+    """Index des lots rappelés utilisé par défaut (magasin désigné par FOODSAFE_RECALL_STORE, ou exemples)"""
+    return build_lot_index(os.environ.get("FOODSAFE_RECALL_STORE"))
+
+
+def build_risk_priors(store_path=None):
+    """A priori de risque par catégorie et par marque, initialisés avec les rappels (voir foodsafe.priors)"""
+    priors = RiskPriors()
+    recalls = load_recall_records(store_path, columns=("recall_id", "product", "category", "brand", "severity"))
+    priors.add_recalls(_linked(recalls, store_path))
+    return priors
+
+
+@lru_cache(maxsize=1)
+def default_priors():
+    """A priori utilisés par défaut (magasin désigné par FOODSAFE_RECALL_STORE, ou exemples)"""
+    return build_risk_priors(os.environ.get("FOODSAFE_RECALL_STORE"))
+
+
+@lru_cache(maxsize=4)
+def _shared_catalog(path):
+    from .snapshot import SharedCatalog
+    
+    return SharedCatalog(path)
+
+
+def default_catalog():
+    """Catalogue utilisé par défaut : instantané partagé désigné par FOODSAFE_CATALOG_SNAPSHOT, sinon les exemples"""
+    path = os.environ.get("FOODSAFE_CATALOG_SNAPSHOT")
+    if path:
+        return _shared_catalog(path).current()
+    products_db, _ = load_sample_data()
+    return products_db
+
+
+# Paramètres du calcul de score, partagés par l'analyse unitaire et l'analyse par lots
+BASE_SCORES = {"low": 20, "medium": 60, "high": 85}
+RECALL_PENALTY = 15
+# Pénalité supplémentaire lorsque le lot ou la date limite de l'article est explicitement rappelé
+RECALLED_LOT_PENALTY = 50
+# (jours avant péremption strictement inférieur à, pénalité), du plus strict au plus large
+EXPIRY_PENALTIES = [(0, 50), (3, 30), (7, 15)]
+GENERIC_SCORE_RANGE = (15, 45)
+
+
+def risk_level_label(score):
+    """Traduit un score de risque en niveau affiché"""
+    return "Élevé" if score > 70 else "Moyen" if score > 40 else "Faible"
+
+
+def analyze_food_risk(product_name, lot_number=None, expiry_date=None, as_of=None, lot_index=None, products_db=None,
+                      priors=None):
+    """Analyse le risque d'un produit alimentaire (AnalysisResult, lisible comme un dictionnaire)"""
+    if products_db is None:
+        products_db = default_catalog()
+    
+    if product_name in products_db:
+        product_info = products_db[product_name]
+        risk_level = product_info["risk"]
+        
+        # Rappels du produit qui visent ce lot ou cette date limite, ou qui ne peuvent être écartés
+        if lot_index is None:
+            lot_index = default_lot_index()
+        lot_match = lot_index.match(product_name, lot_number, expiry_date)
+        recalls_count = len(lot_match["confirmed"]) + len(lot_match["uncertain"])
+        
+        # Calcul du score de risque
+        base_score = BASE_SCORES[risk_level]
+        recall_penalty = recalls_count * RECALL_PENALTY + (RECALLED_LOT_PENALTY if lot_match["lot_recalled"] else 0)
+        
+        # Vérification de la date de péremption
+        expiry_penalty = 0
+        days_to_expiry = None
+        if expiry_date:
+            try:
+                exp_date = datetime.strptime(expiry_date, "%Y-%m-%d")
+                days_to_expiry = (exp_date - (as_of or datetime.now())).days
+                for threshold, penalty in EXPIRY_PENALTIES:
+                    if days_to_expiry < threshold:
+                        expiry_penalty = penalty
+                        break
+            except:
+                pass
+        
+        final_score = min(100, base_score + recall_penalty + expiry_penalty)
+        
+        return AnalysisResult(
+            final_score,
+            recalls_count,
+            lot_match["lot_recalled"],
+            lot_number or product_info.get("lot", "Non disponible"),
+            recommendation_code(final_score, days_to_expiry, lot_match["lot_recalled"]),
+        )
+    else:
+        # Analyse générique pour les produits non référencés : score a priori de leur catégorie et de leur marque
+        if priors is None:
+            priors = default_priors()
+        generic_score = priors.prior_score(product_name=product_name, score_range=GENERIC_SCORE_RANGE)
+        return AnalysisResult(generic_score, 0, False, lot_number or "Non spécifié", GENERIC_CODE)
+
+
+def _as_series(inventory, name):
+    """Colonne d'un DataFrame ou d'un dictionnaire de tableaux, sans conversion (None si absente)"""
+    import pandas as pd
+    
+    if name not in inventory:
+        return None
+    values = inventory[name]
+    return values if isinstance(values, pd.Series) else pd.Series(values)
+
+
+def _factorize(column, n):
+    """Codes entiers (-1 si absent) et valeurs distinctes d'une colonne facultative"""
+    import numpy as np
+    
+    if column is None:
+        return np.full(n, -1, dtype=np.intp), np.empty(0, dtype=object)
+    codes, uniques = column.factorize()
+    return codes, np.asarray(uniques)
+
+
+def analyze_food_risk_batch(inventory, as_of=None, products_db=None, lot_index=None, priors=None):
+    """Analyse vectorisée d'un inventaire complet (équivalent ligne à ligne de analyze_food_risk)
+    
+    `inventory` est un DataFrame ou un dictionnaire de tableaux avec les colonnes
+    `product_name`, `lot_number` (optionnelle) et `expiry_date` (optionnelle, chaînes
+    "AAAA-MM-JJ" ou datetime64). Toutes les lignes sont évaluées à la même date `as_of`.
+    Les produits non référencés reçoivent le score a priori de leur catégorie et de
+    leur marque (`priors`, calculé une fois par nom distinct). Les recommandations sont codées (colonne `recommendation_code`,
+    voir foodsafe.results) et les scores stockés en entiers courts.
+    
+    Chaque colonne est factorisée une fois : catalogue, dates et rappels ne sont consultés
+    que par valeur distincte, puis les lignes reçoivent leurs valeurs par indexation
+    entière (le code -1 d'une valeur absente désigne la dernière case des tables).
+    """
+    import numpy as np
+    import pandas as pd
+    
+    if products_db is None:
+        products_db = default_catalog()
+    if lot_index is None:
+        lot_index = default_lot_index()
+    as_of = pd.Timestamp(as_of or datetime.now()).to_datetime64().astype("datetime64[ns]")
+    
+    names = _as_series(inventory, "product_name")
+    if names is None:
+        raise KeyError("Colonne 'product_name' manquante dans l'inventaire")
+    n = len(names)
+    codes, uniques = _factorize(names, n)
+    lot_codes, lot_uniques = _factorize(_as_series(inventory, "lot_number"), n)
+    exp_codes, exp_uniques = _factorize(_as_series(inventory, "expiry_date"), n)
+    
+    # Produits : base consultée une fois par nom distinct
+    infos = [products_db.get(name) for name in uniques] + [None]
+    known_by_code = np.array([info is not None for info in infos])
+    base_by_code = np.array([BASE_SCORES[info["risk"]] if info else 0 for info in infos], dtype=np.int16)
+    known = known_by_code[codes]
+    base_score = base_by_code[codes]
+    
+    # Dates de péremption : jours restants, pénalité et palier par date distincte
+    if np.issubdtype(exp_uniques.dtype, np.datetime64):
+        exp_dates = exp_uniques.astype("datetime64[ns]")
+    else:
+        exp_dates = pd.to_datetime(pd.Series(exp_uniques, dtype=object), format="%Y-%m-%d", errors="coerce").to_numpy()
+    exp_dates = np.append(exp_dates, np.datetime64("NaT", "ns"))
+    has_expiry_by_code = ~np.isnat(exp_dates)
+    days_by_code = np.where(has_expiry_by_code, np.floor_divide((exp_dates - as_of).astype(np.int64), 86_400 * 10**9), 0)
+    penalty_by_code = np.zeros(len(exp_dates), dtype=np.int16)
+    for threshold, penalty in reversed(EXPIRY_PENALTIES):
+        penalty_by_code[has_expiry_by_code & (days_by_code < threshold)] = penalty
+    expiry_band_by_code = (((days_by_code < 3).astype(np.uint8) + (days_by_code < 0)) * has_expiry_by_code).astype(np.uint8)
+    has_expiry = has_expiry_by_code[exp_codes]
+    
+    # Rappels : une recherche par combinaison distincte (produit rappelé, lot, date limite)
+    recalls_count = np.zeros(n, dtype=np.int16)
+    lot_recalled = np.zeros(n, dtype=bool)
+    indexed_by_code = np.array([info is not None and name in lot_index for name, info in zip(uniques, infos)] + [False])
+    rows = np.flatnonzero(indexed_by_code[codes])
+    if len(rows):
+        lot_size, exp_size = len(lot_uniques) + 1, len(exp_dates)
+        keys = (codes[rows].astype(np.int64) * lot_size + lot_codes[rows] + 1) * exp_size + exp_codes[rows] + 1
+        key_codes, keys = pd.factorize(keys)
+        lot_values = np.append(lot_uniques.astype(object), None)
+        counts, recalled = lot_index.match_many(uniques[keys // exp_size // lot_size].astype(object),
+                                                lot_values[keys // exp_size % lot_size - 1],
+                                                exp_dates[keys % exp_size - 1])
+        recalls_count[rows] = counts[key_codes]
+        lot_recalled[rows] = recalled[key_codes]
+    recall_penalty = recalls_count * RECALL_PENALTY + lot_recalled * np.int16(RECALLED_LOT_PENALTY)
+    expiry_penalty = np.where(known, penalty_by_code[exp_codes], np.int16(0))
+    risk_score = np.minimum(base_score + recall_penalty + expiry_penalty, np.int16(100))
+    
+    # Produits non référencés : score générique, sans pénalités
+    if not known.all():
+        if priors is None:
+            priors = default_priors()
+        prior_by_code = np.array([
+            0 if known_by_code[code] else priors.prior_score(product_name=name, score_range=GENERIC_SCORE_RANGE)
+            for code, name in enumerate(uniques)
+        ] + [priors.prior_score(score_range=GENERIC_SCORE_RANGE)], dtype=np.int16)
+        risk_score = np.where(known, risk_score, prior_by_code[codes])
+    score_band = ((risk_score > 40).astype(np.int8) + (risk_score > 70)) * known
+    
+    # Lot affiché : celui de l'article, sinon celui du catalogue ("Non spécifié" hors catalogue)
+    has_lot_by_code = np.array([isinstance(lot, str) and bool(lot) for lot in lot_uniques] + [False])
+    fallback = [info.get("lot", "Non disponible") if info else "Non spécifié" for info in infos]
+    info_codes, info_labels = pd.factorize(np.array(list(lot_uniques) + fallback, dtype=object))
+    info_codes = info_codes.astype(np.int32)
+    lot_info = np.where(has_lot_by_code, np.append(info_codes[:len(lot_uniques)], -1), -1).astype(np.int32)[lot_codes]
+    lot_info = np.where(lot_info >= 0, lot_info, info_codes[len(lot_uniques):][codes])
+    
+    dated = has_expiry & known
+    days_column = pd.arrays.IntegerArray(days_by_code.astype(np.int32)[exp_codes], ~dated)
+    
+    return pd.DataFrame({
+        "product_name": names.array if isinstance(inventory, pd.DataFrame) else names.to_numpy(),
+        "known": known,
+        "base_score": base_score,
+        "recall_penalty": recall_penalty.astype(np.int16),
+        "expiry_penalty": expiry_penalty,
+        "days_to_expiry": days_column,
+        "risk_score": risk_score,
+        "risk_level": pd.Categorical.from_codes(score_band, categories=RISK_LEVELS),
+        "recalls_count": recalls_count,
+        "lot_recalled": lot_recalled,
+        "lot_info": pd.Categorical.from_codes(lot_info, categories=info_labels),
+        "recommendation_code": recommendation_codes(score_band, expiry_band_by_code[exp_codes], lot_recalled, known),
+    }, copy=False)
+
+
+def seconds_until_expiry_band_change(expiry_date, now=None):
+    """Secondes avant que la pénalité de péremption change de palier (None si pas de date exploitable)"""
+    if not expiry_date:
+        return None
+    try:
+        exp_date = datetime.strptime(expiry_date, "%Y-%m-%d")
+    except ValueError:
+        return None
+    now = now or datetime.now()
+    upcoming = [exp_date - timedelta(days=threshold) for threshold, _ in EXPIRY_PENALTIES]
+    upcoming = [crossing for crossing in upcoming if crossing > now]
+    return (min(upcoming) - now).total_seconds() if upcoming else None
+
+
+def get_recommendations(risk_score, days_to_expiry, lot_recalled=False):
+    """Génère des recommandations basées sur le score de risque (lues dans la table précalculée)"""
+    return list(RECOMMENDATIONS[recommendation_code(risk_score, days_to_expiry, lot_recalled)])
+
+
+def score_rows(rows, as_of=None, lot_index=None, products_db=None, priors=None):
+    """Analyse ligne à ligne de dictionnaires (product_name, lot_number, expiry_date), en flux"""
+    if lot_index is None:
+        lot_index = default_lot_index()
+    if products_db is None:
+        products_db = default_catalog()
+    if priors is None:
+        priors = default_priors()
+    for row in rows:
+        product_name = (row.get("product_name") or "").strip()
+        lot_number = (row.get("lot_number") or "").strip() or None
+        expiry_date = (row.get("expiry_date") or "").strip()[:10] or None
+        analysis = analyze_food_risk(product_name, lot_number, expiry_date, as_of=as_of, lot_index=lot_index,
+                                     products_db=products_db, priors=priors)
+        yield {
+            "product_name": product_name,
+            "lot_number": lot_number or "",
+            "expiry_date": expiry_date or "",
+            "risk_score": analysis["risk_score"],
+            "risk_level": analysis["risk_level"],
+            "recalls_count": analysis["recalls_count"],
+            "lot_recalled": int(analysis["lot_recalled"]),
+            "lot_info": analysis["lot_info"],
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score de risque d'un inventaire CSV (product_name, lot_number, expiry_date)")
+    parser.add_argument("input", nargs="?", default="-", help="fichier CSV, ou - pour l'entrée standard")
+    parser.add_argument("--store", default=os.environ.get("FOODSAFE_RECALL_STORE"), help="magasin de rappels")
+    parser.add_argument("--catalog", default=os.environ.get("FOODSAFE_CATALOG_SNAPSHOT"),
+                        help="instantané du catalogue (python -m foodsafe.snapshot) ; données d'exemple par défaut")
+    parser.add_argument("--as-of", help="date d'évaluation AAAA-MM-JJ (par défaut : maintenant)")
+    parser.add_argument("--batch", action="store_true",
+                        help="analyse vectorisée par paquets (NumPy/pandas), pour les gros inventaires")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    parser.add_argument("--parquet", help="avec --batch : écrit les résultats complets dans ce fichier Parquet")
+    args = parser.parse_args(argv)
+    
+    as_of = datetime.strptime(args.as_of, "%Y-%m-%d") if args.as_of else None
+    if args.catalog:
+        from .snapshot import CatalogSnapshot
+        
+        products_db = CatalogSnapshot(args.catalog)
+    else:
+        products_db, _ = load_sample_data()
+    lot_index = build_lot_index(args.store)
+    priors = build_risk_priors(args.store)
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8", newline="")
+    try:
+        if args.batch:
+            import pandas as pd
+            
+            header = True
+            writer = None
+            for chunk in pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=args.chunksize):
+                chunk = chunk.reindex(columns=INPUT_COLUMNS).replace("", None)
+                scores = analyze_food_risk_batch(chunk, as_of=as_of, products_db=products_db, lot_index=lot_index,
+                                                 priors=priors)
+                scores = scores.assign(lot_number=chunk["lot_number"].to_numpy(), expiry_date=chunk["expiry_date"].to_numpy())
+                if args.parquet:
+                    import pyarrow.parquet as pq
+                    
+                    table = to_arrow(scores)
+                    if writer is None:
+                        writer = pq.ParquetWriter(args.parquet, table.schema, compression="zstd")
+                    writer.write_table(table)
+                    continue
+                scores["lot_recalled"] = scores["lot_recalled"].astype(int)
+                scores[OUTPUT_COLUMNS].to_csv(sys.stdout, index=False, header=header)
+                header = False
+            if writer is not None:
+                writer.close()
+        else:
+            writer = csv.DictWriter(sys.stdout, fieldnames=OUTPUT_COLUMNS, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(score_rows(csv.DictReader(source), as_of=as_of, lot_index=lot_index, products_db=products_db,
+                                        priors=priors))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Instantané du catalogue sur disque, ouvert en mmap et partagé par tous les processus
+
+Format du fichier (entiers little-endian) :
+
+- en-tête : signature, version, nombre de produits, nombre de chaînes ;
+- une fiche de taille fixe par produit, dans l'ordre des noms (octets UTF-8) :
+  identifiants de chaîne du lot, de la date limite et du code-barres, nombre de rappels,
+  niveau de risque ;
+- table des chaînes : offsets (u64, nombre de chaînes + 1) puis chaînes UTF-8 concaténées.
+  La chaîne i est le nom du produit i ; lots, dates et codes-barres suivent.
+
+Le fichier est construit hors ligne puis remplacé atomiquement. Les pages projetées
+sont partagées via le cache du système : la mémoire propre à chaque processus ne dépend
+pas de la taille du catalogue. SharedCatalog surveille le fichier et bascule sur la
+nouvelle version sans redémarrage ; les lecteurs ne prennent jamais de verrou.
+"""
+import argparse
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import Counter
+from collections.abc import Mapping
+
+import numpy as np
+
+MAGIC = b"FSCAT001"
+HEADER = struct.Struct("<8sQQQ")
+RISKS = ("low", "medium", "high")
+MISSING = 0xFFFFFFFF
+RECORD_DTYPE = np.dtype([
+    ("lot", "<u4"), ("dlu", "<u4"), ("ean", "<u4"), ("recalls", "<u4"), ("risk", "u1"), ("_pad", "V3"),
+])
+RECORD = struct.Struct("<IIIIB3x")
+OFFSET_PAIR = struct.Struct("<QQ")
+STRING_FIELDS = ("lot", "dlu", "ean")
+
+
+def recall_counts(recalls):
+    """Nombre de rappels par produit (DataFrame ou liste de dictionnaires avec une colonne product)"""
+    if hasattr(recalls, "columns"):
+        return Counter(recalls["product"].dropna().tolist()) if "product" in recalls.columns else Counter()
+    return Counter(recall["product"] for recall in recalls if recall.get("product"))
+
+
+def snapshot_version(path):
+    """Version de l'instantané `path`, 0 s'il n'existe pas"""
+    try:
+        with open(path, "rb") as f:
+            magic, version, _, _ = HEADER.unpack(f.read(HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return 0
+    return version if magic == MAGIC else 0
+
+
+def build_catalog_snapshot(path, products_db, recalls=(), version=None):
+    """Écrit l'instantané du catalogue `products_db` (nom -> risk, dlu, lot, ean)
+    
+    `recalls` sert au décompte des rappels par produit. Sans `version`, l'instantané
+    prend la version du fichier existant plus un. Le fichier est écrit à côté puis
+    renommé : les lecteurs voient l'ancienne ou la nouvelle version, jamais un mélange.
+    """
+    if version is None:
+        version = snapshot_version(path) + 1
+    counts = recall_counts(recalls)
+    names = sorted(products_db, key=lambda name: name.encode("utf-8"))
+    strings = list(names)
+    string_ids = {}
+    columns = {field: [] for field in STRING_FIELDS + ("risk", "recalls")}
+    for name in names:
+        info = products_db[name]
+        for field in STRING_FIELDS:
+            value = info.get(field)
+            if value is None:
+                columns[field].append(MISSING)
+                continue
+            value = str(value)
+            if value not in string_ids:
+                string_ids[value] = len(strings)
+                strings.append(value)
+            columns[field].append(string_ids[value])
+        risk = info.get("risk")
+        columns["risk"].append(RISKS.index(risk) if risk in RISKS else 255)
+        columns["recalls"].append(counts.get(name, 0))
+    records = np.zeros(len(names), dtype=RECORD_DTYPE)
+    for field, values in columns.items():
+        records[field] = values
+    
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, len(names), len(strings)))
+        f.write(records.tobytes())
+        f.write(offsets.tobytes())
+        f.write(b"".join(encoded))
+    os.replace(tmp_path, path)
+    return version
+
+
+class CatalogSnapshot(Mapping):
+    """Catalogue en lecture seule projeté en mémoire, utilisable comme le dictionnaire products_db
+    
+    Les fiches sont reconstituées à la demande ; la recherche d'un nom est une
+    dichotomie dans la table des chaînes.
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < HEADER.size:
+            raise ValueError(f"Instantané du catalogue tronqué : {path}")
+        magic, self.version, self._count, string_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Fichier d'instantané du catalogue inconnu : {path}")
+        self._offsets_start = HEADER.size + self._count * RECORD.size
+        self._strings_start = self._offsets_start + (string_count + 1) * 8
+        if len(self._mm) < self._strings_start:
+            raise ValueError(f"Instantané du catalogue tronqué : {path}")
+    
+    def __len__(self):
+        return self._count
+    
+    def _string_bytes(self, string_id):
+        start, end = OFFSET_PAIR.unpack_from(self._mm, self._offsets_start + string_id * 8)
+        return self._mm[self._strings_start + start:self._strings_start + end]
+    
+    def _string(self, string_id):
+        return self._string_bytes(string_id).decode("utf-8")
+    
+    def _find(self, name):
+        if not isinstance(name, str):
+            return -1
+        key = name.encode("utf-8")
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = self._string_bytes(mid)
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+    
+    def _info(self, position):
+        lot, dlu, ean, recalls, risk = RECORD.unpack_from(self._mm, HEADER.size + position * RECORD.size)
+        info = {}
+        if risk < len(RISKS):
+            info["risk"] = RISKS[risk]
+        for field, string_id in (("dlu", dlu), ("lot", lot), ("ean", ean)):
+            if string_id != MISSING:
+                info[field] = self._string(string_id)
+        info["recalls"] = recalls
+        return info
+    
+    def __getitem__(self, name):
+        position = self._find(name)
+        if position < 0:
+            raise KeyError(name)
+        return self._info(position)
+    
+    def __contains__(self, name):
+        return self._find(name) >= 0
+    
+    def __iter__(self):
+        for position in range(self._count):
+            yield self._string_bytes(position).decode("utf-8")
+
+
+class SharedCatalog:
+    """Dernière version de l'instantané `path`, rechargée sans redémarrage
+    
+    current() vérifie au plus toutes les `check_interval` secondes si le fichier a été
+    remplacé. Un seul thread rouvre le fichier pendant que les autres continuent de lire
+    l'ancienne version ; celle-ci reste valide tant qu'elle est référencée.
+    """
+    
+    def __init__(self, path, check_interval=1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._refresh_lock = threading.Lock()
+        self._snapshot = CatalogSnapshot(path)
+        self._file_id = self._stat_id()
+        self._next_check = time.monotonic() + check_interval
+    
+    def _stat_id(self):
+        stat = os.stat(self.path)
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+    
+    def current(self):
+        if time.monotonic() >= self._next_check and self._refresh_lock.acquire(blocking=False):
+            try:
+                self._next_check = time.monotonic() + self.check_interval
+                file_id = self._stat_id()
+                if file_id != self._file_id:
+                    self._snapshot = CatalogSnapshot(self.path)
+                    self._file_id = file_id
+            except (OSError, ValueError):
+                pass  # fichier absent ou en cours de remplacement : on garde la version courante
+            finally:
+                self._refresh_lock.release()
+        return self._snapshot
+    
+    @property
+    def version(self):
+        return self.current().version
+
+
+def main(argv=None):
+    from .scoring import load_recall_records, load_sample_data
+    
+    parser = argparse.ArgumentParser(description="Construit l'instantané du catalogue partagé par les processus")
+    parser.add_argument("path", nargs="?", default=os.environ.get("FOODSAFE_CATALOG_SNAPSHOT", "data/catalog.snap"))
+    parser.add_argument("--products", help="catalogue JSON (nom -> risk, dlu, lot, ean) ; données d'exemple par défaut")
+    parser.add_argument("--store", default=os.environ.get("FOODSAFE_RECALL_STORE"), help="magasin de rappels")
+    args = parser.parse_args(argv)
+    
+    if args.products:
+        import json
+        
+        with open(args.products, encoding="utf-8") as f:
+            products_db = json.load(f)
+    else:
+        products_db, _ = load_sample_data()
+    version = build_catalog_snapshot(args.path, products_db, load_recall_records(args.store))
+    print(f"{len(products_db)} produits, version {version} -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+"""Normalisation des textes (noms de produits, marques, catégories), sans dépendance lourde"""
+import unicodedata
+
+
+def normalize_name(text):
+    """Normalise un nom de produit : minuscules, sans accents ni ponctuation"""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(c if c.isalnum() else " " for c in decomposed if not unicodedata.combining(c))
+    return " ".join(stripped.split())
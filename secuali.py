@@ -7,6 +7,64 @@ from datetime import datetime, timedelta
 import random
 from PIL import Image
 import io
+import os
+import json
+import hashlib
+from foodsafe.alerts import CHANNELS, SubscriptionStore
+from foodsafe.barcodes import BarcodeIndex, barcode_index_version, build_barcode_index
+from foodsafe.cache import AnalysisCache
+from foodsafe.dashboard import analysis_summary, category_counts, recall_metrics, recall_timeline, risk_trend, severity_counts
+from foodsafe.catalog import CatalogIndex, normalize_name
+from foodsafe.expiry import BAND_LABELS, ExpiryScheduler
+from foodsafe.figures import cached_figure
+from foodsafe.images import ImageIndex, encode_jpeg, image_hashes, load_thumbnail
+from foodsafe.linkage import apply_links, links_path, links_stamp, read_links
+from foodsafe import metrics
+from foodsafe.lots import LotIndex, normalize_lot
+from foodsafe.notifications import BackgroundDispatcher, default_backends
+from foodsafe.priors import AnalysisPriorStore, RiskPriors
+from foodsafe.recall_table import SORT_KEYS, RecallTable
+from foodsafe.reports import analysis_report_archive, render_static_charts, slug
+from foodsafe.recalls import RecallStore
+from foodsafe.results import GENERIC_CODE
+from foodsafe.rollups import RollupStore
+from foodsafe.scoring import analyze_food_risk, load_sample_data, seconds_until_expiry_band_change
+from foodsafe.snapshot import SharedCatalog, build_catalog_snapshot
+
+# Index code-barres (fichier mmap construit hors ligne, voir foodsafe.barcodes)
+BARCODE_INDEX_PATH = os.environ.get(
+    "FOODSAFE_BARCODE_INDEX", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "barcodes.gtin")
+)
+# Magasin des rappels alimenté par `python -m foodsafe.recalls` (données d'exemple s'il est vide)
+RECALL_STORE_PATH = os.environ.get(
+    "FOODSAFE_RECALL_STORE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "recalls")
+)
+# Journal des abonnements aux alertes
+SUBSCRIPTIONS_PATH = os.environ.get(
+    "FOODSAFE_SUBSCRIPTIONS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "subscriptions.jsonl")
+)
+# Notifications : fichiers locaux, ou serveur SMTP pour l'email si FOODSAFE_SMTP_HOST est défini
+OUTBOX_PATH = os.environ.get(
+    "FOODSAFE_OUTBOX", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "outbox")
+)
+# Agrégats des analyses réalisées dans l'application
+ANALYSIS_ROLLUPS_PATH = os.environ.get(
+    "FOODSAFE_ANALYSIS_ROLLUPS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "analysis_rollups.json")
+)
+# A priori de risque tirés des analyses de produits référencés, partagés par les processus
+RISK_PRIORS_PATH = os.environ.get(
+    "FOODSAFE_RISK_PRIORS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "risk_priors.json")
+)
+# Empreintes des photos de référence, construites par `python -m foodsafe.images`
+IMAGE_INDEX_PATH = os.environ.get(
+    "FOODSAFE_IMAGE_INDEX", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "images.npz")
+)
+# Instantané du catalogue partagé par les processus (`python -m foodsafe.snapshot`), remplaçable à chaud
+CATALOG_SNAPSHOT_PATH = os.environ.get(
+    "FOODSAFE_CATALOG_SNAPSHOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "catalog.snap")
+)
+# Mesures internes (FOODSAFE_METRICS=1) : export Prometheus réécrit à chaque exécution si un chemin est donné
+METRICS_EXPORT_PATH = os.environ.get("FOODSAFE_METRICS_FILE")
 
 # Configuration de la page
 st.set_page_config(
@@ -48,110 +106,318 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Données simulées pour l'exemple
 @st.cache_data
-def load_sample_data():
-    # Base de données des produits avec risques
-    products_db = {
-        "Lait entier Carrefour": {"risk": "low", "dlu": "2024-06-15", "lot": "L240601", "recalls": 0},
-        "Yaourt Danone": {"risk": "low", "dlu": "2024-06-20", "lot": "Y240605", "recalls": 0},
-        "Fromage Roquefort AOP": {"risk": "medium", "dlu": "2024-07-01", "lot": "R240520", "recalls": 1},
-        "Salade Caesar prête": {"risk": "high", "dlu": "2024-06-12", "lot": "S240610", "recalls": 3},
-        "Saumon fumé Label Rouge": {"risk": "medium", "dlu": "2024-06-18", "lot": "SF240608", "recalls": 1},
-        "Chocolat noir Lindt": {"risk": "low", "dlu": "2024-12-01", "lot": "C240301", "recalls": 0},
-        "Épinards surgelés": {"risk": "high", "dlu": "2024-08-15", "lot": "E240515", "recalls": 2}
-    }
-    
-    # Données des rappels récents
-    recalls_data = [
-        {"date": "2024-06-10", "product": "Salade Caesar prête", "reason": "Listeria monocytogenes", "severity": "Élevé"},
-        {"date": "2024-06-08", "product": "Épinards surgelés", "reason": "Pesticides non conformes", "severity": "Moyen"},
-        {"date": "2024-06-05", "product": "Fromage Roquefort AOP", "reason": "E. coli", "severity": "Élevé"},
-        {"date": "2024-06-03", "product": "Saumon fumé Label Rouge", "reason": "Température non respectée", "severity": "Moyen"},
-    ]
-    
-    return products_db, recalls_data
+def sample_data_fingerprint():
+    """Empreinte des données d'exemple (catalogue et rappels)"""
+    products_db, recalls_data = load_sample_data()
+    payload = json.dumps([products_db, recalls_data], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:12]
 
-def analyze_food_risk(product_name, lot_number=None, expiry_date=None):
-    """Analyse le risque d'un produit alimentaire"""
-    products_db, _ = load_sample_data()
-    
-    if product_name in products_db:
-        product_info = products_db[product_name]
-        risk_level = product_info["risk"]
-        recalls_count = product_info["recalls"]
-        
-        # Calcul du score de risque
-        base_score = {"low": 20, "medium": 60, "high": 85}[risk_level]
-        recall_penalty = recalls_count * 15
-        
-        # Vérification de la date de péremption
-        expiry_penalty = 0
-        if expiry_date:
-            try:
-                exp_date = datetime.strptime(expiry_date, "%Y-%m-%d")
-                days_to_expiry = (exp_date - datetime.now()).days
-                if days_to_expiry < 0:
-                    expiry_penalty = 50
-                elif days_to_expiry < 3:
-                    expiry_penalty = 30
-                elif days_to_expiry < 7:
-                    expiry_penalty = 15
-            except:
-                pass
-        
-        final_score = min(100, base_score + recall_penalty + expiry_penalty)
-        
-        return {
-            "risk_score": final_score,
-            "risk_level": "Élevé" if final_score > 70 else "Moyen" if final_score > 40 else "Faible",
-            "recalls_count": recalls_count,
-            "recommendations": get_recommendations(final_score, days_to_expiry if 'days_to_expiry' in locals() else None),
-            "lot_info": product_info.get("lot", "Non disponible")
-        }
-    else:
-        # Analyse générique pour les produits non référencés
-        generic_score = random.randint(15, 45)
-        return {
-            "risk_score": generic_score,
-            "risk_level": "Faible",
-            "recalls_count": 0,
-            "recommendations": ["Produit non référencé dans notre base de données", "Vérifiez les dates de péremption", "Conservez dans de bonnes conditions"],
-            "lot_info": lot_number or "Non spécifié"
-        }
+def load_data_version():
+    """Version des données catalogue et rappels (et de leurs correspondances), intégrée aux clés du cache d'analyse"""
+    store_version, links_version = recall_versions()
+    return f"{sample_data_fingerprint()}-{load_catalog().version}-{store_version}-{links_version}"
 
-def get_recommendations(risk_score, days_to_expiry):
-    """Génère des recommandations basées sur le score de risque"""
-    recommendations = []
-    
-    if risk_score > 70:
-        recommendations.extend([
-            "⚠️ ATTENTION: Risque élevé détecté",
-            "Ne consommez pas ce produit",
-            "Vérifiez les rappels officiels sur le site de la DGCCRF"
-        ])
-    elif risk_score > 40:
-        recommendations.extend([
-            "⚡ Risque modéré identifié",
-            "Vérifiez l'aspect et l'odeur avant consommation",
-            "Respectez scrupuleusement les conditions de conservation"
-        ])
-    else:
-        recommendations.extend([
-            "✅ Produit considéré comme sûr",
-            "Respectez les dates de péremption",
-            "Conservez selon les instructions"
-        ])
-    
-    if days_to_expiry is not None:
-        if days_to_expiry < 0:
-            recommendations.append("🚨 PRODUIT PÉRIMÉ - Ne pas consommer")
-        elif days_to_expiry < 3:
-            recommendations.append("⏰ Consommer rapidement (expire dans moins de 3 jours)")
-    
-    return recommendations
+@st.cache_resource
+def get_recall_store():
+    """Magasin des rappels partagé entre les sessions"""
+    return RecallStore(RECALL_STORE_PATH)
+
+@st.cache_data(max_entries=32)
+@metrics.timed("load.recall_store")
+def read_recall_store(version, start, end):
+    """Lecture des partitions de la période, mise en cache pour une version donnée du magasin"""
+    return get_recall_store().read(start, end)
+
+@st.cache_resource(max_entries=8)
+@metrics.timed("load.recall_table")
+def load_recall_table(version, start):
+    """Table paginée des rappels d'une période, construite une fois par version des données"""
+    return RecallTable(load_recalls(start=start))
+
+def load_recalls(start=None, end=None):
+    """Rappels publiés sur la période, depuis le magasin s'il est alimenté, sinon les données d'exemple"""
+    store = get_recall_store()
+    if store.version:
+        return read_recall_store(store.version, start, end)
+    _, recalls_data = load_sample_data()
+    recalls_df = pd.DataFrame(recalls_data)
+    recalls_df['date'] = pd.to_datetime(recalls_df['date'])
+    if start is not None:
+        recalls_df = recalls_df[recalls_df['date'] >= pd.Timestamp(start)]
+    if end is not None:
+        recalls_df = recalls_df[recalls_df['date'] <= pd.Timestamp(end)]
+    return recalls_df.reset_index(drop=True)
+
+@st.cache_resource(max_entries=4)
+@metrics.timed("load.recall_rollups")
+def load_recall_rollups(version):
+    """Agrégats temporels des rappels pour une version du magasin (données d'exemple si vide)"""
+    if version:
+        return get_recall_store().rollups()
+    rollups = RollupStore()
+    rollups.add_recalls(load_recalls())
+    return rollups
+
+@st.cache_resource
+@metrics.timed("load.analysis_rollups")
+def get_analysis_rollups():
+    """Agrégats des analyses enregistrées, partagés entre les sessions (vides au premier lancement)
+    
+    Ils sont écrits sur disque toutes les 30 s s'ils ont changé, et à l'arrêt du processus.
+    """
+    rollups = RollupStore.load(ANALYSIS_ROLLUPS_PATH)
+    rollups.autosave(ANALYSIS_ROLLUPS_PATH)
+    return rollups
+
+@st.cache_resource
+def load_demo_analysis_rollups():
+    """Historique de démonstration, en mémoire seulement : il n'est jamais enregistré sur disque"""
+    rollups = RollupStore()
+    rng = np.random.default_rng(42)
+    for day in pd.date_range(start='2024-01-01', end='2024-06-11', freq='D'):
+        count = max(1, int(rng.normal(1000, 200)))
+        mean = float(np.clip(rng.normal(45, 15), 0, 100))
+        rollups.add_analysis_aggregate(day, count, count * mean, count * (mean * mean + 15 ** 2))
+    return rollups
+
+def displayed_analysis_rollups():
+    """Agrégats à afficher et indicateur de démonstration : l'historique fictif tant qu'aucune analyse n'est enregistrée"""
+    rollups = get_analysis_rollups()
+    if len(rollups):
+        return rollups, False
+    return load_demo_analysis_rollups(), True
+
+def record_analysis(analysis):
+    """Comptabilise une analyse dans les agrégats (écrits sur disque en arrière-plan)"""
+    get_analysis_rollups().add_analysis(datetime.now(), analysis["risk_score"], analysis["risk_level"])
+
+@st.cache_resource
+def get_figure_cache():
+    """Figures Plotly déjà construites, partagées entre les sessions"""
+    cache = AnalysisCache(maxsize=128, max_ttl=24 * 3600)
+    metrics.register_cache("figures", cache)
+    return cache
+
+@st.cache_resource
+@metrics.timed("load.image_index")
+def load_image_index():
+    """Index des photos de référence, partagé entre les sessions (vide s'il n'a pas été construit)"""
+    return ImageIndex.load(IMAGE_INDEX_PATH)
+
+@st.cache_resource
+def get_photo_cache():
+    """Empreintes et aperçu JPEG des photos déjà reçues, indexés par le SHA-1 du fichier"""
+    cache = AnalysisCache(maxsize=512, max_ttl=24 * 3600)
+    metrics.register_cache("photos", cache)
+    return cache
+
+@metrics.timed("photo.identify")
+def identify_photo(data):
+    """Aperçu JPEG de la photo et produit reconnu (None si aucune référence n'est assez proche)"""
+    cache = get_photo_cache()
+    key = hashlib.sha1(data).hexdigest()
+    cached = cache.get(key)
+    if cached is None:
+        # Seuls les deux entiers d'empreinte et quelques Ko de JPEG sont conservés, pas l'image décodée
+        thumbnail = load_thumbnail(data)
+        cached = (*image_hashes(thumbnail), encode_jpeg(thumbnail))
+        cache.put(key, cached)
+    phash, dhash, preview = cached
+    matches = load_image_index().nearest(phash, dhash)
+    return preview, matches[0][0] if matches else None
+
+@st.cache_resource
+def get_subscription_store():
+    """Abonnements aux alertes, chargés une fois et partagés entre les sessions"""
+    return SubscriptionStore(SUBSCRIPTIONS_PATH)
+
+@st.cache_resource
+def get_notification_dispatcher():
+    """Envoi des notifications en arrière-plan, sans bloquer les sessions"""
+    return BackgroundDispatcher(default_backends(OUTBOX_PATH, os.environ.get("FOODSAFE_SMTP_HOST")))
+
+def recall_versions():
+    """Versions (magasin de rappels, correspondances) dont dépendent les index construits sur les rappels"""
+    store = get_recall_store()
+    return store.version, links_stamp(links_path(store.root))
+
+@st.cache_resource(max_entries=2)
+@metrics.timed("load.linked_recalls")
+def load_linked_recalls(versions):
+    """Rappels rattachés au produit du catalogue de nom le plus proche
+    
+    Les correspondances sont calculées hors ligne (python -m foodsafe.linkage) ;
+    l'application se contente de les lire.
+    """
+    recalls = load_recalls()
+    links = read_links(links_path(get_recall_store().root))
+    return recalls if links is None else apply_links(recalls, links)
+
+@st.cache_resource(max_entries=2)
+@metrics.timed("load.recall_priors")
+def load_recall_priors(versions):
+    """A priori de risque tirés des rappels, par catégorie et par marque"""
+    priors = RiskPriors()
+    priors.add_recalls(load_linked_recalls(versions))
+    return priors
+
+@st.cache_resource
+def get_analysis_prior_store():
+    """Agrégats des analyses sur disque, alimentés par tous les processus (écrits toutes les 30 s et à l'arrêt)"""
+    store = AnalysisPriorStore(RISK_PRIORS_PATH)
+    store.autosave()
+    return store
+
+@st.cache_resource(max_entries=4)
+@metrics.timed("load.risk_priors")
+def load_risk_priors(versions, analyses_stamp):
+    """A priori des produits non référencés : rappels et analyses enregistrées à la date `analyses_stamp`"""
+    priors = load_recall_priors(versions).copy()
+    priors.merge_analyses(get_analysis_prior_store().read())
+    return priors
+
+@st.cache_resource(max_entries=4)
+@metrics.timed("load.lot_index")
+def load_lot_index(versions):
+    """Lots et dates limites visés par les rappels, indexés par produit du catalogue"""
+    return LotIndex.from_recalls(load_linked_recalls(versions))
+
+@st.cache_resource
+@metrics.timed("load.catalog_snapshot")
+def get_shared_catalog():
+    """Instantané du catalogue projeté en mémoire, construit depuis les données d'exemple s'il est absent"""
+    if not os.path.exists(CATALOG_SNAPSHOT_PATH):
+        products_db, recalls_data = load_sample_data()
+        build_catalog_snapshot(CATALOG_SNAPSHOT_PATH, products_db, recalls_data)
+    return SharedCatalog(CATALOG_SNAPSHOT_PATH)
+
+def load_catalog():
+    """Version courante du catalogue (lecture seule, pages partagées entre les processus)"""
+    return get_shared_catalog().current()
+
+@st.cache_resource(max_entries=2)
+@metrics.timed("load.catalog_index")
+def load_catalog_index(version):
+    """Index de recherche du catalogue pour une version de l'instantané, partagé entre les sessions"""
+    return CatalogIndex.from_products(load_catalog())
+
+@st.cache_resource
+def load_report_charts():
+    """Illustrations statiques des rapports, dessinées une fois pour toutes les sessions"""
+    return render_static_charts()
+
+@st.cache_resource(max_entries=2)
+@metrics.timed("load.barcode_index")
+def load_barcode_index(version):
+    """Index code-barres projeté en mémoire pour une version du catalogue, reconstruit s'il est absent ou périmé"""
+    catalog = load_catalog()
+    if barcode_index_version(BARCODE_INDEX_PATH) != catalog.version:
+        os.makedirs(os.path.dirname(BARCODE_INDEX_PATH), exist_ok=True)
+        build_barcode_index(BARCODE_INDEX_PATH, [(info["ean"], name) for name, info in catalog.items() if "ean" in info],
+                            catalog_version=catalog.version)
+    return BarcodeIndex(BARCODE_INDEX_PATH)
+
+@st.cache_resource
+def get_analysis_cache():
+    """Cache des analyses partagé entre toutes les sessions"""
+    cache = AnalysisCache(maxsize=10_000, max_ttl=3600)
+    metrics.register_cache("analyses", cache)
+    return cache
+
+def analyze_food_risk_cached(product_name, lot_number=None, expiry_date=None):
+    """analyze_food_risk avec mise en cache jusqu'au prochain changement de palier de péremption
+    
+    Le score d'un produit non référencé dépend des a priori, enrichis par les analyses
+    calculées de produits référencés : la date d'écriture de ces agrégats, qui ne change
+    qu'à leur enregistrement, fait alors partie de la clé.
+    """
+    catalog = load_catalog()
+    canonical_name = load_catalog_index(catalog.version).lookup(product_name) or product_name
+    versions = recall_versions()
+    prior_store = get_analysis_prior_store()
+    analyses_stamp = prior_store.stamp()
+    priors = load_risk_priors(versions, analyses_stamp)
+    data_version = load_data_version()
+    key = (
+        normalize_name(canonical_name),
+        normalize_lot(lot_number) or "",
+        expiry_date or "",
+        data_version,
+        0 if canonical_name in catalog else analyses_stamp,
+    )
+    cache = get_analysis_cache()
+    # Les résultats calculés sur les données précédentes ne seront plus demandés
+    cache.set_data_version(data_version)
+    analysis = cache.get(key)
+    if analysis is None:
+        with metrics.span("scoring.analyze"):
+            analysis = analyze_food_risk(canonical_name, lot_number, expiry_date, lot_index=load_lot_index(versions),
+                                         products_db=catalog, priors=priors)
+        cache.put(key, analysis, ttl=seconds_until_expiry_band_change(expiry_date))
+        if analysis.recommendation_code != GENERIC_CODE:
+            # Seuls les produits référencés alimentent les a priori, une fois par analyse calculée
+            prior_store.add_analysis(analysis["risk_score"], *priors.groups_for(canonical_name))
+    return analysis
+
+def get_expiry_tracker():
+    """Produits suivis par la session et planificateur de leurs paliers de péremption"""
+    if "expiry_tracker" not in st.session_state:
+        st.session_state.expiry_tracker = {"scheduler": ExpiryScheduler(), "items": [], "ids": {}}
+    return st.session_state.expiry_tracker
+
+def track_expiry(product_name, expiry_str):
+    """Suit la date de péremption d'un produit ; renvoie son palier actuel"""
+    tracker = get_expiry_tracker()
+    item = tracker["ids"].setdefault((product_name, expiry_str), len(tracker["items"]))
+    if item == len(tracker["items"]):
+        tracker["items"].append({"product": product_name, "expiry_date": expiry_str})
+    return tracker["scheduler"].track(item, expiry_str)
+
+def expiry_tracker_sidebar():
+    """Signale les produits suivis qui viennent de changer de palier et les liste dans la barre latérale"""
+    tracker = st.session_state.get("expiry_tracker")
+    if not tracker or not tracker["items"]:
+        return
+    scheduler = tracker["scheduler"]
+    for event in scheduler.advance():
+        for item in event["items"].tolist():
+            st.toast(f"{tracker['items'][item]['product']} : {event['label'].lower()}", icon="⏰")
+    with st.sidebar.expander(f"📌 Produits suivis ({len(scheduler)})"):
+        for item, info in enumerate(tracker["items"]):
+            band = scheduler.band(item)
+            if band is not None:
+                st.write(f"**{info['product']}** ({info['expiry_date']}) : {BAND_LABELS[band].lower()}")
+
+@st.cache_resource
+def start_metrics_endpoint():
+    """Point d'accès Prometheus (FOODSAFE_METRICS_PORT), démarré une fois par processus"""
+    port = os.environ.get("FOODSAFE_METRICS_PORT")
+    return metrics.REGISTRY.serve_prometheus(int(port)) if port else None
+
+def metrics_panel():
+    """Panneau de diagnostic : durées des étapes et efficacité des caches"""
+    snapshot = metrics.REGISTRY.snapshot()
+    with st.sidebar.expander("⏱️ Performances"):
+        spans = pd.DataFrame.from_dict(snapshot["spans"], orient="index")
+        if not spans.empty:
+            st.dataframe(spans[["count", "mean_ms", "p50_ms", "p95_ms"]].round(2), use_container_width=True)
+        caches = pd.DataFrame.from_dict(snapshot["caches"], orient="index")
+        if not caches.empty:
+            st.dataframe(caches[["size", "hits", "misses", "hit_rate"]].round(3), use_container_width=True)
+        st.download_button("Export Prometheus", metrics.REGISTRY.render_prometheus(),
+                           file_name="foodsafe.prom", mime="text/plain")
 
 def main():
+    with metrics.span("rerun"):
+        render_page()
+    if metrics.REGISTRY.enabled:
+        start_metrics_endpoint()
+        metrics_panel()
+        if METRICS_EXPORT_PATH:
+            metrics.REGISTRY.write_prometheus(METRICS_EXPORT_PATH)
+
+def render_page():
     # En-tête principal
     st.markdown("""
     <div class="main-header">
@@ -176,7 +442,9 @@ def main():
         alerts_page()
     else:
         statistics_page()
+    expiry_tracker_sidebar()
 
+@metrics.timed("page.analyze_product")
 def analyze_product_page():
     st.header("🔍 Analyse de Produit Alimentaire")
     
@@ -192,33 +460,58 @@ def analyze_product_page():
         )
         
         if input_method == "Nom du produit":
-            product_name = st.text_input(
+            query = st.text_input(
                 "Nom du produit",
                 placeholder="Ex: Lait entier Carrefour",
-                help="Tapez le nom exact du produit tel qu'il apparaît sur l'emballage"
+                help="Tapez le début du nom du produit, les produits correspondants vous seront proposés"
             )
+            product_name = None
+            if query:
+                catalog_index = load_catalog_index(load_catalog().version)
+                product_name = catalog_index.lookup(query)
+                if product_name is None:
+                    suggestions = [name for name, _ in catalog_index.search(query, k=8)]
+                    if suggestions:
+                        product_name = st.selectbox("Produits correspondants", suggestions)
+                    else:
+                        product_name = query
         elif input_method == "Code-barres":
             barcode = st.text_input(
                 "Code-barres (EAN-13)",
-                placeholder="Ex: 3245412345678",
-                help="Scannez ou tapez le code-barres du produit"
+                placeholder="Ex: 3270200000019",
+                help="Scannez ou tapez le code-barres du produit (EAN-8, UPC-A, EAN-13 ou GTIN-14)"
             )
-            # Simulation de recherche par code-barres
-            if barcode and len(barcode) == 13:
-                product_name = "Produit identifié par code-barres"
-            else:
-                product_name = None
+            product_name = None
+            if barcode:
+                try:
+                    product_name = load_barcode_index(load_catalog().version).lookup(barcode)
+                except ValueError:
+                    st.error("Code-barres invalide : vérifiez les chiffres saisis.")
+                else:
+                    if product_name:
+                        st.success(f"Produit identifié : {product_name}")
+                    else:
+                        st.info("Code-barres absent de notre base de données, analyse générique.")
+                        product_name = "Produit identifié par code-barres"
         else:
             uploaded_file = st.file_uploader(
                 "Téléchargez une photo du produit",
                 type=["jpg", "jpeg", "png"],
                 help="Prenez une photo claire de l'étiquette du produit"
             )
+            product_name = None
             if uploaded_file:
-                st.image(uploaded_file, caption="Photo du produit", width=300)
-                product_name = "Produit identifié par photo"
-            else:
-                product_name = None
+                try:
+                    preview, product_name = identify_photo(uploaded_file.getvalue())
+                except (OSError, Image.DecompressionBombError):
+                    st.error("Image illisible : utilisez une photo JPEG ou PNG.")
+                else:
+                    st.image(preview, caption="Photo du produit", width=300)
+                    if product_name:
+                        st.success(f"Produit identifié : {product_name}")
+                    else:
+                        st.info("Produit non reconnu sur la photo, analyse générique.")
+                        product_name = "Produit identifié par photo"
         
         # Informations complémentaires
         col_info1, col_info2 = st.columns(2)
@@ -226,17 +519,18 @@ def analyze_product_page():
             lot_number = st.text_input("Numéro de lot (optionnel)", placeholder="Ex: L240601")
         with col_info2:
             expiry_date = st.date_input("Date de péremption (optionnel)")
+        track_expiry_date = st.checkbox("📌 Me prévenir à l'approche de la date de péremption")
         
         # Bouton d'analyse
         if st.button("🔍 Analyser le produit", type="primary"):
             if product_name:
                 with st.spinner("Analyse en cours..."):
-                    # Simulation d'un délai d'analyse
-                    import time
-                    time.sleep(2)
-                    
                     expiry_str = expiry_date.strftime("%Y-%m-%d") if expiry_date else None
-                    analysis = analyze_food_risk(product_name, lot_number, expiry_str)
+                    analysis = analyze_food_risk_cached(product_name, lot_number, expiry_str)
+                    record_analysis(analysis)
+                    if track_expiry_date and expiry_str:
+                        band = track_expiry(product_name, expiry_str)
+                        st.info(f"📌 Produit suivi : {BAND_LABELS[band].lower()}.")
                     
                     # Affichage des résultats
                     display_analysis_results(analysis, product_name)
@@ -279,6 +573,9 @@ def display_analysis_results(analysis, product_name):
         color = "#4ECDC4"
         alert_class = "alert-success"
     
+    if analysis.get("lot_recalled"):
+        st.error(f"🚨 Le lot {analysis['lot_info']} de ce produit fait l'objet d'un rappel.")
+    
     # Affichage du score principal
     col1, col2, col3, col4 = st.columns(4)
     
@@ -311,30 +608,34 @@ def display_analysis_results(analysis, product_name):
             delta="IA + Base données"
         )
     
-    # Graphique du score de risque
-    fig = go.Figure(go.Indicator(
-        mode = "gauge+number+delta",
-        value = risk_score,
-        domain = {'x': [0, 1], 'y': [0, 1]},
-        title = {'text': f"Niveau de Risque: {risk_level}"},
-        delta = {'reference': 50},
-        gauge = {
-            'axis': {'range': [None, 100]},
-            'bar': {'color': color},
-            'steps': [
-                {'range': [0, 40], 'color': "lightgray"},
-                {'range': [40, 70], 'color': "gray"},
-                {'range': [70, 100], 'color': "darkgray"}
-            ],
-            'threshold': {
-                'line': {'color': "red", 'width': 4},
-                'thickness': 0.75,
-                'value': 90
+    # Graphique du score de risque (ne dépend que du score et du niveau)
+    def build_gauge():
+        fig = go.Figure(go.Indicator(
+            mode = "gauge+number+delta",
+            value = risk_score,
+            domain = {'x': [0, 1], 'y': [0, 1]},
+            title = {'text': f"Niveau de Risque: {risk_level}"},
+            delta = {'reference': 50},
+            gauge = {
+                'axis': {'range': [None, 100]},
+                'bar': {'color': color},
+                'steps': [
+                    {'range': [0, 40], 'color': "lightgray"},
+                    {'range': [40, 70], 'color': "gray"},
+                    {'range': [70, 100], 'color': "darkgray"}
+                ],
+                'threshold': {
+                    'line': {'color': "red", 'width': 4},
+                    'thickness': 0.75,
+                    'value': 90
+                }
             }
-        }
-    ))
-    fig.update_layout(height=300)
-    st.plotly_chart(fig, use_container_width=True)
+        ))
+        fig.update_layout(height=300)
+        return fig
+    
+    gauge = cached_figure(get_figure_cache(), ("risk_gauge", risk_score, risk_level, color), build_gauge)
+    st.plotly_chart(gauge, use_container_width=True)
     
     # Recommandations
     st.markdown(f"""
@@ -360,16 +661,29 @@ def display_analysis_results(analysis, product_name):
             st.info("Formulaire de signalement ouvert.")
     
     with col3:
-        if st.button("📋 Télécharger le rapport"):
-            st.success("Rapport PDF généré !")
+        # Rapport CSV, HTML et PDF, rendu seulement au clic
+        row = {**analysis.to_dict(), "product_name": product_name, "recommendation_code": analysis.recommendation_code}
+        charts = load_report_charts()
+        st.download_button("📋 Télécharger le rapport", lambda: analysis_report_archive(row, charts),
+                           file_name=f"rapport-{slug(product_name)}.zip", mime="application/zip", on_click="ignore")
 
+@metrics.timed("page.recalls_dashboard")
 def recalls_dashboard():
     st.header("🚨 Tableau de Bord des Rappels")
     
-    # Chargement des données de rappels
-    _, recalls_data = load_sample_data()
-    recalls_df = pd.DataFrame(recalls_data)
-    recalls_df['date'] = pd.to_datetime(recalls_df['date'])
+    # Période bornée par défaut : seuls les mois concernés sont lus pour la table
+    periods = {"3 derniers mois": 90, "30 derniers jours": 30, "12 derniers mois": 365, "Tout l'historique": None}
+    period = st.selectbox("Période", list(periods))
+    start = (datetime.now() - timedelta(days=periods[period])).date() if periods[period] else None
+    version = get_recall_store().version
+    # Compteurs lus dans les agrégats journaliers, sans parcourir les rappels
+    rollups = load_recall_rollups(version)
+    if start is not None and not (rollups.series("day", start=start)["recalls"] > 0).any():
+        # Aucun rappel sur la période (données anciennes, flux interrompu) : tout l'historique
+        st.caption(f"Aucun rappel sur la période « {period.lower()} » : affichage de tout l'historique.")
+        start = None
+    recall_table = load_recall_table(version, start)
+    counters = recall_metrics(rollups, recall_table, datetime.now(), start=start)
     
     # Métriques clés
     col1, col2, col3, col4 = st.columns(4)
@@ -377,13 +691,12 @@ def recalls_dashboard():
     with col1:
         st.metric(
             "Rappels cette semaine",
-            len(recalls_df[recalls_df['date'] >= datetime.now() - timedelta(days=7)]),
+            counters["week"],
             delta="+2 vs semaine précédente"
         )
     
     with col2:
-        high_severity = len(recalls_df[recalls_df['severity'] == 'Élevé'])
-        st.metric("Sévérité élevée", high_severity, delta=f"{high_severity}/4 total")
+        st.metric("Sévérité élevée", counters["high_severity"], delta=f"{counters['high_severity']}/{counters['total']} total")
     
     with col3:
         st.metric("Catégories affectées", 4, delta="Frais, Surgelés, Conserves")
@@ -394,33 +707,60 @@ def recalls_dashboard():
     # Graphique des rappels par date
     st.subheader("📈 Évolution des rappels")
     
-    fig = px.line(
-        recalls_df.sort_values('date'), 
-        x='date', 
-        y=[1]*len(recalls_df),
-        title="Rappels par jour",
-        markers=True
-    )
-    fig.update_traces(y=recalls_df.index + 1)
-    fig.update_layout(showlegend=False, yaxis_title="Nombre cumulé de rappels")
-    st.plotly_chart(fig, use_container_width=True)
+    def build_timeline():
+        fig = px.line(
+            recall_timeline(rollups, start=start),
+            x='date',
+            y='cumul',
+            title="Rappels par jour",
+            markers=True
+        )
+        fig.update_layout(showlegend=False, yaxis_title="Nombre cumulé de rappels")
+        return fig
+    
+    timeline_key = ("recalls_timeline", version, start)
+    st.plotly_chart(cached_figure(get_figure_cache(), timeline_key, build_timeline), use_container_width=True)
     
-    # Liste des rappels récents
+    # Liste des rappels récents, paginée côté serveur
     st.subheader("📋 Rappels récents")
     
-    for _, recall in recalls_df.iterrows():
-        severity_color = "#FF6B6B" if recall['severity'] == 'Élevé' else "#FFE66D"
-        
-        st.markdown(f"""
-        <div class="metric-card" style="border-left-color: {severity_color} !important;">
-            <h5>{recall['product']}</h5>
-            <p><strong>Date:</strong> {recall['date'].strftime('%d/%m/%Y')}</p>
-            <p><strong>Motif:</strong> {recall['reason']}</p>
-            <p><strong>Sévérité:</strong> <span style="color: {severity_color}; font-weight: bold;">{recall['severity']}</span></p>
-        </div>
-        """, unsafe_allow_html=True)
-        st.write("")
+    col_filter1, col_filter2, col_filter3 = st.columns(3)
+    with col_filter1:
+        severities = st.multiselect("Sévérité", recall_table.values("severity"))
+    with col_filter2:
+        reasons = st.multiselect("Motif", recall_table.values("reason"))
+    with col_filter3:
+        date_range = st.date_input("Publiés entre", value=(), help="Laissez vide pour toute la période")
+    
+    col_sort1, col_sort2, col_sort3 = st.columns(3)
+    with col_sort1:
+        sort = st.selectbox("Trier par", list(SORT_KEYS), format_func=SORT_KEYS.get)
+    with col_sort2:
+        descending = st.radio("Ordre", ["Décroissant", "Croissant"], horizontal=True) == "Décroissant"
+    with col_sort3:
+        page_size = st.selectbox("Rappels par page", [25, 50, 100])
+    
+    date_from = date_range[0] if len(date_range) > 0 else None
+    date_to = date_range[1] if len(date_range) > 1 else None
+    _, total = recall_table.query(severities, reasons, date_from, date_to, sort, descending, page=0, page_size=page_size)
+    page_count = max(1, -(-total // page_size))
+    page = st.number_input(f"Page (sur {page_count})", min_value=1, max_value=page_count, value=1) - 1
+    page_df, total = recall_table.query(severities, reasons, date_from, date_to, sort, descending, page=page, page_size=page_size)
+    
+    st.caption(f"{total} rappel(s) correspondant(s)")
+    st.dataframe(
+        page_df[["date", "product", "reason", "severity"]],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            "date": st.column_config.DateColumn("Date", format="DD/MM/YYYY"),
+            "product": "Produit",
+            "reason": "Motif",
+            "severity": "Sévérité",
+        },
+    )
 
+@metrics.timed("page.alerts")
 def alerts_page():
     st.header("🔔 Alertes Personnalisées")
     
@@ -459,8 +799,37 @@ def alerts_page():
             ["Email", "SMS", "Push notification", "Tous"]
         )
         
+        # Identifiant de l'abonné
+        subscriber = st.text_input(
+            "Email ou téléphone",
+            placeholder="prenom.nom@exemple.fr",
+            help="Utilisé pour vous envoyer les alertes"
+        )
+        
         if st.button("💾 Sauvegarder les préférences"):
-            st.success("Préférences sauvegardées ! Vous recevrez des alertes selon vos critères.")
+            if not subscriber.strip():
+                st.warning("Veuillez indiquer un email ou un téléphone pour recevoir les alertes.")
+            else:
+                get_subscription_store().subscribe(
+                    subscriber.strip(),
+                    categories=product_types,
+                    brands=brands,
+                    min_severity=min_severity,
+                    channels=CHANNELS if notification_channel == "Tous" else [notification_channel],
+                )
+                st.success("Préférences sauvegardées ! Vous recevrez des alertes selon vos critères.")
+        
+        if st.button("📨 Envoyer une alerte de test"):
+            subscription = get_subscription_store().get(subscriber.strip())
+            if subscription is None:
+                st.warning("Sauvegardez d'abord vos préférences.")
+            else:
+                test_recall = {"product": "Produit de test", "reason": "Alerte de test", "severity": min_severity}
+                get_notification_dispatcher().submit(
+                    {"channel": channel, "subscriber": subscription["subscriber"], "recall": test_recall}
+                    for channel in subscription["channels"]
+                )
+                st.info(f"Alerte de test en cours d'envoi ({', '.join(subscription['channels'])}).")
     
     with col2:
         st.subheader("📊 Statistiques de vos alertes")
@@ -493,14 +862,22 @@ def alerts_page():
             </div>
             """, unsafe_allow_html=True)
 
+@metrics.timed("page.statistics")
 def statistics_page():
     st.header("📊 Statistiques Globales de Sécurité Alimentaire")
     
-    # Données simulées pour les statistiques
+    # Agrégats matérialisés : le coût ne dépend que du nombre de périodes affichées
+    analysis_rollups, demo = displayed_analysis_rollups()
+    recall_rollups = load_recall_rollups(get_recall_store().version)
+    analyses_total, growth = analysis_summary(analysis_rollups)
+    
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Produits analysés", "2,847,392", delta="+15% ce mois")
+        if growth is not None:
+            st.metric("Produits analysés", f"{analyses_total:,}", delta=f"{growth:+.0%} ce mois")
+        else:
+            st.metric("Produits analysés", f"{analyses_total:,}")
     with col2:
         st.metric("Rappels évités", "1,247", delta="Grâce aux alertes précoces")
     with col3:
@@ -509,45 +886,51 @@ def statistics_page():
     # Graphiques de tendances
     st.subheader("📈 Tendances de sécurité alimentaire")
     
-    # Données simulées pour les graphiques
-    dates = pd.date_range(start='2024-01-01', end='2024-06-11', freq='D')
-    risk_data = np.random.normal(45, 15, len(dates))
-    risk_data = np.clip(risk_data, 0, 100)
+    if demo:
+        st.caption("Historique de démonstration : aucune analyse n'a encore été enregistrée.")
     
-    trend_df = pd.DataFrame({
-        'Date': dates,
-        'Score_Risque_Moyen': risk_data,
-        'Rappels': np.random.poisson(0.3, len(dates)),
-        'Analyses': np.random.normal(1000, 200, len(dates))
-    })
+    granularities = {"Jour": "day", "Semaine": "week", "Mois": "month"}
+    granularity = granularities[st.radio("Période d'agrégation", list(granularities), horizontal=True)]
     
     # Graphique du score de risque moyen
-    fig1 = px.line(trend_df, x='Date', y='Score_Risque_Moyen', 
-                   title="Évolution du score de risque moyen",
-                   color_discrete_sequence=['#FF6B6B'])
-    fig1.add_hline(y=50, line_dash="dash", line_color="gray", 
-                   annotation_text="Seuil d'alerte")
-    st.plotly_chart(fig1, use_container_width=True)
+    def build_trend():
+        fig1 = px.line(risk_trend(analysis_rollups, granularity), x='Date', y='Score_Risque_Moyen', 
+                       title="Évolution du score de risque moyen",
+                       color_discrete_sequence=['#FF6B6B'])
+        fig1.add_hline(y=50, line_dash="dash", line_color="gray", 
+                       annotation_text="Seuil d'alerte")
+        return fig1
+    
+    figure_cache = get_figure_cache()
+    trend_key = ("risk_trend", demo, analysis_rollups.version, granularity)
+    st.plotly_chart(cached_figure(figure_cache, trend_key, build_trend), use_container_width=True)
     
     # Répartition des risques par catégorie
     col1, col2 = st.columns(2)
     
     with col1:
-        categories = ['Produits laitiers', 'Viandes', 'Légumes', 'Poissons', 'Conserves']
-        risk_counts = [23, 45, 12, 34, 18]
+        def build_categories():
+            counts = category_counts(recall_rollups)
+            categories = list(counts)
+            risk_counts = list(counts.values())
+            
+            return px.pie(values=risk_counts, names=categories, 
+                          title="Répartition des alertes par catégorie",
+                          color_discrete_sequence=px.colors.qualitative.Set3)
         
-        fig2 = px.pie(values=risk_counts, names=categories, 
-                      title="Répartition des alertes par catégorie",
-                      color_discrete_sequence=px.colors.qualitative.Set3)
-        st.plotly_chart(fig2, use_container_width=True)
+        categories_key = ("recall_categories", recall_rollups.version, get_recall_store().version)
+        st.plotly_chart(cached_figure(figure_cache, categories_key, build_categories), use_container_width=True)
     
     with col2:
-        severity_data = {'Faible': 156, 'Moyen': 89, 'Élevé': 34}
-        fig3 = px.bar(x=list(severity_data.keys()), y=list(severity_data.values()),
-                      title="Répartition par niveau de sévérité",
-                      color=list(severity_data.keys()),
-                      color_discrete_map={'Faible': '#4ECDC4', 'Moyen': '#FFE66D', 'Élevé': '#FF6B6B'})
-        st.plotly_chart(fig3, use_container_width=True)
+        def build_severities():
+            severity_data = severity_counts(recall_rollups)
+            return px.bar(x=list(severity_data.keys()), y=list(severity_data.values()),
+                          title="Répartition par niveau de sévérité",
+                          color=list(severity_data.keys()),
+                          color_discrete_map={'Faible': '#4ECDC4', 'Moyen': '#FFE66D', 'Élevé': '#FF6B6B'})
+        
+        severities_key = ("recall_severities", recall_rollups.version, get_recall_store().version)
+        st.plotly_chart(cached_figure(figure_cache, severities_key, build_severities), use_container_width=True)
     
     # Impact de l'application
     st.subheader("🎯 Impact de FoodSafe AI")